@@ -1,13 +1,19 @@
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
 import grpc
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 
-from modelserver.dependencies import persistent_db, remoteworker_store, task_store
-from modelserver.middleware import StaticReactRouterFiles
-from modelserver.routes import admin, health, hfbrowse, remoteworker, v1
+from modelserver.dependencies import (
+    blob_store,
+    inference_runtime,
+    persistent_db,
+    remoteworker_store,
+    task_store,
+)
+from modelserver.middleware import StaticReactRouterFiles, StreamingGZipMiddleware
+from modelserver.routes import admin, health, hfbrowse, remoteworker, session, v1
 from modelserver.tasks import TaskWorker
 from workerproto.worker_v1_pb2_grpc import add_WorkerManagerServiceServicer_to_server
 
@@ -21,11 +27,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the UI read the phase breakdown of inference calls
+    expose_headers=["Server-Timing"],
 )
-app.add_middleware(GZipMiddleware, minimum_size=10000)
+# Streamed events are left uncompressed so they reach the client as they are generated
+app.add_middleware(StreamingGZipMiddleware, minimum_size=10000)
 
 app.include_router(admin.router)
 app.include_router(v1.router)
+app.include_router(session.router)
 app.include_router(health.router)
 app.include_router(hfbrowse.router)
 app.include_router(remoteworker.router)
@@ -36,7 +46,7 @@ app.mount(
     name="frontend",
 )
 
-worker = TaskWorker(task_store, persistent_db)
+worker = TaskWorker(task_store, persistent_db, blob_store, inference_runtime)
 
 remoteworker_grpc = remoteworker.GrpcWorkerService(
     remoteworker_store, persistent_db, "output_files"
@@ -46,12 +56,18 @@ remoteworker_grpc = remoteworker.GrpcWorkerService(
 @app.on_event("startup")
 def on_startup() -> None:
     worker.start()
+    threading.Thread(
+        target=inference_runtime.prewarm_tasks,
+        args=(persistent_db,),
+        name="prewarm",
+        daemon=True,
+    ).start()
 
 
 @app.on_event("shutdown")
 def on_shutdown() -> None:
     # TODO(aduffy): gracefully kill worker
-    pass
+    inference_runtime.shutdown()
 
 
 KEYFILE = "key.pem"
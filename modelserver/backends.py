@@ -0,0 +1,251 @@
+import itertools
+import time
+import typing
+from abc import ABC, abstractmethod
+from typing import Any, Iterator, final
+
+import llama_cpp
+from llama_cpp import CompletionChunk, Llama
+
+from modelserver.memory import KV_CACHE_GGML_TYPES
+from modelserver.speculative import DraftLlama, SpeculativeDraft
+from modelserver.types.api import LlamaRuntimeParams
+
+"""
+Inference backends that load the model of a resident process.
+
+Jobs run by `modelserver.model_worker` and `modelserver.task_worker` generate through the Llama that
+the backend loaded, so the backend decides what actually runs a completion:
+
+    - LlamaBackend loads the model file with llama.cpp, which is what the server runs in production.
+    - FakeBackend loads nothing and generates deterministic text at a fixed rate. Running the server
+      on it measures the overhead of the server itself, such as scheduling, the process boundary and
+      streaming over HTTP and WebSockets, without a model or the time llama.cpp takes, see
+      `scripts/loadgen.py`.
+
+The backend is handed to every resident process by its initializer, so it must be picklable.
+"""
+
+
+class InferenceBackend(ABC):
+    """
+    Loads models into resident model processes.
+    """
+
+    @abstractmethod
+    def load(
+        self,
+        model_path: str,
+        runtime: LlamaRuntimeParams,
+        n_threads: int | None,
+        use_mmap: bool,
+        draft: SpeculativeDraft | None,
+    ) -> Llama:
+        """
+        :param n_threads: Threads to generate with, None for llama.cpp's default
+        :param use_mmap: Whether the weights may be mapped from the model file, overrides the runtime
+        :param draft: Draft proposing tokens for the model, see `modelserver.speculative`
+        """
+
+    @abstractmethod
+    def load_draft(
+        self,
+        model_path: str,
+        runtime: LlamaRuntimeParams,
+        n_threads: int | None,
+        num_draft_tokens: int,
+    ) -> SpeculativeDraft | None:
+        """
+        Load a draft model for speculative decoding, returns None if the backend does not speculate.
+        """
+
+    @abstractmethod
+    def set_threads(self, llama: Llama, n_threads: int) -> None:
+        """
+        Change the number of threads a loaded model generates with.
+        """
+
+    @abstractmethod
+    def apply_adapter(self, llama: Llama, lora_path: str, scale: float) -> None:
+        """
+        Merge the LoRA adapter into the weights of the loaded model, scaled by `scale`.
+        """
+
+
+@final
+class LlamaBackend(InferenceBackend):
+    def load(
+        self,
+        model_path: str,
+        runtime: LlamaRuntimeParams,
+        n_threads: int | None,
+        use_mmap: bool,
+        draft: SpeculativeDraft | None,
+    ) -> Llama:
+        return Llama(
+            model_path=model_path,
+            n_ctx=runtime.n_ctx,
+            n_batch=runtime.n_batch,
+            n_threads=n_threads,
+            n_threads_batch=n_threads,
+            type_k=KV_CACHE_GGML_TYPES[runtime.type_k],
+            type_v=KV_CACHE_GGML_TYPES[runtime.type_v],
+            flash_attn=runtime.flash_attn,
+            use_mmap=use_mmap,
+            use_mlock=runtime.use_mlock,
+            draft_model=draft,
+        )
+
+    def load_draft(
+        self,
+        model_path: str,
+        runtime: LlamaRuntimeParams,
+        n_threads: int | None,
+        num_draft_tokens: int,
+    ) -> SpeculativeDraft | None:
+        return DraftLlama(
+            # The draft proposes continuations of the same sequences, so it needs as much context
+            Llama(
+                model_path=model_path,
+                n_ctx=runtime.n_ctx,
+                n_threads=n_threads,
+                n_threads_batch=n_threads,
+                verbose=False,
+            ),
+            num_draft_tokens,
+        )
+
+    def set_threads(self, llama: Llama, n_threads: int) -> None:
+        llama_cpp.llama_set_n_threads(llama.ctx, n_threads, n_threads)
+        llama.n_threads = llama.n_threads_batch = n_threads
+
+    def apply_adapter(self, llama: Llama, lora_path: str, scale: float) -> None:
+        if (
+            llama_cpp.llama_model_apply_lora_from_file(
+                llama.model, lora_path.encode("utf-8"), scale, None, llama.n_threads
+            )
+            != 0
+        ):
+            raise RuntimeError(f"Failed to apply LoRA adapter {lora_path}")
+
+
+FAKE_WORDS = "the quick brown fox jumps over the lazy dog".split()
+
+
+@final
+class FakeLlama(Llama):
+    """
+    Stands in for a loaded model, streaming the same words for every prompt.
+
+    The prompt takes as long to evaluate as its tokens at `prompt_tokens_per_second`, after which one
+    word is generated every 1 / `tokens_per_second` seconds. Its vocabulary is the 256 byte values,
+    so that the speculative drafts can tokenize text, though their proposals are never used.
+    """
+
+    def __init__(
+        self, n_ctx: int, tokens_per_second: float, prompt_tokens_per_second: float
+    ) -> None:
+        # The model is never loaded, only the attributes the server touches are set up
+        self.fake_n_ctx = n_ctx
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.n_threads = self.n_threads_batch = 1
+        self.draft_model = None
+        self.context_params = llama_cpp.llama_context_default_params()
+
+    def tokenize(
+        self, text: bytes, add_bos: bool = True, special: bool = False
+    ) -> list[int]:
+        return list(text)
+
+    def detokenize(
+        self, tokens: list[int], prev_tokens: list[int] | None = None
+    ) -> bytes:
+        return bytes(tokens)
+
+    def n_ctx(self) -> int:
+        return self.fake_n_ctx
+
+    def token_eos(self) -> int:
+        return 0
+
+    def reset(self) -> None:
+        pass
+
+    def create_completion(
+        self, prompt: str | list[int], *args: Any, **kwargs: Any
+    ) -> Iterator[CompletionChunk]:
+        assert kwargs.get("stream"), "FakeLlama only streams completions"
+        prompt_tokens = len(
+            prompt.encode("utf-8") if isinstance(prompt, str) else prompt
+        )
+        max_tokens = kwargs.get("max_tokens") or 16
+        return self._stream(prompt_tokens, max_tokens)
+
+    def _stream(self, prompt_tokens: int, max_tokens: int) -> Iterator[CompletionChunk]:
+        # Tokens are paced against a schedule rather than slept for one by one, so that the time the
+        # consumer spends between tokens does not slow the rate down
+        due = time.monotonic() + prompt_tokens / self.prompt_tokens_per_second
+        for n, word in zip(range(max_tokens), itertools.cycle(FAKE_WORDS)):
+            time.sleep(max(due - time.monotonic(), 0))
+            due += 1 / self.tokens_per_second
+            yield typing.cast(
+                CompletionChunk,
+                {
+                    "id": f"fake-{n}",
+                    "object": "text_completion",
+                    "created": int(time.time()),
+                    "model": "fake",
+                    "choices": [
+                        {
+                            "text": f" {word}",
+                            "index": 0,
+                            "logprobs": None,
+                            "finish_reason": "length" if n + 1 == max_tokens else None,
+                        }
+                    ],
+                },
+            )
+
+
+@final
+class FakeBackend(InferenceBackend):
+    """
+    Serves every model with a FakeLlama, without reading the model file.
+
+    :param tokens_per_second: Rate at which each completion generates tokens
+    :param prompt_tokens_per_second: Rate at which prompts are evaluated before the first token
+    """
+
+    def __init__(
+        self, tokens_per_second: float = 50.0, prompt_tokens_per_second: float = 2000.0
+    ) -> None:
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+
+    def load(
+        self,
+        model_path: str,
+        runtime: LlamaRuntimeParams,
+        n_threads: int | None,
+        use_mmap: bool,
+        draft: SpeculativeDraft | None,
+    ) -> Llama:
+        return FakeLlama(
+            runtime.n_ctx, self.tokens_per_second, self.prompt_tokens_per_second
+        )
+
+    def load_draft(
+        self,
+        model_path: str,
+        runtime: LlamaRuntimeParams,
+        n_threads: int | None,
+        num_draft_tokens: int,
+    ) -> SpeculativeDraft | None:
+        return None
+
+    def set_threads(self, llama: Llama, n_threads: int) -> None:
+        llama.n_threads = llama.n_threads_batch = n_threads
+
+    def apply_adapter(self, llama: Llama, lora_path: str, scale: float) -> None:
+        pass
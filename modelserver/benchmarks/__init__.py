@@ -0,0 +1,19 @@
+"""
+Benchmarks of the storage hot paths and of serializing their output, run with pytest-benchmark.
+
+The benchmark modules are named bench_*.py so that the regular test run does not collect them, and
+are run by naming them explicitly:
+
+    pytest modelserver/benchmarks/bench_*.py
+
+The stores are filled by the fixtures in conftest.py with data of the size a busy server holds, see
+the sizes defined there. A baseline of every benchmark is stored under baselines/, compare against
+it to catch regressions before they are merged:
+
+    pytest modelserver/benchmarks/bench_*.py \\
+        --benchmark-storage=file://modelserver/benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=median:25%
+
+Timings depend on the machine, so refresh the baseline on the machine the comparison runs on, by
+running the same command with --benchmark-save=baseline instead of the compare flags.
+"""
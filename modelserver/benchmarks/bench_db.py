@@ -0,0 +1,42 @@
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from modelserver.db.sqlite import PersistentDataManager
+
+from .conftest import MODELS, TASKS, VERSIONS_PER_MODEL, model_requests
+
+
+def test_get_task_by_name(
+    benchmark: BenchmarkFixture, data_manager: PersistentDataManager
+) -> None:
+    task = benchmark(data_manager.get_task_by_name, f"task-{TASKS // 2}")
+    assert task.name == f"task-{TASKS // 2}"
+
+
+def test_get_model_version_internal(
+    benchmark: BenchmarkFixture, data_manager: PersistentDataManager
+) -> None:
+    model = benchmark(
+        data_manager.get_model_version_internal,
+        model_name=f"model-{MODELS // 2}",
+        version=f"0.{VERSIONS_PER_MODEL // 2}.0",
+    )
+    assert str(model.version) == f"0.{VERSIONS_PER_MODEL // 2}.0"
+
+
+def test_get_registered_models(
+    benchmark: BenchmarkFixture, data_manager: PersistentDataManager
+) -> None:
+    models = benchmark(data_manager.get_registered_models)
+    assert len(models) == MODELS
+
+
+def test_register_model(
+    benchmark: BenchmarkFixture, data_manager: PersistentDataManager
+) -> None:
+    requests = model_requests()
+    # Every round registers a new version, building the request is left out of the timing
+    benchmark.pedantic(  # type: ignore[no-untyped-call]
+        data_manager.register_model,
+        setup=lambda: ((next(requests),), {}),
+        rounds=200,
+    )
@@ -0,0 +1,63 @@
+import random
+import uuid
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from modelserver.metrics._duckdb import DuckDBMetricStore
+
+from .conftest import INVOCATION_BATCH, INVOCATIONS_PER_TASK, invocations
+
+
+def test_insert_invocations(
+    benchmark: BenchmarkFixture,
+    metric_store: DuckDBMetricStore,
+    metric_task_ids: list[uuid.UUID],
+) -> None:
+    rng = random.Random(1)
+    benchmark.pedantic(  # type: ignore[no-untyped-call]
+        metric_store.insert_invocations,
+        setup=lambda: ((invocations(metric_task_ids, INVOCATION_BATCH, rng),), {}),
+        rounds=50,
+    )
+
+
+def test_search_invocations(
+    benchmark: BenchmarkFixture,
+    metric_store: DuckDBMetricStore,
+    metric_task_ids: list[uuid.UUID],
+) -> None:
+    page = benchmark(
+        metric_store.search_invocations,
+        task_id=metric_task_ids[0],
+        min_input_tokens=256,
+        page_size=100,
+    )
+    assert len(page.page) == 100
+
+
+def test_search_invocations_next_page(
+    benchmark: BenchmarkFixture,
+    metric_store: DuckDBMetricStore,
+    metric_task_ids: list[uuid.UUID],
+) -> None:
+    first = metric_store.search_invocations(task_id=metric_task_ids[0], page_size=100)
+    page = benchmark(
+        metric_store.search_invocations,
+        task_id=metric_task_ids[0],
+        page_size=100,
+        page_token=first.page_token,
+    )
+    assert len(page.page) == 100
+
+
+def test_summarize_invocations(
+    benchmark: BenchmarkFixture,
+    metric_store: DuckDBMetricStore,
+    metric_task_ids: list[uuid.UUID],
+) -> None:
+    summary = benchmark(
+        metric_store.summarize_invocations,
+        task_id=metric_task_ids[0],
+        max_output_tokens=256,
+    )
+    assert 0 < summary.total < INVOCATIONS_PER_TASK
@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+from typing import Any
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.metrics._core import SearchInvocationsResponsePage
+from modelserver.metrics._duckdb import DuckDBMetricStore
+from modelserver.responses import JSONResponder
+from modelserver.types.api import GetRegisteredModelsResponse, TaskInfo
+
+"""
+Serialization of the list-heavy listings, through FastAPI's response path and through the
+JSONResponder the routes use, see `modelserver.responses`. The benchmarks of a listing share a group
+so that the report puts the two paths side by side.
+"""
+
+INVOCATIONS_PAGE_SIZE = 1000
+
+
+def fastapi_body(type_: Any) -> Any:
+    field = create_response_field("response", type_)
+
+    def render(content: Any) -> bytes:
+        serialized = asyncio.run(
+            serialize_response(field=field, response_content=content)
+        )
+        return bytes(JSONResponse(serialized).body)
+
+    return render
+
+
+@pytest.fixture(scope="module")
+def invocations_page(
+    metric_store: DuckDBMetricStore, metric_task_ids: list[uuid.UUID]
+) -> SearchInvocationsResponsePage:
+    return metric_store.search_invocations(
+        task_id=metric_task_ids[0], page_size=INVOCATIONS_PAGE_SIZE
+    )
+
+
+@pytest.fixture(scope="module")
+def registered_models(
+    data_manager: PersistentDataManager,
+) -> GetRegisteredModelsResponse:
+    return GetRegisteredModelsResponse.model_construct(
+        models=data_manager.get_registered_models()
+    )
+
+
+@pytest.mark.benchmark(group="invocations-page")
+def test_invocations_page_fastapi(
+    benchmark: BenchmarkFixture, invocations_page: SearchInvocationsResponsePage
+) -> None:
+    benchmark(fastapi_body(SearchInvocationsResponsePage), invocations_page)
+
+
+@pytest.mark.benchmark(group="invocations-page")
+def test_invocations_page_responder(
+    benchmark: BenchmarkFixture, invocations_page: SearchInvocationsResponsePage
+) -> None:
+    benchmark(JSONResponder(SearchInvocationsResponsePage).dump, invocations_page)
+
+
+@pytest.mark.benchmark(group="tasks")
+def test_tasks_fastapi(
+    benchmark: BenchmarkFixture, data_manager: PersistentDataManager
+) -> None:
+    benchmark(fastapi_body(list[TaskInfo]), data_manager.get_tasks())
+
+
+@pytest.mark.benchmark(group="tasks")
+def test_tasks_responder(
+    benchmark: BenchmarkFixture, data_manager: PersistentDataManager
+) -> None:
+    benchmark(JSONResponder(list[TaskInfo]).dump, data_manager.get_tasks())
+
+
+@pytest.mark.benchmark(group="registered-models")
+def test_registered_models_fastapi(
+    benchmark: BenchmarkFixture, registered_models: GetRegisteredModelsResponse
+) -> None:
+    benchmark(fastapi_body(GetRegisteredModelsResponse), registered_models)
+
+
+@pytest.mark.benchmark(group="registered-models")
+def test_registered_models_responder(
+    benchmark: BenchmarkFixture, registered_models: GetRegisteredModelsResponse
+) -> None:
+    benchmark(JSONResponder(GetRegisteredModelsResponse).dump, registered_models)
@@ -0,0 +1,12 @@
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from modelserver.db.tasks import PersistentTaskStore
+
+from .conftest import UNFINISHED_BACKGROUND_TASKS
+
+
+def test_get_unfinished_tasks(
+    benchmark: BenchmarkFixture, task_store: PersistentTaskStore
+) -> None:
+    tasks = benchmark(task_store.get_unfinished_tasks)
+    assert len(tasks) == UNFINISHED_BACKGROUND_TASKS
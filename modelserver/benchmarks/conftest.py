@@ -0,0 +1,156 @@
+import itertools
+import pathlib
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Generator, Iterator
+
+import pytest
+from sqlalchemy import create_engine
+
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.db.tasks import PersistentTaskStore
+from modelserver.metrics._core import InvocationMeasurementsIn, InvocationOutcome
+from modelserver.metrics._duckdb import DuckDBMetricStore
+from modelserver.types.api import CreateTaskRequest, RegisterModelRequest
+from modelserver.types.locator import DiskLocator
+from modelserver.types.tasks import (
+    DownloadDiskModelTask,
+    FailedTaskState,
+    FinishedTaskState,
+    Task,
+    TaskState,
+)
+
+"""
+Fixtures generating stores filled with realistic amounts of data. Data is generated from a fixed
+seed, so that every run benchmarks the same data.
+"""
+
+MODELS = 50
+VERSIONS_PER_MODEL = 8
+TASKS = 200
+BACKGROUND_TASKS = 2000
+UNFINISHED_BACKGROUND_TASKS = 20
+METRIC_TASKS = 20
+INVOCATIONS_PER_TASK = 2500
+INVOCATION_BATCH = 100
+
+
+def model_request(model: str, version: str) -> RegisterModelRequest:
+    return RegisterModelRequest.model_validate(
+        {
+            "model": model,
+            "version": version,
+            "model_type": "completion",
+            "runtime": "ggml",
+            "internal_params": {
+                "type": "paramsv1/completion",
+                "model_path": f"/models/{model}-{version}.gguf",
+            },
+            "import_metadata": {
+                "imported_at": datetime.utcfromtimestamp(0),
+                "source": {
+                    "type": "importv1/disk",
+                    "source": {
+                        "type": "locatorv1/disk",
+                        "path": f"/models/{model}-{version}.gguf",
+                    },
+                },
+            },
+        }
+    )
+
+
+def model_requests() -> Iterator[RegisterModelRequest]:
+    """
+    An endless supply of new model versions, for benchmarking registration.
+    """
+    for n in itertools.count():
+        yield model_request(f"bench-model-{n % MODELS}", f"1.{n // MODELS}.0")
+
+
+def invocations(
+    task_ids: list[uuid.UUID], count: int, rng: random.Random
+) -> list[InvocationMeasurementsIn]:
+    start = datetime(2024, 1, 1)
+    return [
+        InvocationMeasurementsIn(
+            task_id=rng.choice(task_ids),
+            ts=start + timedelta(seconds=rng.randrange(90 * 86400)),
+            input_tokens=rng.randrange(16, 2048),
+            output_tokens=rng.randrange(1, 512),
+            generate_ms=rng.uniform(50, 20000),
+            used_grammar=rng.random() < 0.5,
+            used_variables=True,
+            outcome=rng.choices(
+                list(InvocationOutcome), weights=[0.94, 0.04, 0.01, 0.01]
+            )[0],
+            phases_ms=dict(db=rng.uniform(0, 2), queue=rng.uniform(0, 50)),
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture(scope="module")
+def data_manager(
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Generator[PersistentDataManager, None, None]:
+    path = tmp_path_factory.mktemp("db") / "v0.db"
+    engine = create_engine(f"sqlite+pysqlite:///{path}")
+    db = PersistentDataManager(engine)
+    for version in range(VERSIONS_PER_MODEL):
+        for model in range(MODELS):
+            db.register_model(model_request(f"model-{model}", f"0.{version}.0"))
+    models = {model.name: model for model in db.get_registered_models()}
+    for task in range(TASKS):
+        name = f"task-{task}"
+        db.create_task(CreateTaskRequest(name=name))
+        db.update_task_prompt_template(name, "Extract the fields of {document}")
+        db.set_task_backing_model(
+            name, str(models[f"model-{task % MODELS}"].id), "0.1.0"
+        )
+    yield db
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def task_store() -> PersistentTaskStore:
+    store = PersistentTaskStore()
+    for n in range(BACKGROUND_TASKS):
+        task_id = store.store_task(
+            Task(
+                DownloadDiskModelTask(
+                    locator=DiskLocator(path=f"/models/import-{n}.gguf"),
+                    model_name=f"import-{n}",
+                    model_version="0.1.0",
+                )
+            )
+        )
+        if n >= UNFINISHED_BACKGROUND_TASKS:
+            store.update_task(
+                task_id,
+                TaskState(
+                    FinishedTaskState()
+                    if n % 10
+                    else FailedTaskState(error="Download failed")
+                ),
+            )
+    return store
+
+
+@pytest.fixture(scope="module")
+def metric_task_ids() -> list[uuid.UUID]:
+    rng = random.Random(0)
+    return [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(METRIC_TASKS)]
+
+
+@pytest.fixture(scope="module")
+def metric_store(
+    tmp_path_factory: pytest.TempPathFactory, metric_task_ids: list[uuid.UUID]
+) -> DuckDBMetricStore:
+    store = DuckDBMetricStore(pathlib.Path(tmp_path_factory.mktemp("metrics")))
+    rng = random.Random(0)
+    for _ in range(METRIC_TASKS * INVOCATIONS_PER_TASK // INVOCATION_BATCH):
+        store.insert_invocations(invocations(metric_task_ids, INVOCATION_BATCH, rng))
+    return store
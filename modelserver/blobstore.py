@@ -0,0 +1,207 @@
+import fcntl
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import final
+
+from modelserver.db._core import DataManager
+from modelserver.types.api import BlobIn, BlobOut
+
+"""
+Content-addressed storage for model files.
+
+Every imported model file is stored once under `<root>/sha256/<digest[:2]>/<digest>`, regardless
+of how many models or versions were imported from it. Model versions reference their file by
+digest in their `model_params`, as do the draft models paired with them, which doubles as the
+reference count: a blob that is no longer referenced by any model version is reclaimed by the next
+`gc()` sweep.
+
+Files the server produces itself, downloads and the outputs of quantization, are written under the
+store's root and moved into place, so they are never held twice. Files imported from the user's disk
+are not owned by the store: they are placed with a reflink (copy-on-write clone) where the filesystem
+supports it, which is instant and safe against the source being modified, and copied otherwise. They
+are never hard linked, as an inode shared with the source would let writes to the source change the
+contents of a blob behind its digest.
+"""
+
+# Linux ioctl for cloning a file, from <linux/fs.h>
+FICLONE = 0x40049409
+
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Blobs are placed before the model version referencing them gets registered. Sweeps leave young
+# blobs alone so they cannot race with an import that is still in flight.
+GC_GRACE_PERIOD = timedelta(minutes=10)
+
+
+def sha256_file(path: Path) -> str:
+    """
+    Compute the sha256 of a file as a stream of large chunks.
+
+    Reads happen on a background thread a few chunks ahead of the hashing, and hashlib releases the
+    GIL while digesting, so disk reads and hashing proceed in parallel and the digest is computed at
+    close to the speed of the slower of the two.
+    """
+    chunks: queue.Queue[bytes | BaseException] = queue.Queue(maxsize=4)
+
+    def read_ahead() -> None:
+        try:
+            with path.open("rb") as f:
+                while chunk := f.read(HASH_CHUNK_BYTES):
+                    chunks.put(chunk)
+            chunks.put(b"")
+        except BaseException as e:
+            chunks.put(e)
+
+    reader = threading.Thread(target=read_ahead, name="blob-hasher", daemon=True)
+    reader.start()
+
+    digest = hashlib.sha256()
+    while True:
+        chunk = chunks.get()
+        if isinstance(chunk, BaseException):
+            raise chunk
+        if len(chunk) == 0:
+            break
+        digest.update(chunk)
+    reader.join()
+    return digest.hexdigest()
+
+
+def place_file(src: Path, dst: Path) -> str:
+    """
+    Materialize a copy of `src` at `dst`, without copying data where possible.
+
+    :return: The method used to place the file, either "reflink" or "copy".
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    try:
+        method = _reflink(src, tmp)
+        if method is None:
+            shutil.copyfile(src, tmp)
+            method = "copy"
+        # Atomic rename so that a partially placed blob is never visible under its digest.
+        os.replace(tmp, dst)
+        return method
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def move_file(src: Path, dst: Path) -> str:
+    """
+    Move `src` to `dst`, which must be on the same filesystem.
+
+    :return: The method used to place the file, "move"
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    # Atomic rename so that a partially placed blob is never visible under its digest.
+    os.replace(src, dst)
+    return "move"
+
+
+def _reflink(src: Path, dst: Path) -> str | None:
+    try:
+        with src.open("rb") as fsrc, dst.open("wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return "reflink"
+    except OSError:
+        dst.unlink(missing_ok=True)
+        return None
+
+
+@final
+class BlobStore:
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, root: Path, db: DataManager) -> None:
+        self.root = root
+        self.db = db
+        # Serializes placement and GC so that a sweep never removes a blob mid-import.
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "sha256" / digest[:2] / digest
+
+    def lookup(self, digest: str) -> BlobOut | None:
+        """
+        Find a blob that is already present in the store.
+        """
+        blob = self.db.get_blob(digest)
+        if blob is None or not Path(blob.path).is_file():
+            return None
+        return blob
+
+    def import_file(self, source: Path, *, move: bool = False) -> BlobOut:
+        """
+        Import a file into the store, returning the blob holding its contents.
+
+        Files that were imported before and have not changed since are matched without hashing them.
+
+        :param move: Move the file into the store rather than copying it, for files the server wrote
+                     itself under `root`. The file is gone once imported.
+        """
+        source = source.resolve()
+        stat = source.stat()
+        if not move:
+            digest = self.db.get_blob_digest_for_source(
+                str(source), stat.st_size, stat.st_mtime_ns
+            )
+            if digest is not None:
+                existing = self.lookup(digest)
+                if existing is not None:
+                    self.logger.info("Matched %s to known blob %s", source, digest)
+                    return existing
+
+        digest = sha256_file(source)
+        with self.lock:
+            blob = self.lookup(digest)
+            if blob is None:
+                dest = self.blob_path(digest)
+                method = move_file(source, dest) if move else place_file(source, dest)
+                self.logger.info("Placed %s into %s via %s", source, dest, method)
+                self.db.register_blob(
+                    BlobIn(
+                        digest=digest,
+                        path=str(dest),
+                        size_bytes=stat.st_size,
+                        created_at=datetime.utcnow(),
+                    )
+                )
+                blob = self.db.get_blob(digest)
+                assert blob is not None
+            if move:
+                # Already held by the store
+                source.unlink(missing_ok=True)
+            else:
+                self.db.record_blob_source(
+                    str(source), stat.st_size, stat.st_mtime_ns, digest
+                )
+        return blob
+
+    def gc(self) -> list[str]:
+        """
+        Sweep the store, removing every blob that is no longer referenced by a model version.
+
+        :return: The digests of the removed blobs
+        """
+        removed = []
+        cutoff = datetime.utcnow() - GC_GRACE_PERIOD
+        with self.lock:
+            for blob in self.db.get_blobs():
+                if blob.refcount > 0 or blob.created_at > cutoff:
+                    continue
+                self.logger.info(
+                    "Reclaiming unreferenced blob %s (%d bytes)",
+                    blob.digest,
+                    blob.size_bytes,
+                )
+                Path(blob.path).unlink(missing_ok=True)
+                self.db.delete_blob(blob.digest)
+                removed.append(blob.digest)
+        return removed
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any, Iterator, final
+
+import duckdb
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from modelserver import task_worker
+from modelserver.db._core import DataManager
+from modelserver.memory import serving_estimate
+from modelserver.runtime import InferenceRuntime
+from modelserver.types.api import TaskBatchInvocationItem, TaskInfo
+from modelserver.types.tasks import BulkInferenceTask, InProgressState
+from modelserver.types.workers import RenderedTaskInvocation
+
+"""
+Offline bulk inference: invoke a Task for every row of a dataset.
+
+The input is read in a streaming fashion, one chunk of rows at a time, and each chunk is run through
+the resident model as a single batch. Results are appended to a JSONL output file in input order.
+
+After each chunk the output is flushed to disk and a checkpoint is written next to it, recording how
+many rows are done, where to continue reading the input and how large the output was at that point.
+A job resumed from a checkpoint truncates the output back to the checkpointed size, so rows that were
+written after the last checkpoint are not duplicated.
+
+Bulk jobs run at batch priority by default, so interactive requests preempt them between rows.
+"""
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+# Rows are read in chunks of (offset after the chunk, rows)
+Chunk = tuple[int, list[dict[str, Any]]]
+
+
+class Checkpoint(BaseModel):
+    """
+    :param rows_done: Number of input rows whose results have been written
+    :param input_offset: Byte offset in a JSONL input after the last done row
+    :param output_size: Size of the output file after the last done row
+    """
+
+    rows_done: int = 0
+    input_offset: int = 0
+    output_size: int = 0
+
+
+def checkpoint_path(output_path: pathlib.Path) -> pathlib.Path:
+    return output_path.with_name(output_path.name + CHECKPOINT_SUFFIX)
+
+
+def read_checkpoint(output_path: pathlib.Path) -> Checkpoint:
+    path = checkpoint_path(output_path)
+    if not path.is_file():
+        return Checkpoint()
+    return Checkpoint.model_validate_json(path.read_text())
+
+
+def write_checkpoint(output_path: pathlib.Path, checkpoint: Checkpoint) -> None:
+    path = checkpoint_path(output_path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(checkpoint.model_dump_json())
+    os.replace(tmp, path)
+
+
+def is_parquet(input_path: pathlib.Path) -> bool:
+    return input_path.suffix == ".parquet"
+
+
+def count_rows(input_path: pathlib.Path) -> int:
+    if is_parquet(input_path):
+        row = (
+            duckdb.connect()
+            .execute("select count(*) from read_parquet(?)", [str(input_path)])
+            .fetchone()
+        )
+        return int(row[0]) if row is not None else 0
+
+    rows = 0
+    with input_path.open("rb") as f:
+        while block := f.read(8 * 1024 * 1024):
+            rows += block.count(b"\n")
+    return rows
+
+
+def read_jsonl_chunks(
+    input_path: pathlib.Path, offset: int, chunk_size: int
+) -> Iterator[Chunk]:
+    with input_path.open("rb") as f:
+        f.seek(offset)
+        rows: list[dict[str, Any]] = []
+        while line := f.readline():
+            if line.strip():
+                rows.append(json.loads(line))
+            if len(rows) == chunk_size:
+                yield f.tell(), rows
+                rows = []
+        if len(rows) > 0:
+            yield f.tell(), rows
+
+
+def read_parquet_chunks(
+    input_path: pathlib.Path, skip_rows: int, chunk_size: int
+) -> Iterator[Chunk]:
+    cursor = duckdb.connect().execute(
+        "select * from read_parquet(?) offset ?", [str(input_path), skip_rows]
+    )
+    columns = [column[0] for column in cursor.description or []]
+    while rows := cursor.fetchmany(chunk_size):
+        yield 0, [dict(zip(columns, row)) for row in rows]
+
+
+@final
+class BulkInferenceJob:
+    def __init__(
+        self,
+        task: BulkInferenceTask,
+        db: DataManager,
+        runtime: InferenceRuntime,
+        report: Callable[[InProgressState], None],
+    ) -> None:
+        self.task = task
+        self.db = db
+        self.runtime = runtime
+        self.report = report
+        self.input_path = pathlib.Path(task.input_path)
+        self.output_path = pathlib.Path(task.output_path)
+
+    def run(self) -> int:
+        """
+        Run the job to completion, resuming from its checkpoint if there is one.
+
+        :return: The number of rows in the dataset
+        """
+        return asyncio.run(self._run())
+
+    def render(
+        self, task_info: TaskInfo, first_index: int, rows: list[dict[str, Any]]
+    ) -> tuple[list[tuple[int, str]], list[TaskBatchInvocationItem]]:
+        prompts = []
+        failed = []
+        for index, row in enumerate(rows, start=first_index):
+            # Datasets may carry more columns than the Task uses, only pass along the Task's variables
+            variables = {
+                name: str(row[name]) for name in task_info.task_params if name in row
+            }
+            try:
+                prompts.append((index, task_worker.render_prompt(task_info, variables)))
+            except ValueError as e:
+                failed.append(
+                    TaskBatchInvocationItem(
+                        index=index, elapsed_seconds=0, error=str(e)
+                    )
+                )
+        return prompts, failed
+
+    async def _run(self) -> int:
+        task_info = self.db.get_task_by_name(self.task.task_name)
+        found_model = self.db.get_model_version_internal(
+            model_id=str(task_info.model_id), version=str(task_info.model_version)
+        )
+        if task_info.output_grammar is None:
+            grammar = None
+        else:
+            grammar = task_info.output_grammar.grammar_generated
+        invocation = RenderedTaskInvocation(
+            model_path=found_model.internal_params.model_path,
+            rendered_prompt="",
+            grammar=grammar,
+            temperature=self.task.temperature,
+            memory_estimate=serving_estimate(found_model.internal_params),
+            draft=found_model.internal_params.draft,
+            runtime=found_model.internal_params.runtime,
+            generation_params=task_info.generation_params,
+        )
+
+        total_rows = count_rows(self.input_path)
+        checkpoint = read_checkpoint(self.output_path)
+        if checkpoint.rows_done > 0:
+            logger.info(
+                f"Resuming bulk inference into {self.output_path} at row {checkpoint.rows_done}"
+            )
+        if is_parquet(self.input_path):
+            chunks = read_parquet_chunks(
+                self.input_path, checkpoint.rows_done, self.task.chunk_size
+            )
+        else:
+            chunks = read_jsonl_chunks(
+                self.input_path, checkpoint.input_offset, self.task.chunk_size
+            )
+
+        starttime = time.monotonic()
+        rows_at_start = checkpoint.rows_done
+        # Chunks in submission order, each with its failed rows and the input offset after it
+        in_flight: deque[
+            tuple[
+                asyncio.Task[list[TaskBatchInvocationItem]],
+                list[TaskBatchInvocationItem],
+                int,
+            ]
+        ] = deque()
+
+        async def run_chunk(
+            prompts: list[tuple[int, str]]
+        ) -> list[TaskBatchInvocationItem]:
+            items: list[TaskBatchInvocationItem] = []
+            if len(prompts) == 0:
+                return items
+            chunk_start = time.monotonic()
+            try:
+                async for item in task_worker.run_task_batch_async(
+                    self.runtime, invocation, prompts, priority=self.task.priority
+                ):
+                    items.append(item)
+            except Exception as e:
+                # A chunk that times out or cannot be admitted fails its own rows, not the whole job
+                logger.warning(f"Bulk inference chunk failed: {e}")
+                error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+                done = {item.index for item in items}
+                items.extend(
+                    TaskBatchInvocationItem(
+                        index=index,
+                        elapsed_seconds=time.monotonic() - chunk_start,
+                        error=error,
+                    )
+                    for index, _ in prompts
+                    if index not in done
+                )
+            return items
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.output_path.touch()
+        with self.output_path.open("r+b") as output:
+            # Drop anything written after the last checkpoint
+            output.truncate(checkpoint.output_size)
+            output.seek(checkpoint.output_size)
+
+            async def finish_oldest_chunk() -> None:
+                chunk, failed, input_offset = in_flight.popleft()
+                items = sorted(await chunk + failed, key=lambda item: item.index)
+                for item in items:
+                    output.write(item.model_dump_json().encode("utf-8") + b"\n")
+                output.flush()
+                os.fsync(output.fileno())
+
+                checkpoint.rows_done += len(items)
+                checkpoint.input_offset = input_offset
+                checkpoint.output_size = output.tell()
+                write_checkpoint(self.output_path, checkpoint)
+
+                elapsed = time.monotonic() - starttime
+                rate = (checkpoint.rows_done - rows_at_start) / max(elapsed, 1e-9)
+                self.report(
+                    InProgressState(
+                        progress=checkpoint.rows_done / max(total_rows, 1),
+                        items_done=checkpoint.rows_done,
+                        items_per_second=rate,
+                        eta_seconds=(
+                            max(total_rows - checkpoint.rows_done, 0) / rate
+                            if rate > 0
+                            else None
+                        ),
+                    )
+                )
+
+            try:
+                next_index = checkpoint.rows_done
+                for input_offset, rows in chunks:
+                    prompts, failed = self.render(task_info, next_index, rows)
+                    next_index += len(rows)
+                    while len(in_flight) >= self.task.max_in_flight:
+                        await finish_oldest_chunk()
+                    in_flight.append(
+                        (asyncio.create_task(run_chunk(prompts)), failed, input_offset)
+                    )
+                while len(in_flight) > 0:
+                    await finish_oldest_chunk()
+            finally:
+                for chunk, _, _ in in_flight:
+                    chunk.cancel()
+
+        return checkpoint.rows_done
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, final
+
+from modelserver.types.workers import RenderedTaskInvocation
+
+"""
+Single-flight deduplication of identical Task invocations.
+
+Greedy decoding (temperature=0) is deterministic, so identical invocations that are in flight at the
+same time produce identical token streams. Rather than generating the same completion N times, the
+first invocation starts a generation and every identical invocation that arrives before it finishes
+subscribes to the same stream of tokens:
+
+    1. Tokens are buffered on the flight as they are generated, so a late subscriber first replays
+       what has been generated so far and then follows the live stream.
+    2. Generation runs in its own asyncio Task rather than in the first caller, so the first caller
+       disconnecting does not affect any of the other subscribers.
+    3. Generation is cancelled once every subscriber has gone away.
+
+Flights are forgotten as soon as they finish, this is not a cache of completed results.
+"""
+
+logger = logging.getLogger(__name__)
+
+FlightKey = tuple[str, str, str | None, str, str, str | None, str]
+
+
+@dataclass
+class Flight:
+    tokens: list[str] = field(default_factory=list)
+    done: bool = False
+    error: BaseException | None = None
+    subscribers: int = 0
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    driver: asyncio.Task[None] | None = None
+
+
+@final
+class TaskInvocationCoalescer:
+    def __init__(self) -> None:
+        self.flights: dict[FlightKey, Flight] = {}
+
+    @staticmethod
+    def flight_key(invocation: RenderedTaskInvocation) -> FlightKey | None:
+        """
+        Identical invocations share a key. Only deterministic invocations can be coalesced.
+        """
+        if invocation.temperature != 0:
+            return None
+        return (
+            invocation.model_path,
+            invocation.rendered_prompt,
+            invocation.grammar,
+            invocation.generation_params.model_dump_json(),
+            invocation.priority.value,
+            # Versions sharing a model file may load it with different settings or draft models
+            invocation.draft.model_dump_json()
+            if invocation.draft is not None
+            else None,
+            invocation.runtime.model_dump_json(),
+        )
+
+    async def invoke(
+        self,
+        invocation: RenderedTaskInvocation,
+        generate: Callable[[], AsyncGenerator[str, str]],
+    ) -> AsyncGenerator[str, str]:
+        """
+        Stream the tokens for the invocation, joining an identical invocation that is already in
+        flight if there is one.
+
+        :param generate: Starts the generation for the invocation, called at most once per flight
+        """
+        key = self.flight_key(invocation)
+        if key is None:
+            async for token in generate():
+                yield token
+            return
+
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight()
+            self.flights[key] = flight
+            flight.driver = asyncio.create_task(self._drive(key, flight, generate))
+        else:
+            logger.info("Coalescing invocation with in-flight generation")
+
+        flight.subscribers += 1
+        try:
+            seen = 0
+            while True:
+                while seen < len(flight.tokens):
+                    yield flight.tokens[seen]
+                    seen += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                async with flight.changed:
+                    await flight.changed.wait_for(
+                        lambda: flight.done or len(flight.tokens) > seen
+                    )
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Make sure nobody joins a flight that is being cancelled
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+                assert flight.driver is not None
+                flight.driver.cancel()
+
+    async def _drive(
+        self,
+        key: FlightKey,
+        flight: Flight,
+        generate: Callable[[], AsyncGenerator[str, str]],
+    ) -> None:
+        try:
+            async for token in generate():
+                flight.tokens.append(token)
+                async with flight.changed:
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            logger.info("Cancelled generation, no subscribers left")
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+            async with flight.changed:
+                flight.changed.notify_all()
@@ -0,0 +1,71 @@
+import os
+import time
+from dataclasses import dataclass, field
+
+"""
+Partitioning of the host's CPU cores between resident model processes.
+
+llama.cpp sizes its thread pool to the machine by default, so two models decoding at once each run
+a thread per core and spend their time contending for the same cores and caches. Instead, every
+resident model process gets a partition of the cores the server may run on. The process is pinned
+to its partition with `os.sched_setaffinity` and runs as many threads as the partition has cores.
+
+Partitions are contiguous runs of core IDs, which keeps a partition's cores on the same socket and
+sharing caches where the numbering allows. They are recomputed whenever a model is loaded or
+evicted, and a process picks up its new partition at the start of its next job.
+"""
+
+
+def host_cores() -> list[int]:
+    """
+    The cores the server may run on.
+    """
+    return sorted(os.sched_getaffinity(0))
+
+
+def partition_cores(cores: list[int], count: int) -> list[list[int]]:
+    """
+    Split the cores into `count` contiguous partitions of as equal size as possible.
+
+    When there are more partitions than cores, each partition gets a single core and partitions share
+    cores round robin.
+    """
+    if count == 0:
+        return []
+    if count >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(count)]
+    size, extra = divmod(len(cores), count)
+    partitions = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        partitions.append(cores[start:end])
+        start = end
+    return partitions
+
+
+@dataclass
+class PartitionUsage:
+    """
+    CPU time used by a model process against the capacity of its partition, which may change size
+    over the lifetime of the process.
+    """
+
+    cores: list[int]
+    since: float = field(default_factory=time.monotonic)
+    # Capacity of the partition in core-seconds up to `since`
+    core_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+
+    def resize(self, cores: list[int]) -> None:
+        now = time.monotonic()
+        self.core_seconds += (now - self.since) * len(self.cores)
+        self.since = now
+        self.cores = cores
+
+    def utilization(self) -> float:
+        """
+        :return: The fraction of the partition's capacity the process has used since it was started.
+        """
+        capacity = self.core_seconds + (time.monotonic() - self.since) * len(self.cores)
+        return self.cpu_seconds / capacity if capacity > 0 else 0.0
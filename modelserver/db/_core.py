@@ -3,16 +3,22 @@ from abc import ABC, abstractmethod
 from pydantic import UUID4
 
 from modelserver.types.api import (
+    BlobIn,
+    BlobOut,
     CreateTaskRequest,
+    DraftModelParams,
     GrammarDefinition,
+    LlamaRuntimeParams,
     LoraIn,
     LoraOut,
+    MemoryEstimate,
     ModelVersionInternal,
     RegisteredModel,
     RegisterModelRequest,
     SavedExperimentIn,
     SavedExperimentOut,
     SemVer,
+    TaskGenerationParams,
     TaskInfo,
 )
 
@@ -48,6 +54,33 @@ class DataManager(ABC):
         :return:
         """
 
+    @abstractmethod
+    def set_model_version_draft(
+        self, model: str, version: str, draft: DraftModelParams | None
+    ) -> None:
+        """
+        Pair a model version with a draft model used for speculative decoding.
+        :param model: The name of the model
+        :param version: The version number
+        :param draft: The draft model, or None to stop decoding speculatively
+        """
+
+    @abstractmethod
+    def set_model_version_runtime(
+        self,
+        model: str,
+        version: str,
+        runtime: LlamaRuntimeParams,
+        memory_estimate: MemoryEstimate | None,
+    ) -> None:
+        """
+        Change the settings a model version is loaded with.
+        :param model: The name of the model
+        :param version: The version number
+        :param runtime: The settings to load the model with
+        :param memory_estimate: Estimated memory footprint of serving the model with the new settings
+        """
+
     @abstractmethod
     def delete_model_version(self, model: str, version: str) -> None:
         """
@@ -168,6 +201,14 @@ class DataManager(ABC):
         Update the input schema of variables injected into the prompt template at invocation time.
         """
 
+    @abstractmethod
+    def update_task_generation_params(
+        self, task_name: str, generation_params: TaskGenerationParams
+    ) -> None:
+        """
+        Update the settings that control when generation ends for invocations of the Task.
+        """
+
     @abstractmethod
     def get_task_by_name(self, task_name: str) -> TaskInfo:
         """
@@ -204,3 +245,44 @@ class DataManager(ABC):
         """
         Get a specific LoRA by its unique ID.
         """
+
+    @abstractmethod
+    def register_blob(self, blob: BlobIn) -> None:
+        """
+        Record a new file in the blob store. Registering an already known digest is a no-op.
+        """
+
+    @abstractmethod
+    def get_blob(self, digest: str) -> BlobOut | None:
+        """
+        Lookup a blob by its sha256 digest.
+        """
+
+    @abstractmethod
+    def get_blobs(self) -> list[BlobOut]:
+        """
+        Get all blobs along with the number of model versions referencing each of them, either as their
+        model file or as the file of their draft model.
+        """
+
+    @abstractmethod
+    def delete_blob(self, digest: str) -> None:
+        """
+        Forget a blob, along with any source files cached as having its contents.
+        """
+
+    @abstractmethod
+    def get_blob_digest_for_source(
+        self, source_path: str, size_bytes: int, mtime_ns: int
+    ) -> str | None:
+        """
+        Lookup the digest of a previously imported file, if it has not changed since.
+        """
+
+    @abstractmethod
+    def record_blob_source(
+        self, source_path: str, size_bytes: int, mtime_ns: int, digest: str
+    ) -> None:
+        """
+        Remember the digest of an imported file to skip hashing it when imported again.
+        """
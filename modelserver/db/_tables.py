@@ -93,6 +93,8 @@ task_def_table = Table(
     # A task can be defined but not yet linked to a particular backing model
     Column("backing_model_id", String, nullable=True),
     Column("backing_model_version", String, nullable=True),
+    # TaskGenerationParams as JSON, null for the defaults
+    Column("generation_params", JSON, nullable=True),
     ForeignKeyConstraint(
         ["backing_model_id", "backing_model_version"],
         ["model_version.model_id", "model_version.version"],
@@ -110,6 +112,26 @@ loras_table = Table(
     Column("source_model", String, nullable=False),
 )
 
+blob_table = Table(
+    "blob_v1",
+    metadata_obj,
+    Column("digest", String, primary_key=True),
+    Column("path", String, nullable=False),
+    Column("size_bytes", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+# Cache of files already hashed into the blob store, keyed on their path and stat info so that
+# re-importing an unchanged file does not need to hash it again.
+blob_source_table = Table(
+    "blob_source_v1",
+    metadata_obj,
+    Column("source_path", String, primary_key=True),
+    Column("size_bytes", Integer, nullable=False),
+    Column("mtime_ns", Integer, nullable=False),
+    Column("digest", String, nullable=False),
+)
+
 
 """
 Special table that contains all joined attributes of model_version_table, import_metadata_table and model_params_table.
@@ -1,11 +1,25 @@
 import json
 from datetime import datetime
-from typing import final
+from typing import Any, final
 from uuid import UUID, uuid4
 
 from fastapi import HTTPException, status
 from pydantic import UUID4
-from sqlalchemy import Engine, and_, delete, desc, event, select, update
+from sqlalchemy import (
+    Connection,
+    Engine,
+    Row,
+    Select,
+    Table,
+    and_,
+    delete,
+    desc,
+    event,
+    func,
+    or_,
+    select,
+    update,
+)
 from sqlalchemy.dialects.sqlite import Insert
 from sqlalchemy.engine.interfaces import DBAPIConnection
 from sqlalchemy.exc import IntegrityError, NoResultFound
@@ -13,12 +27,17 @@ from sqlalchemy.pool import ConnectionPoolEntry
 
 from modelserver.types.api import (
     VALID_MODEL_NAME,
+    BlobIn,
+    BlobOut,
     CompletionModelParams,
     CreateTaskRequest,
+    DraftModelParams,
     GrammarDefinition,
     ImportMetadata,
+    LlamaRuntimeParams,
     LoraIn,
     LoraOut,
+    MemoryEstimate,
     ModelRuntime,
     ModelType,
     ModelVersion,
@@ -28,11 +47,14 @@ from modelserver.types.api import (
     SavedExperimentIn,
     SavedExperimentOut,
     SemVer,
+    TaskGenerationParams,
     TaskInfo,
 )
 
 from ._core import DataManager
 from ._tables import (
+    blob_source_table,
+    blob_table,
     import_metadata_table,
     loras_table,
     metadata_obj,
@@ -61,6 +83,30 @@ def wrap_with_fk_enforcement(engine: Engine) -> Engine:
     return engine
 
 
+def parse_generation_params(generation_params: str | None) -> TaskGenerationParams:
+    if generation_params is None:
+        return TaskGenerationParams()
+    return TaskGenerationParams.model_validate_json(generation_params)
+
+
+def add_missing_columns(conn: Connection, table: Table) -> None:
+    """
+    Add columns that were introduced after a table was first created.
+
+    `create_all` only creates tables that do not exist yet, so tables in databases created by older
+    versions of the server are brought up to date here. New columns must be nullable.
+    """
+    existing = {
+        row[1] for row in conn.exec_driver_sql(f"pragma table_info({table.name})")
+    }
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(
+                f"alter table {table.name} add column {column.name} {column_type}"
+            )
+
+
 @final
 class PersistentDataManager(DataManager):
     def __init__(self, engine: Engine):
@@ -72,7 +118,8 @@ class PersistentDataManager(DataManager):
         # Delete old tables that have been supplanted
         with engine.connect() as conn:
             conn.exec_driver_sql("drop table if exists task_def_v0")
-            conn.commit
+            add_missing_columns(conn, task_def_table)
+            conn.commit()
 
     def get_registered_models(self) -> list[RegisteredModel]:
         registered_models: list[RegisteredModel] = []
@@ -86,6 +133,7 @@ class PersistentDataManager(DataManager):
                         model_version_table.c.version,
                         import_metadata_table.c.source,
                         import_metadata_table.c.imported_at,
+                        model_params_table.c.params,
                     )
                     .select_from(model_versions_joined_table)
                     .where(model_version_table.c.model_id == model_id)
@@ -94,17 +142,30 @@ class PersistentDataManager(DataManager):
                 versions: list[ModelVersion] = []
 
                 for model_version_row in model_version_rows:
-                    version, source, imported_at = model_version_row
+                    version, source, imported_at, params = model_version_row
                     import_metadata_dict = {
                         "source": json.loads(source),
                         "imported_at": imported_at,
                     }
+                    internal_params = CompletionModelParams.model_validate_json(params)
                     versions.append(
                         ModelVersion(
                             version=SemVer(version),
                             import_metadata=ImportMetadata.model_validate(
                                 import_metadata_dict
                             ),
+                            memory_estimate=internal_params.memory_estimate,
+                            draft_model_id=(
+                                internal_params.draft.model_id
+                                if internal_params.draft is not None
+                                else None
+                            ),
+                            draft_model_version=(
+                                internal_params.draft.model_version
+                                if internal_params.draft is not None
+                                else None
+                            ),
+                            runtime_params=internal_params.runtime,
                         )
                     )
 
@@ -228,6 +289,61 @@ class PersistentDataManager(DataManager):
                     detail=f"Invalid model version combo ({model}, {version})",
                 )
 
+    def set_model_version_draft(
+        self, model: str, version: str, draft: DraftModelParams | None
+    ) -> None:
+        self._update_model_version_params(model, version, draft=draft)
+
+    def set_model_version_runtime(
+        self,
+        model: str,
+        version: str,
+        runtime: LlamaRuntimeParams,
+        memory_estimate: MemoryEstimate | None,
+    ) -> None:
+        self._update_model_version_params(
+            model, version, runtime=runtime, memory_estimate=memory_estimate
+        )
+
+    def _update_model_version_params(
+        self, model: str, version: str, **changes: Any
+    ) -> None:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(model_params_table.c.model_id, model_params_table.c.params)
+                .select_from(
+                    model_params_table.join(
+                        model_table, model_params_table.c.model_id == model_table.c.id
+                    )
+                )
+                .where(
+                    and_(
+                        model_table.c.name == model,
+                        model_params_table.c.model_version == version,
+                    )
+                )
+            ).fetchone()
+            if row is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Invalid model version combo ({model}, {version})",
+                )
+            model_id, params = row
+            internal_params = CompletionModelParams.model_validate_json(
+                params
+            ).model_copy(update=changes)
+            conn.execute(
+                update(model_params_table)
+                .values(params=internal_params.model_dump_json())
+                .where(
+                    and_(
+                        model_params_table.c.model_id == model_id,
+                        model_params_table.c.model_version == version,
+                    )
+                )
+            )
+            conn.commit()
+
     def delete_model_version(self, model: str, version: str) -> None:
         with self.engine.connect() as conn:
             row = conn.execute(
@@ -470,6 +586,7 @@ class PersistentDataManager(DataManager):
                 "output_grammar_user_code": None,
                 "backing_model_id": None,
                 "backing_model_version": None,
+                "generation_params": None,
             }
 
             conn.execute(Insert(task_def_table).values(**row))
@@ -491,6 +608,7 @@ class PersistentDataManager(DataManager):
                     task_def_table.c.input_schema,
                     task_def_table.c.output_grammar,
                     task_def_table.c.output_grammar_user_code,
+                    task_def_table.c.generation_params,
                 ).select_from(task_def_table)
             ).all()
 
@@ -507,6 +625,7 @@ class PersistentDataManager(DataManager):
                     input_schema,
                     grammar,
                     grammar_user_code,
+                    generation_params,
                 ) = task
                 if model_version is None:
                     semver = None
@@ -529,6 +648,7 @@ class PersistentDataManager(DataManager):
                         prompt_template=prompt_template,
                         task_params=json.loads(input_schema),
                         output_grammar=output_grammar,
+                        generation_params=parse_generation_params(generation_params),
                     )
                 )
         return tasks
@@ -706,6 +826,27 @@ class PersistentDataManager(DataManager):
                 )
             conn.commit()
 
+    def update_task_generation_params(
+        self, task_name: str, generation_params: TaskGenerationParams
+    ) -> None:
+        with self.engine.connect() as conn:
+            if (
+                conn.execute(
+                    update(task_def_table)
+                    .values(
+                        generation_params=generation_params.model_dump_json(),
+                        updated_at=datetime.utcnow(),
+                    )
+                    .where(task_def_table.c.name == task_name)
+                ).rowcount
+                == 0
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"No task found with name {task_name}",
+                )
+            conn.commit()
+
     def get_task_by_name(self, task_name: str) -> TaskInfo:
         with self.engine.connect() as conn:
             task = conn.execute(
@@ -719,6 +860,7 @@ class PersistentDataManager(DataManager):
                     task_def_table.c.input_schema,
                     task_def_table.c.output_grammar,
                     task_def_table.c.output_grammar_user_code,
+                    task_def_table.c.generation_params,
                 )
                 .select_from(task_def_table)
                 .where(task_def_table.c.name == task_name)
@@ -739,6 +881,7 @@ class PersistentDataManager(DataManager):
                 input_schema,
                 grammar,
                 grammar_user_code,
+                generation_params,
             ) = task
 
             if model_version is None:
@@ -763,6 +906,7 @@ class PersistentDataManager(DataManager):
                 prompt_template=prompt_template,
                 task_params=json.loads(input_schema),
                 output_grammar=output_grammar,
+                generation_params=parse_generation_params(generation_params),
             )
 
     def register_lora(self, *, lora: LoraIn) -> None:
@@ -848,3 +992,133 @@ class PersistentDataManager(DataManager):
                 job_uuid=job_uuid,
                 source_model=source_model,
             )
+
+    def register_blob(self, blob: BlobIn) -> None:
+        """
+        Record a new file in the blob store. Registering an already known digest is a no-op.
+        """
+        with self.engine.connect() as conn:
+            conn.execute(
+                Insert(blob_table).values(**blob.model_dump()).on_conflict_do_nothing()
+            )
+            conn.commit()
+
+    def get_blob(self, digest: str) -> BlobOut | None:
+        """
+        Lookup a blob by its sha256 digest.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                self._select_blobs().where(blob_table.c.digest == digest)
+            ).one_or_none()
+            if row is None:
+                return None
+            return self._blob_from_row(row)
+
+    def get_blobs(self) -> list[BlobOut]:
+        """
+        Get all blobs along with the number of model versions referencing each of them, either as their
+        model file or as the file of their draft model.
+        """
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                self._select_blobs().order_by(blob_table.c.created_at)
+            ).fetchall()
+            return [self._blob_from_row(row) for row in rows]
+
+    @staticmethod
+    def _select_blobs() -> Select[tuple[str, str, int, datetime, int]]:
+        # Model params are stored as a JSON string holding the serialized params, which is unwrapped
+        # before extracting the digests referenced by it.
+        params = func.json_extract(model_params_table.c.params, "$")
+        draft_digest = func.json_extract(params, "$.draft.blob_digest")
+        refcount = (
+            select(func.count())
+            .select_from(model_params_table)
+            .where(
+                or_(
+                    func.json_extract(params, "$.blob_digest") == blob_table.c.digest,
+                    draft_digest == blob_table.c.digest,
+                    # Drafts paired before their digest was recorded reference the blob by its path
+                    and_(
+                        draft_digest.is_(None),
+                        func.json_extract(params, "$.draft.model_path")
+                        == blob_table.c.path,
+                    ),
+                )
+            )
+            .scalar_subquery()
+        )
+        return select(
+            blob_table.c.digest,
+            blob_table.c.path,
+            blob_table.c.size_bytes,
+            blob_table.c.created_at,
+            refcount,
+        ).select_from(blob_table)
+
+    @staticmethod
+    def _blob_from_row(row: Row[tuple[str, str, int, datetime, int]]) -> BlobOut:
+        digest, path, size_bytes, created_at, refcount = row
+        return BlobOut(
+            digest=digest,
+            path=path,
+            size_bytes=size_bytes,
+            created_at=created_at,
+            refcount=refcount,
+        )
+
+    def delete_blob(self, digest: str) -> None:
+        """
+        Forget a blob, along with any source files cached as having its contents.
+        """
+        with self.engine.connect() as conn:
+            conn.execute(
+                delete(blob_source_table).where(blob_source_table.c.digest == digest)
+            )
+            conn.execute(delete(blob_table).where(blob_table.c.digest == digest))
+            conn.commit()
+
+    def get_blob_digest_for_source(
+        self, source_path: str, size_bytes: int, mtime_ns: int
+    ) -> str | None:
+        """
+        Lookup the digest of a previously imported file, if it has not changed since.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(blob_source_table.c.digest)
+                .select_from(blob_source_table)
+                .where(
+                    and_(
+                        blob_source_table.c.source_path == source_path,
+                        blob_source_table.c.size_bytes == size_bytes,
+                        blob_source_table.c.mtime_ns == mtime_ns,
+                    )
+                )
+            ).one_or_none()
+            if row is None:
+                return None
+            return str(row[0])
+
+    def record_blob_source(
+        self, source_path: str, size_bytes: int, mtime_ns: int, digest: str
+    ) -> None:
+        """
+        Remember the digest of an imported file to skip hashing it when imported again.
+        """
+        row = {
+            "source_path": source_path,
+            "size_bytes": size_bytes,
+            "mtime_ns": mtime_ns,
+            "digest": digest,
+        }
+        with self.engine.connect() as conn:
+            conn.execute(
+                Insert(blob_source_table)
+                .values(**row)
+                .on_conflict_do_update(
+                    index_elements=[blob_source_table.c.source_path], set_=row
+                )
+            )
+            conn.commit()
@@ -6,15 +6,21 @@ from typing import Generator
 import pytest
 import sqlalchemy.exc
 from fastapi import HTTPException, status
+from pydantic import ValidationError
 from sqlalchemy import create_engine
 
 from modelserver.types.tasks import InProgressState, TaskState
 
 from ..types.api import (
     CreateTaskRequest,
+    DraftModelParams,
+    KVCacheType,
+    LlamaRuntimeParams,
+    MemoryEstimate,
     RegisterModelRequest,
     SavedExperimentIn,
     SemVer,
+    TaskGenerationParams,
 )
 from .sqlite import PersistentDataManager
 
@@ -120,6 +126,107 @@ def test_delete_version(db: PersistentDataManager) -> None:
     assert len(db.get_registered_models()) == 0
 
 
+def test_memory_estimate(db: PersistentDataManager) -> None:
+    estimate = MemoryEstimate(
+        n_ctx=512,
+        n_batch=512,
+        kv_cache_type=KVCacheType.f16,
+        weight_bytes=1000,
+        kv_cache_bytes=100,
+        scratch_bytes=10,
+    )
+    db.register_model(REGISTER_V1)
+    db.register_model(
+        REGISTER_V2.model_copy(
+            update=dict(
+                internal_params=REGISTER_V2.internal_params.model_copy(
+                    update=dict(memory_estimate=estimate)
+                )
+            )
+        )
+    )
+
+    [v1, v2] = db.get_registered_models()[0].versions
+    assert v1.memory_estimate is None
+    assert v2.memory_estimate == estimate
+    assert v2.memory_estimate.total_bytes == 1110
+    assert (
+        db.get_model_version_internal(
+            model_name="anewmodel", version="0.2.0"
+        ).internal_params.memory_estimate
+        == estimate
+    )
+
+
+def test_model_version_draft(db: PersistentDataManager) -> None:
+    db.register_model(REGISTER_V1)
+    db.register_model(REGISTER_V2)
+    [registered] = db.get_registered_models()
+    draft = DraftModelParams(
+        model_id=str(registered.id),
+        model_version=SemVer("0.1.0"),
+        model_path="/path/to/draft.bin",
+        num_draft_tokens=6,
+    )
+
+    db.set_model_version_draft("anewmodel", "0.2.0", draft)
+    assert (
+        db.get_model_version_internal(
+            model_name="anewmodel", version="0.2.0"
+        ).internal_params.draft
+        == draft
+    )
+    [v1, v2] = db.get_registered_models()[0].versions
+    assert v1.draft_model_id is None
+    assert (v2.draft_model_id, v2.draft_model_version) == (
+        str(registered.id),
+        SemVer("0.1.0"),
+    )
+
+    db.set_model_version_draft("anewmodel", "0.2.0", None)
+    assert (
+        db.get_model_version_internal(
+            model_name="anewmodel", version="0.2.0"
+        ).internal_params.draft
+        is None
+    )
+
+    with pytest.raises(HTTPException) as e:
+        db.set_model_version_draft("anewmodel", "9.9.9", draft)
+    assert e.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_model_version_runtime(db: PersistentDataManager) -> None:
+    db.register_model(REGISTER_V1)
+    runtime = LlamaRuntimeParams(
+        n_ctx=4096, type_k=KVCacheType.q8_0, type_v=KVCacheType.q8_0, flash_attn=True
+    )
+    estimate = MemoryEstimate(
+        n_ctx=4096,
+        n_batch=512,
+        kv_cache_type=KVCacheType.q8_0,
+        weight_bytes=1000,
+        kv_cache_bytes=200,
+        scratch_bytes=10,
+    )
+
+    db.set_model_version_runtime("anewmodel", "0.1.0", runtime, estimate)
+    internal_params = db.get_model_version_internal(
+        model_name="anewmodel", version="0.1.0"
+    ).internal_params
+    assert internal_params.runtime == runtime
+    assert internal_params.memory_estimate == estimate
+    assert db.get_registered_models()[0].versions[0].runtime_params == runtime
+
+    with pytest.raises(HTTPException) as e:
+        db.set_model_version_runtime("anewmodel", "9.9.9", runtime, estimate)
+    assert e.value.status_code == status.HTTP_404_NOT_FOUND
+
+    # llama.cpp only quantizes the values of the KV cache with flash attention
+    with pytest.raises(ValidationError):
+        LlamaRuntimeParams(type_v=KVCacheType.q4_0)
+
+
 def test_error_handling(db: PersistentDataManager) -> None:
     # Ensure duplicative model registration fails with 409 CONFLICT exception
     db.register_model(REGISTER_V1)
@@ -219,6 +326,52 @@ def test_task_defs(db: PersistentDataManager) -> None:
     assert http_ex.value.status_code == status.HTTP_400_BAD_REQUEST
 
 
+def test_task_generation_params(db: PersistentDataManager) -> None:
+    db.create_task(create_request=CreateTaskRequest(name="classifier"))
+    assert db.get_task_by_name("classifier").generation_params == TaskGenerationParams()
+
+    params = TaskGenerationParams(
+        max_tokens=8, stop=["\n"], stop_on_grammar_accept=True
+    )
+    db.update_task_generation_params("classifier", params)
+    assert db.get_task_by_name("classifier").generation_params == params
+    assert db.get_tasks()[0].generation_params == params
+
+    with pytest.raises(HTTPException) as http_ex:
+        db.update_task_generation_params("missing", params)
+    assert http_ex.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_task_def_migration(tmp_path: pathlib.Path) -> None:
+    # Database created before generation_params were introduced
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'old.db'}")
+    with engine.connect() as conn:
+        conn.exec_driver_sql(
+            """
+            create table task_def_v1 (
+                id VARCHAR primary key,
+                name VARCHAR unique,
+                created_at DATETIME not null,
+                updated_at DATETIME not null,
+                prompt_template VARCHAR not null,
+                input_schema JSON not null,
+                output_grammar VARCHAR,
+                output_grammar_user_code VARCHAR,
+                backing_model_id VARCHAR,
+                backing_model_version VARCHAR
+            )
+            """
+        )
+        conn.exec_driver_sql(
+            "insert into task_def_v1 values ('4f7b5d2e-0d6c-4c38-9d1e-5d0f1c6a8b21', 'old_task', '2023-01-01 00:00:00', '2023-01-01 00:00:00', '', '\"{}\"', null, null, null, null)"
+        )
+        conn.commit()
+
+    db = PersistentDataManager(engine)
+    assert db.get_task_by_name("old_task").generation_params == TaskGenerationParams()
+    engine.dispose()
+
+
 def test_taskdb() -> None:
     # Ensure serialization
 
@@ -365,3 +518,52 @@ def test_metrics_db(tmp_path: pathlib.Path) -> None:
         total=2,
         generate_ms=PercentileMetrics(min=1000, max=2000, p50=1000, p95=1000, p99=1000),
     )
+
+
+def test_metrics_outcomes(tmp_path: pathlib.Path) -> None:
+    from datetime import datetime
+
+    from modelserver.metrics._core import InvocationMeasurementsIn, InvocationOutcome
+    from modelserver.metrics._duckdb import DuckDBMetricStore
+
+    task_id = uuid.uuid4()
+    metrics = DuckDBMetricStore(tmp_path)
+    metrics.insert_invocations(
+        [
+            InvocationMeasurementsIn(
+                task_id=task_id,
+                # Only the completed invocation says how long generation takes
+                generate_ms=1000 if i == 0 else 30000,
+                input_tokens=100,
+                output_tokens=100,
+                ts=datetime.utcfromtimestamp(i),
+                used_grammar=False,
+                used_variables=False,
+                outcome=outcome,
+                draft_tokens=8,
+                accepted_tokens=i,
+            )
+            for i, outcome in enumerate(
+                [
+                    InvocationOutcome.completed,
+                    InvocationOutcome.cancelled,
+                    InvocationOutcome.cancelled,
+                    InvocationOutcome.timed_out,
+                    InvocationOutcome.failed,
+                ]
+            )
+        ]
+    )
+
+    summary = metrics.summarize_invocations(task_id=task_id)
+    assert (summary.total, summary.cancelled, summary.timed_out, summary.failed) == (
+        5,
+        2,
+        1,
+        1,
+    )
+    assert (summary.draft_tokens, summary.accepted_tokens) == (40, 10)
+    assert summary.generate_ms.max == summary.generate_ms.p99 == 1000
+    page = metrics.search_invocations(task_id=task_id, page_size=10).page
+    assert page[3].outcome == InvocationOutcome.timed_out
+    assert (page[3].draft_tokens, page[3].accepted_tokens) == (8, 3)
@@ -6,11 +6,16 @@ from typing import Annotated
 from fastapi import Depends
 from sqlalchemy import create_engine
 
+from modelserver.backends import FakeBackend, InferenceBackend, LlamaBackend
+from modelserver.blobstore import BlobStore
+from modelserver.coalesce import TaskInvocationCoalescer
 from modelserver.db import DataManager, PersistentDataManager
 from modelserver.db.remoteworker import InMemoryRemoteWorkerStore, RemoteWorkerStore
 from modelserver.db.tasks import PersistentTaskStore, TaskStore
+from modelserver.memory import total_memory_bytes
 from modelserver.metrics._core import MetricStore
 from modelserver.metrics._duckdb import DuckDBMetricStore
+from modelserver.runtime import InferenceRuntime
 
 PWD = Path(os.curdir)
 
@@ -20,11 +25,45 @@ Datastores
 
 engine = create_engine("sqlite+pysqlite:///v0.db")
 metrics_path = pathlib.Path(".")
+blobs_path = pathlib.Path("blobs")
+
+# Memory that resident models may occupy, defaults to 80% of physical memory.
+memory_budget_bytes = int(
+    os.environ.get("MODELSERVER_MEMORY_BUDGET_BYTES", 0.8 * total_memory_bytes())
+)
+# Read model files into the page cache before loading them.
+prewarm_readahead = os.environ.get("MODELSERVER_PREWARM_READAHEAD", "0") == "1"
+# Deadline for a single inference request.
+request_timeout_seconds = float(
+    os.environ.get("MODELSERVER_REQUEST_TIMEOUT_SECONDS", 600)
+)
+# Store the phase timeline of every task invocation with its metrics.
+record_phase_timings = os.environ.get("MODELSERVER_RECORD_PHASE_TIMINGS", "0") == "1"
+# Pin each resident model process to its own partition of the host's cores.
+partition_cores = os.environ.get("MODELSERVER_PARTITION_CORES", "1") == "1"
+# Backend that runs inference, "fake" serves every model with deterministic text for load testing.
+inference_backend: InferenceBackend = (
+    FakeBackend(
+        float(os.environ.get("MODELSERVER_FAKE_TOKENS_PER_SECOND", 50)),
+        float(os.environ.get("MODELSERVER_FAKE_PROMPT_TOKENS_PER_SECOND", 2000)),
+    )
+    if os.environ.get("MODELSERVER_BACKEND", "llama") == "fake"
+    else LlamaBackend()
+)
 
 persistent_db = PersistentDataManager(engine)
 task_store = PersistentTaskStore()
 metric_store = DuckDBMetricStore(metrics_path)
 remoteworker_store = InMemoryRemoteWorkerStore()
+blob_store = BlobStore(blobs_path, persistent_db)
+inference_runtime = InferenceRuntime(
+    memory_budget_bytes,
+    prewarm_readahead,
+    request_timeout_seconds,
+    partition_cores,
+    inference_backend,
+)
+task_coalescer = TaskInvocationCoalescer()
 
 
 def get_db() -> DataManager:
@@ -43,6 +82,18 @@ def get_remoteworker_store() -> RemoteWorkerStore:
     return remoteworker_store
 
 
+def get_blob_store() -> BlobStore:
+    return blob_store
+
+
+def get_runtime() -> InferenceRuntime:
+    return inference_runtime
+
+
+def get_task_coalescer() -> TaskInvocationCoalescer:
+    return task_coalescer
+
+
 class AppComponent:
     """
     Main component that ties together all of the DI magic into a single injectable element.
@@ -56,8 +107,15 @@ class AppComponent:
         remoteworker_store: Annotated[
             RemoteWorkerStore, Depends(get_remoteworker_store)
         ],
+        blob_store: Annotated[BlobStore, Depends(get_blob_store)],
+        runtime: Annotated[InferenceRuntime, Depends(get_runtime)],
+        coalescer: Annotated[TaskInvocationCoalescer, Depends(get_task_coalescer)],
     ) -> None:
         self.db = db
         self.taskdb = taskdb
         self.metrics = metric_store
         self.remoteworker_store = remoteworker_store
+        self.blobs = blob_store
+        self.runtime = runtime
+        self.coalescer = coalescer
+        self.record_phase_timings = record_phase_timings
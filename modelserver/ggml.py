@@ -3,7 +3,7 @@ import pathlib
 import struct
 from dataclasses import dataclass
 from io import SEEK_CUR, BufferedReader
-from typing import List, Tuple, Union
+from typing import Any, List, Tuple, Union
 
 GGML_FORMATS = {
     b"lmgg": "ggml",
@@ -273,6 +273,216 @@ class GGMLFile:
         return int(GGML_TYPE_SIZE[ggml_type] * ne / GGML_BLOCK_SIZE[ggml_type])
 
 
+"""
+GGUF support.
+
+GGUF supplanted the GGML/GGJT family of files, and renumbered the tensor types along the way. The
+traits below follow the modern `ggml_type` enum, mapping each type to its (block size, bytes per block).
+"""
+
+GGUF_MAGIC = b"GGUF"
+GGUF_DEFAULT_ALIGNMENT = 32
+
+GGUF_TYPE_TRAITS: dict[int, Tuple[int, int]] = {
+    0: (1, 4),  # F32
+    1: (1, 2),  # F16
+    2: (QK4_0, 2 + 16),  # Q4_0
+    3: (QK4_1, 2 * 2 + 16),  # Q4_1
+    6: (QK5_0, 2 + 4 + 16),  # Q5_0
+    7: (QK5_1, 2 + 2 + 4 + 16),  # Q5_1
+    8: (QK8_0, 2 + 32),  # Q8_0
+    9: (QK8_1, 2 + 2 + 32),  # Q8_1
+    10: (QK_K, 16 + 64 + 2 + 2),  # Q2_K
+    11: (QK_K, 32 + 64 + 12 + 2),  # Q3_K
+    12: (QK_K, 2 + 2 + 12 + 128),  # Q4_K
+    13: (QK_K, 2 + 2 + 12 + 32 + 128),  # Q5_K
+    14: (QK_K, 128 + 64 + 16 + 2),  # Q6_K
+    15: (QK_K, 4 + 256 + 32),  # Q8_K
+    16: (QK_K, 2 + 64),  # IQ2_XXS
+    17: (QK_K, 2 + 64 + 8),  # IQ2_XS
+    18: (QK_K, 2 + 96),  # IQ3_XXS
+    19: (QK_K, 2 + 32 + 16),  # IQ1_S
+    20: (32, 2 + 16),  # IQ4_NL
+    21: (QK_K, 2 + 64 + 32 + 8 + 4),  # IQ3_S
+    22: (QK_K, 2 + 64 + 8 + 8),  # IQ2_S
+    23: (QK_K, 2 + 2 + 4 + 128),  # IQ4_XS
+    24: (1, 1),  # I8
+    25: (1, 2),  # I16
+    26: (1, 4),  # I32
+    27: (1, 8),  # I64
+    28: (1, 8),  # F64
+    29: (QK_K, 32 + 16 + 8),  # IQ1_M
+    30: (1, 2),  # BF16
+}
+
+# GGUF metadata value types
+GGUF_VALUE_UINT8 = 0
+GGUF_VALUE_INT8 = 1
+GGUF_VALUE_UINT16 = 2
+GGUF_VALUE_INT16 = 3
+GGUF_VALUE_UINT32 = 4
+GGUF_VALUE_INT32 = 5
+GGUF_VALUE_FLOAT32 = 6
+GGUF_VALUE_BOOL = 7
+GGUF_VALUE_STRING = 8
+GGUF_VALUE_ARRAY = 9
+GGUF_VALUE_UINT64 = 10
+GGUF_VALUE_INT64 = 11
+GGUF_VALUE_FLOAT64 = 12
+
+GGUF_SCALAR_FORMATS = {
+    GGUF_VALUE_UINT8: "<B",
+    GGUF_VALUE_INT8: "<b",
+    GGUF_VALUE_UINT16: "<H",
+    GGUF_VALUE_INT16: "<h",
+    GGUF_VALUE_UINT32: "<I",
+    GGUF_VALUE_INT32: "<i",
+    GGUF_VALUE_FLOAT32: "<f",
+    GGUF_VALUE_BOOL: "<?",
+    GGUF_VALUE_UINT64: "<Q",
+    GGUF_VALUE_INT64: "<q",
+    GGUF_VALUE_FLOAT64: "<d",
+}
+
+
+@dataclass
+class GGUFTensorDescriptor:
+    name: str
+    ggml_type: int
+    dims: List[int]
+    # Offset of the tensor's data from the start of the data section
+    offset: int = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return calc_gguf_tensor_size(self.ggml_type, self.dims)
+
+
+@dataclass
+class GGUFFileFields:
+    filename: str
+    version: int
+    metadata: dict[str, Any]
+    tensors: List[GGUFTensorDescriptor]
+    # Offset of the data section from the start of the file
+    data_offset: int = 0
+
+    @property
+    def architecture(self) -> str:
+        return str(self.metadata.get("general.architecture", "llama"))
+
+    def arch_field(self, name: str) -> Any:
+        """
+        Lookup an architecture-scoped metadata field, e.g. `llama.block_count`.
+        """
+        return self.metadata.get(f"{self.architecture}.{name}")
+
+
+def calc_gguf_tensor_size(ggml_type: int, dims: List[int]) -> int:
+    if ggml_type not in GGUF_TYPE_TRAITS:
+        raise GGMLParseError(f"Unsupported GGUF tensor type {ggml_type}")
+    block_size, type_size = GGUF_TYPE_TRAITS[ggml_type]
+    ne = functools.reduce(lambda d, p: d * p, dims, 1)
+    return type_size * ne // block_size
+
+
+class GGUFFile:
+    """
+    Reader for the header section of a GGUF file: the key-value metadata and the tensor table.
+
+    Array-valued metadata (e.g. the tokenizer vocabulary) is summarized by its length rather than read
+    into memory, as none of our consumers need its contents.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        if not (path.resolve().exists() and path.resolve().is_file()):
+            raise ValueError(f"Invalid path: must be file {path}")
+        self._path = path
+
+    @staticmethod
+    def is_gguf(path: pathlib.Path) -> bool:
+        with path.resolve().open("rb") as fp:
+            return fp.read(4) == GGUF_MAGIC
+
+    def read_structure(self) -> GGUFFileFields:
+        with self._path.resolve().open("rb") as fp:
+            magic = fp.read(4)
+            if magic != GGUF_MAGIC:
+                raise GGMLParseError(f"Invalid GGUF magic {magic!r}")
+            version = self.read_scalar(fp, GGUF_VALUE_UINT32)
+            if version < 2:
+                raise GGMLCompatibilityError(
+                    f"GGUF v{version} is no longer supported, upgrade your GGUF file"
+                )
+            n_tensors = self.read_scalar(fp, GGUF_VALUE_UINT64)
+            n_kv = self.read_scalar(fp, GGUF_VALUE_UINT64)
+
+            metadata: dict[str, Any] = {}
+            for _ in range(n_kv):
+                key = self.read_string(fp)
+                value_type = self.read_scalar(fp, GGUF_VALUE_UINT32)
+                metadata[key] = self.read_value(fp, value_type)
+
+            tensors: List[GGUFTensorDescriptor] = []
+            for _ in range(n_tensors):
+                name = self.read_string(fp)
+                n_dims = self.read_scalar(fp, GGUF_VALUE_UINT32)
+                dims = [self.read_scalar(fp, GGUF_VALUE_UINT64) for _ in range(n_dims)]
+                ggml_type = self.read_scalar(fp, GGUF_VALUE_UINT32)
+                offset = self.read_scalar(fp, GGUF_VALUE_UINT64)
+                tensors.append(
+                    GGUFTensorDescriptor(
+                        name=name, ggml_type=ggml_type, dims=dims, offset=offset
+                    )
+                )
+
+            # The data section starts at the next multiple of the alignment after the header
+            alignment = int(metadata.get("general.alignment", GGUF_DEFAULT_ALIGNMENT))
+            data_offset = -(-fp.tell() // alignment) * alignment
+
+            return GGUFFileFields(
+                filename=str(self._path.absolute()),
+                version=version,
+                metadata=metadata,
+                tensors=tensors,
+                data_offset=data_offset,
+            )
+
+    def read_scalar(self, fp: BufferedReader, value_type: int) -> Any:
+        fmt = GGUF_SCALAR_FORMATS[value_type]
+        size = struct.calcsize(fmt)
+        buf = fp.read(size)
+        if len(buf) < size:
+            raise GGMLParseError("Unexpected EOF while reading GGUF header")
+        [value] = struct.unpack(fmt, buf)
+        return value
+
+    def read_string(self, fp: BufferedReader) -> str:
+        length = self.read_scalar(fp, GGUF_VALUE_UINT64)
+        return str(fp.read(length), encoding="utf-8", errors="replace")
+
+    def read_value(self, fp: BufferedReader, value_type: int) -> Any:
+        if value_type == GGUF_VALUE_STRING:
+            return self.read_string(fp)
+        if value_type == GGUF_VALUE_ARRAY:
+            item_type = self.read_scalar(fp, GGUF_VALUE_UINT32)
+            length = self.read_scalar(fp, GGUF_VALUE_UINT64)
+            if item_type == GGUF_VALUE_STRING:
+                for _ in range(length):
+                    fp.seek(self.read_scalar(fp, GGUF_VALUE_UINT64), SEEK_CUR)
+            elif item_type in GGUF_SCALAR_FORMATS:
+                fp.seek(
+                    length * struct.calcsize(GGUF_SCALAR_FORMATS[item_type]), SEEK_CUR
+                )
+            else:
+                for _ in range(length):
+                    self.read_value(fp, item_type)
+            return length
+        if value_type not in GGUF_SCALAR_FORMATS:
+            raise GGMLParseError(f"Invalid GGUF metadata type {value_type}")
+        return self.read_scalar(fp, value_type)
+
+
 class GGMLParseError(Exception):
     def __init__(self, reason: str) -> None:
         super().__init__(reason)
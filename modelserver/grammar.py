@@ -0,0 +1,408 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import final
+
+"""
+A GBNF grammar matcher, used to find the text a grammar forces next.
+
+Task grammars describe JSON documents, where long stretches of output such as keys, quotes and
+colons are fully determined by the grammar. The matcher follows the output generated so far and
+reports the longest continuation the grammar allows no alternative to.
+
+Grammars are parsed into rules made of alternatives, each a sequence of character sets and rule
+references, with repetitions rewritten into recursive rules the same way llama.cpp does. Matching
+follows llama.cpp's approach: the matcher holds the set of stacks of positions within alternatives
+that are consistent with the input so far, where the top of every stack is a character set.
+"""
+
+
+class GrammarError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class CharSet:
+    """
+    Matches a single code point within any of the inclusive ranges, or outside all of them if negated.
+    """
+
+    ranges: tuple[tuple[int, int], ...]
+    negated: bool = False
+
+    def matches(self, c: int) -> bool:
+        return any(lo <= c <= hi for lo, hi in self.ranges) != self.negated
+
+    def single(self) -> int | None:
+        """
+        :return: The only code point the set matches, if it matches exactly one.
+        """
+        if (
+            self.negated
+            or len(self.ranges) != 1
+            or self.ranges[0][0] != self.ranges[0][1]
+        ):
+            return None
+        return self.ranges[0][0]
+
+
+@dataclass(frozen=True)
+class RuleRef:
+    rule: int
+
+
+Symbol = CharSet | RuleRef
+Alternative = tuple[Symbol, ...]
+
+
+@dataclass(frozen=True)
+class Grammar:
+    rules: tuple[tuple[Alternative, ...], ...]
+    root: int
+
+
+# Position of the next symbol to match: (rule, alternative, index into the alternative)
+Frame = tuple[int, int, int]
+Stack = tuple[Frame, ...]
+
+TOKEN_PATTERN = re.compile(
+    r"""
+      (?P<space>\s+|\#[^\n]*)
+    | (?P<name>[a-zA-Z0-9-]+)
+    | (?P<define>::=)
+    | (?P<literal>"(?:[^"\\]|\\.)*")
+    | (?P<charclass>\[(?:[^\]\\]|\\.)*\])
+    | (?P<op>[()|*+?.])
+    """,
+    re.VERBOSE,
+)
+
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "\\": "\\", '"': '"', "[": "[", "]": "]"}
+
+
+def _unescape(body: str) -> list[int]:
+    """
+    Decode the body of a literal or character class into code points.
+    """
+    out = []
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c != "\\":
+            out.append(ord(c))
+            i += 1
+            continue
+        if i + 1 >= len(body):
+            raise GrammarError("dangling escape")
+        e = body[i + 1]
+        width = {"x": 2, "u": 4, "U": 8}.get(e)
+        if width is not None:
+            digits = body[i + 2 : i + 2 + width]
+            if len(digits) != width:
+                raise GrammarError(f"truncated escape \\{e}{digits}")
+            out.append(int(digits, 16))
+            i += 2 + width
+        elif e in ESCAPES:
+            out.append(ord(ESCAPES[e]))
+            i += 2
+        else:
+            # Other escaped characters stand for themselves, such as \- in a character class
+            out.append(ord(e))
+            i += 2
+    return out
+
+
+def _charclass(body: str) -> CharSet:
+    negated = body.startswith("^")
+    if negated:
+        body = body[1:]
+    return CharSet(tuple(_ranges(body)), negated)
+
+
+def _ranges(body: str) -> list[tuple[int, int]]:
+    """
+    Decode the body of a character class into inclusive ranges, where an unescaped '-' between two
+    characters spells a range.
+    """
+    ranges: list[tuple[int, int]] = []
+    i = 0
+    items: list[int | None] = []  # None marks a range dash
+    while i < len(body):
+        if body[i] == "\\":
+            end = i + 2
+            width = {"x": 2, "u": 4, "U": 8}.get(
+                body[i + 1] if i + 1 < len(body) else ""
+            )
+            if width is not None:
+                end += width
+            items.extend(_unescape(body[i:end]))
+            i = end
+        elif body[i] == "-" and len(items) > 0 and i + 1 < len(body):
+            items.append(None)
+            i += 1
+        else:
+            items.append(ord(body[i]))
+            i += 1
+    j = 0
+    while j < len(items):
+        lo = items[j]
+        assert lo is not None
+        if j + 2 < len(items) and items[j + 1] is None:
+            hi = items[j + 2]
+            assert hi is not None
+            ranges.append((lo, hi))
+            j += 3
+        else:
+            ranges.append((lo, lo))
+            j += 1
+    return ranges
+
+
+@final
+class _Parser:
+    def __init__(self, text: str) -> None:
+        self.tokens: list[tuple[str, str]] = []
+        pos = 0
+        while pos < len(text):
+            m = TOKEN_PATTERN.match(text, pos)
+            if m is None:
+                raise GrammarError(f"unexpected input at {text[pos:pos + 20]!r}")
+            kind = m.lastgroup
+            assert kind is not None
+            if kind != "space":
+                self.tokens.append((kind, m.group()))
+            pos = m.end()
+        self.pos = 0
+        self.rule_ids: dict[str, int] = {}
+        self.rules: list[list[Alternative]] = []
+        self.defined: set[str] = set()
+
+    def peek(self, offset: int = 0) -> tuple[str, str] | None:
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset]
+        return None
+
+    def rule_id(self, name: str) -> int:
+        if name not in self.rule_ids:
+            self.rule_ids[name] = len(self.rules)
+            self.rules.append([])
+        return self.rule_ids[name]
+
+    def new_rule(self, alternatives: list[Alternative]) -> int:
+        self.rules.append(alternatives)
+        return len(self.rules) - 1
+
+    def at_rule_start(self) -> bool:
+        first, second = self.peek(), self.peek(1)
+        return (
+            first is not None
+            and first[0] == "name"
+            and second is not None
+            and second[0] == "define"
+        )
+
+    def parse(self) -> Grammar:
+        while self.peek() is not None:
+            if not self.at_rule_start():
+                raise GrammarError(f"expected a rule definition at {self.peek()}")
+            name = self.tokens[self.pos][1]
+            self.pos += 2
+            self.rules[self.rule_id(name)] = self.parse_alternatives()
+            self.defined.add(name)
+        undefined = set(self.rule_ids.keys()) - self.defined
+        if len(undefined) > 0:
+            raise GrammarError(f"undefined rules: {sorted(undefined)}")
+        if "root" not in self.rule_ids:
+            raise GrammarError("grammar has no root rule")
+        return Grammar(
+            rules=tuple(tuple(alternatives) for alternatives in self.rules),
+            root=self.rule_ids["root"],
+        )
+
+    def parse_alternatives(self) -> list[Alternative]:
+        alternatives = [self.parse_sequence()]
+        while (token := self.peek()) is not None and token == ("op", "|"):
+            self.pos += 1
+            alternatives.append(self.parse_sequence())
+        return alternatives
+
+    def parse_sequence(self) -> Alternative:
+        sequence: list[Symbol] = []
+        while (token := self.peek()) is not None and not self.at_rule_start():
+            kind, value = token
+            last: list[Symbol]
+            if kind == "literal":
+                self.pos += 1
+                last = [CharSet(((c, c),)) for c in _unescape(value[1:-1])]
+            elif kind == "charclass":
+                self.pos += 1
+                last = [_charclass(value[1:-1])]
+            elif kind == "name":
+                self.pos += 1
+                last = [RuleRef(self.rule_id(value))]
+            elif token == ("op", "."):
+                self.pos += 1
+                last = [CharSet((), negated=True)]
+            elif token == ("op", "("):
+                self.pos += 1
+                group = self.parse_alternatives()
+                if self.peek() != ("op", ")"):
+                    raise GrammarError("unbalanced parentheses")
+                self.pos += 1
+                last = [RuleRef(self.new_rule(group))]
+            elif kind == "op" and value in "*+?":
+                raise GrammarError(f"repetition {value} without an element")
+            else:
+                break
+
+            if (
+                (token := self.peek()) is not None
+                and token[0] == "op"
+                and token[1] in "*+?"
+            ):
+                self.pos += 1
+                element = tuple(last)
+                if token[1] == "?":
+                    last = [RuleRef(self.new_rule([element, ()]))]
+                else:
+                    # x* becomes R ::= x R | (empty), x+ becomes x R
+                    rule = self.new_rule([])
+                    self.rules[rule] = [element + (RuleRef(rule),), ()]
+                    last = [RuleRef(rule)]
+                    if token[1] == "+":
+                        last = list(element) + last
+            sequence.extend(last)
+        return tuple(sequence)
+
+
+@lru_cache(maxsize=32)
+def parse_gbnf(text: str) -> Grammar:
+    """
+    Parse a grammar in llama.cpp's GBNF format.
+
+    :raises GrammarError: If the grammar is malformed or uses syntax this parser does not support.
+    """
+    return _Parser(text).parse()
+
+
+@final
+class GrammarMatcher:
+    """
+    Tracks which positions in the grammar are consistent with the text matched so far.
+    """
+
+    def __init__(self, grammar: Grammar) -> None:
+        """
+        :raises GrammarError: If the grammar is left recursive, which the matcher cannot follow.
+        """
+        self.grammar = grammar
+        # Expanding every alternative up front finds left recursion anywhere in the grammar, rather
+        # than part way through matching output
+        for rule, alternatives in enumerate(grammar.rules):
+            for alternative in range(len(alternatives)):
+                self._expand(
+                    ((rule, alternative, 0),),
+                    set(),
+                    (frozenset({(rule, alternative)}),),
+                )
+        stacks: set[Stack] = set()
+        for alternative in range(len(grammar.rules[grammar.root])):
+            self._expand(
+                ((grammar.root, alternative, 0),),
+                stacks,
+                (frozenset({(grammar.root, alternative)}),),
+            )
+        self.stacks = frozenset(stacks)
+
+    def _expand(
+        self,
+        stack: Stack,
+        out: set[Stack],
+        expanding: tuple[frozenset[tuple[int, int]], ...],
+    ) -> None:
+        """
+        Resolve the top of the stack down to character sets, adding every resulting stack to `out`.
+
+        :param expanding: For each frame of the stack, the (rule, alternative) pairs entered by this
+            expansion that finish along with it. Entering one of them again before matching a
+            character is left recursion, which would never reach a character set.
+        :raises GrammarError: On left recursion.
+        """
+        if len(stack) == 0:
+            out.add(stack)
+            return
+        rule, alternative, index = stack[-1]
+        symbols = self.grammar.rules[rule][alternative]
+        if index == len(symbols):
+            self._expand(stack[:-1], out, expanding[:-1])
+            return
+        symbol = symbols[index]
+        if isinstance(symbol, CharSet):
+            out.add(stack)
+            return
+        # Drop frames that are finished once the referenced rule is matched, so that repetitions,
+        # which are right-recursive, do not grow the stack.
+        rest, rest_expanding = stack[:-1], expanding[:-1]
+        entered = expanding[-1]
+        if index + 1 < len(symbols):
+            rest = rest + ((rule, alternative, index + 1),)
+            rest_expanding = expanding
+            entered = frozenset()
+        for referenced in range(len(self.grammar.rules[symbol.rule])):
+            if any((symbol.rule, referenced) in pairs for pairs in expanding):
+                raise GrammarError("Left recursive grammars are not supported")
+            self._expand(
+                rest + ((symbol.rule, referenced, 0),),
+                out,
+                rest_expanding + (entered | {(symbol.rule, referenced)},),
+            )
+
+    def _step(self, stacks: frozenset[Stack], c: int) -> frozenset[Stack]:
+        out: set[Stack] = set()
+        for stack in stacks:
+            if len(stack) == 0:
+                continue
+            rule, alternative, index = stack[-1]
+            symbol = self.grammar.rules[rule][alternative][index]
+            assert isinstance(symbol, CharSet)
+            if symbol.matches(c):
+                self._expand(
+                    stack[:-1] + ((rule, alternative, index + 1),),
+                    out,
+                    (frozenset(),) * len(stack),
+                )
+        return frozenset(out)
+
+    def advance(self, text: str) -> bool:
+        """
+        Match the text against the grammar.
+
+        :return: False if the grammar does not allow the text, in which case the matcher is exhausted.
+        """
+        for c in text:
+            self.stacks = self._step(self.stacks, ord(c))
+            if len(self.stacks) == 0:
+                return False
+        return True
+
+    def forced(self, limit: int) -> str:
+        """
+        The text the grammar requires next, up to the first point where it allows a choice or the end
+        of the output.
+        """
+        stacks = self.stacks
+        out: list[str] = []
+        while len(out) < limit and len(stacks) > 0 and () not in stacks:
+            choices = set()
+            for stack in stacks:
+                rule, alternative, index = stack[-1]
+                symbol = self.grammar.rules[rule][alternative][index]
+                assert isinstance(symbol, CharSet)
+                choices.add(symbol.single())
+            if len(choices) != 1 or None in choices:
+                break
+            [c] = choices
+            assert c is not None
+            out.append(chr(c))
+            stacks = self._step(stacks, c)
+        return "".join(out)
@@ -0,0 +1,280 @@
+import logging
+import os
+import pathlib
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+
+from modelserver.ggml import (
+    GGML_BLOCK_SIZE,
+    GGML_TYPE_NAMES,
+    GGML_TYPE_SIZE,
+    GGUF_TYPE_TRAITS,
+    GGMLFile,
+    GGUFFile,
+)
+from modelserver.types.api import (
+    CompletionModelParams,
+    KVCacheType,
+    LlamaRuntimeParams,
+    MemoryEstimate,
+)
+
+"""
+Estimate the memory footprint of serving a model before it gets loaded.
+
+The estimate is made of three parts:
+
+    1. Weights: the sum of the sizes of every tensor in the file's tensor table.
+    2. KV cache: one key and one value vector per layer for each of the `n_ctx` tokens of context.
+    3. Scratch: the f32 compute buffers needed to evaluate a batch of `n_batch` tokens, namely
+       the logits, the attention scores and the widest intermediate activations.
+
+These are upper bounds that mirror how llama.cpp sizes its buffers, which lets us refuse a request
+with a clear error before a model load pushes the host into swap or the OOM killer.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Defaults used by llama-cpp-python when a Llama is constructed without overrides.
+DEFAULT_N_CTX = 512
+DEFAULT_N_BATCH = 512
+DEFAULT_KV_CACHE_TYPE = KVCacheType.f16
+
+# ggml_type used to store each KV cache type, indexes into GGUF_TYPE_TRAITS
+KV_CACHE_GGML_TYPES = {
+    KVCacheType.f32: 0,
+    KVCacheType.f16: 1,
+    KVCacheType.q8_0: 8,
+    KVCacheType.q4_0: 2,
+}
+
+
+@dataclass
+class ModelShape:
+    """
+    The hyperparameters of a transformer that determine its memory footprint.
+    """
+
+    n_layer: int
+    n_embd: int
+    n_head: int
+    n_head_kv: int
+    n_embd_head_k: int
+    n_embd_head_v: int
+    n_ff: int
+    n_vocab: int
+    n_ctx_train: int
+    weight_bytes: int
+
+
+def read_model_shape(model_path: pathlib.Path) -> ModelShape:
+    """
+    Read the shape of the model from the header of a GGUF or legacy GGML file.
+    """
+    if GGUFFile.is_gguf(model_path):
+        gguf = GGUFFile(model_path).read_structure()
+        n_embd = int(gguf.arch_field("embedding_length"))
+        n_head = int(gguf.arch_field("attention.head_count"))
+        n_head_kv = int(gguf.arch_field("attention.head_count_kv") or n_head)
+        n_vocab = gguf.arch_field("vocab_size") or gguf.metadata.get(
+            "tokenizer.ggml.tokens", 0
+        )
+        return ModelShape(
+            n_layer=int(gguf.arch_field("block_count")),
+            n_embd=n_embd,
+            n_head=n_head,
+            n_head_kv=n_head_kv,
+            n_embd_head_k=int(
+                gguf.arch_field("attention.key_length") or n_embd // n_head
+            ),
+            n_embd_head_v=int(
+                gguf.arch_field("attention.value_length") or n_embd // n_head
+            ),
+            n_ff=int(gguf.arch_field("feed_forward_length") or 4 * n_embd),
+            n_vocab=int(n_vocab),
+            n_ctx_train=int(gguf.arch_field("context_length") or DEFAULT_N_CTX),
+            weight_bytes=sum(tensor.size_bytes for tensor in gguf.tensors),
+        )
+
+    ggml = GGMLFile(model_path).read_structure()
+    # Legacy GGML files predate grouped-query attention and did not record n_ff, which llama.cpp
+    # derived from n_mult.
+    n_ff = ((2 * (4 * ggml.n_embd) // 3 + ggml.n_mult - 1) // ggml.n_mult) * ggml.n_mult
+    weight_bytes = 0
+    for tensor in ggml.tensors:
+        ggml_type = GGML_TYPE_NAMES.index(tensor.ggml_type)
+        n_elements = 1
+        for dim in tensor.dims:
+            n_elements *= dim
+        weight_bytes += (
+            GGML_TYPE_SIZE[ggml_type] * n_elements // GGML_BLOCK_SIZE[ggml_type]
+        )
+    return ModelShape(
+        n_layer=ggml.n_layer,
+        n_embd=ggml.n_embd,
+        n_head=ggml.n_head,
+        n_head_kv=ggml.n_head,
+        n_embd_head_k=ggml.n_embd // ggml.n_head,
+        n_embd_head_v=ggml.n_embd // ggml.n_head,
+        n_ff=n_ff,
+        n_vocab=ggml.n_vocab,
+        n_ctx_train=2048,
+        weight_bytes=weight_bytes,
+    )
+
+
+def estimate_memory(
+    shape: ModelShape,
+    *,
+    n_ctx: int = DEFAULT_N_CTX,
+    n_batch: int = DEFAULT_N_BATCH,
+    kv_cache_type: KVCacheType = DEFAULT_KV_CACHE_TYPE,
+    v_cache_type: KVCacheType | None = None,
+    flash_attn: bool = False,
+) -> MemoryEstimate:
+    """
+    Compute the memory needed to serve a model of the given shape.
+
+    :param n_ctx: Size of the context window. A value of 0 uses the context size the model was trained with.
+    :param n_batch: Maximum number of tokens evaluated in a single forward pass.
+    :param kv_cache_type: Element type of the KV cache.
+    :param v_cache_type: Element type of the values in the KV cache, if it differs from the keys.
+    :param flash_attn: Whether attention is computed with flash attention, which does not materialize
+                       the attention scores.
+    """
+    if n_ctx == 0:
+        n_ctx = shape.n_ctx_train
+    n_batch = min(n_batch, n_ctx)
+    if v_cache_type == kv_cache_type:
+        v_cache_type = None
+
+    def cache_bytes(cache_type: KVCacheType, n_embd_head: int) -> int:
+        block_size, type_size = GGUF_TYPE_TRAITS[KV_CACHE_GGML_TYPES[cache_type]]
+        elements = shape.n_layer * n_ctx * shape.n_head_kv * n_embd_head
+        return elements * type_size // block_size
+
+    kv_cache_bytes = cache_bytes(kv_cache_type, shape.n_embd_head_k) + cache_bytes(
+        v_cache_type or kv_cache_type, shape.n_embd_head_v
+    )
+
+    f32_bytes = 4
+    scratch_bytes = f32_bytes * (
+        # logits
+        n_batch * shape.n_vocab
+        # KQ attention scores for the full context
+        + (0 if flash_attn else shape.n_head * n_ctx * n_batch)
+        # gate and up projections of the feed-forward block
+        + 2 * n_batch * shape.n_ff
+        # residual stream, normed input and attention output
+        + 4 * n_batch * shape.n_embd
+    )
+
+    return MemoryEstimate(
+        n_ctx=n_ctx,
+        n_batch=n_batch,
+        kv_cache_type=kv_cache_type,
+        v_cache_type=v_cache_type,
+        weight_bytes=shape.weight_bytes,
+        kv_cache_bytes=kv_cache_bytes,
+        scratch_bytes=scratch_bytes,
+    )
+
+
+def estimate_model_memory(
+    model_path: str,
+    *,
+    n_ctx: int = DEFAULT_N_CTX,
+    n_batch: int = DEFAULT_N_BATCH,
+    kv_cache_type: KVCacheType = DEFAULT_KV_CACHE_TYPE,
+    v_cache_type: KVCacheType | None = None,
+    flash_attn: bool = False,
+) -> MemoryEstimate | None:
+    """
+    Estimate the memory footprint of the model file at `model_path`.
+
+    :return: The estimate, or None if the file could not be parsed.
+    """
+    try:
+        shape = read_model_shape(pathlib.Path(model_path))
+    except Exception as e:
+        logger.warning("Failed estimating memory for %s: %s", model_path, e)
+        return None
+    return estimate_memory(
+        shape,
+        n_ctx=n_ctx,
+        n_batch=n_batch,
+        kv_cache_type=kv_cache_type,
+        v_cache_type=v_cache_type,
+        flash_attn=flash_attn,
+    )
+
+
+def estimate_runtime_memory(
+    model_path: str, runtime: LlamaRuntimeParams
+) -> MemoryEstimate | None:
+    """
+    Estimate the memory footprint of the model file when loaded with the runtime settings.
+    """
+    return estimate_model_memory(
+        model_path,
+        n_ctx=runtime.n_ctx,
+        n_batch=runtime.n_batch,
+        kv_cache_type=runtime.type_k,
+        v_cache_type=runtime.type_v,
+        flash_attn=runtime.flash_attn,
+    )
+
+
+def available_memory_bytes() -> int:
+    """
+    Memory that can be allocated without swapping, as reported by the kernel.
+    """
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def total_memory_bytes() -> int:
+    """
+    Physical memory installed on the host.
+    """
+    return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def serving_estimate(params: CompletionModelParams) -> MemoryEstimate | None:
+    """
+    Estimate the memory needed to serve a model version, including its draft model if it has one.
+    """
+    estimate = params.memory_estimate
+    if estimate is None or params.draft is None or params.draft.memory_estimate is None:
+        return estimate
+    draft = params.draft.memory_estimate
+    return estimate.model_copy(
+        update={
+            "weight_bytes": estimate.weight_bytes + draft.weight_bytes,
+            "kv_cache_bytes": estimate.kv_cache_bytes + draft.kv_cache_bytes,
+            "scratch_bytes": estimate.scratch_bytes + draft.scratch_bytes,
+        }
+    )
+
+
+def check_admission(estimate: MemoryEstimate | None) -> None:
+    """
+    Refuse to load a model that would not fit in the memory currently available on the host.
+
+    Models imported without an estimate are always admitted.
+    """
+    if estimate is None:
+        return
+    available = available_memory_bytes()
+    if estimate.total_bytes > available:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Insufficient memory to load model: needs {estimate.total_bytes} bytes, {available} available",
+        )
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
+from enum import Enum
 from uuid import UUID
 
 from pydantic import UUID1, UUID4, BaseModel
@@ -17,6 +18,17 @@ class PercentileMetrics(BaseModel):
     p99: float
 
 
+class InvocationOutcome(str, Enum):
+    """
+    How an invocation ended.
+    """
+
+    completed = "completed"
+    cancelled = "cancelled"  # the client went away before generation finished
+    timed_out = "timed_out"  # generation did not finish before the request deadline
+    failed = "failed"  # generation raised an error, or the model could not be loaded
+
+
 class InvocationMeasurementsIn(BaseModel):
     """
     Recording of invocation measurements from other components that use the MetricStore.
@@ -29,6 +41,12 @@ class InvocationMeasurementsIn(BaseModel):
     generate_ms: float
     used_grammar: bool
     used_variables: bool
+    outcome: InvocationOutcome = InvocationOutcome.completed
+    # Tokens proposed and accepted by speculative decoding, zero when the model does not speculate
+    draft_tokens: int = 0
+    accepted_tokens: int = 0
+    # Time spent in each phase of serving the invocation, see `modelserver.timing`
+    phases_ms: dict[str, float] | None = None
 
 
 class InvocationMeasurementsOut(BaseModel):
@@ -44,6 +62,12 @@ class InvocationMeasurementsOut(BaseModel):
     generate_ms: float
     used_grammar: bool
     used_variables: bool
+    outcome: InvocationOutcome = InvocationOutcome.completed
+    # Tokens proposed and accepted by speculative decoding, zero when the model does not speculate
+    draft_tokens: int = 0
+    accepted_tokens: int = 0
+    # Time spent in each phase of serving the invocation, see `modelserver.timing`
+    phases_ms: dict[str, float] | None = None
 
 
 class SearchInvocationsResponsePage(BaseModel):
@@ -65,6 +89,11 @@ class InvocationsSummary(BaseModel):
     """
 
     total: int
+    cancelled: int = 0
+    timed_out: int = 0
+    failed: int = 0
+    draft_tokens: int = 0
+    accepted_tokens: int = 0
     generate_ms: PercentileMetrics
 
 
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 from typing import final
 from uuid import UUID, uuid1
@@ -7,6 +8,7 @@ import duckdb
 from modelserver.metrics._core import (
     InvocationMeasurementsIn,
     InvocationMeasurementsOut,
+    InvocationOutcome,
     InvocationsSummary,
     MetricStore,
     PercentileMetrics,
@@ -44,6 +46,19 @@ class DuckDBMetricStore(MetricStore):
                 )
                 """
             )
+            # Added after the table was first created
+            cursor.execute(
+                "alter table invocations_v0 add column if not exists outcome VARCHAR default 'completed'"
+            )
+            cursor.execute(
+                "alter table invocations_v0 add column if not exists draft_tokens INTEGER default 0"
+            )
+            cursor.execute(
+                "alter table invocations_v0 add column if not exists accepted_tokens INTEGER default 0"
+            )
+            cursor.execute(
+                "alter table invocations_v0 add column if not exists phases_ms JSON default null"
+            )
             cursor.commit()
         except Exception as e:
             cursor.rollback()
@@ -59,7 +74,7 @@ class DuckDBMetricStore(MetricStore):
             invocation_id = uuid1(node=0)
             generated_ids.append(invocation_id)
             cursor.execute(
-                "insert into invocations_v0 values (?, ?, ? at time zone 'utc', ?, ?, ?, ?, ?)",
+                "insert into invocations_v0 values (?, ?, ? at time zone 'utc', ?, ?, ?, ?, ?, ?, ?, ?, ?)",
                 [
                     invocation_id,
                     invocation.task_id,
@@ -69,6 +84,14 @@ class DuckDBMetricStore(MetricStore):
                     invocation.generate_ms,
                     invocation.used_grammar,
                     invocation.used_variables,
+                    invocation.outcome.value,
+                    invocation.draft_tokens,
+                    invocation.accepted_tokens,
+                    (
+                        json.dumps(invocation.phases_ms)
+                        if invocation.phases_ms is not None
+                        else None
+                    ),
                 ],
             )
         cursor.commit()
@@ -101,7 +124,7 @@ class DuckDBMetricStore(MetricStore):
         rows = self.db.execute(
             f"""
             select
-                invocation_id, task_id, ts at time zone 'utc', generate_ms, input_tokens, output_tokens, used_grammar, used_variables
+                invocation_id, task_id, ts at time zone 'utc', generate_ms, input_tokens, output_tokens, used_grammar, used_variables, outcome, draft_tokens, accepted_tokens, phases_ms
             from invocations_v0
             {suffix}
             ORDER BY task_id, ts, invocation_id
@@ -126,6 +149,10 @@ class DuckDBMetricStore(MetricStore):
                 output_tokens,
                 used_grammar,
                 used_variables,
+                outcome,
+                draft_tokens,
+                accepted_tokens,
+                phases_ms,
             ) = row
 
             results.append(
@@ -138,6 +165,10 @@ class DuckDBMetricStore(MetricStore):
                     output_tokens=output_tokens,
                     used_grammar=used_grammar,
                     used_variables=used_variables,
+                    outcome=InvocationOutcome(outcome),
+                    draft_tokens=draft_tokens,
+                    accepted_tokens=accepted_tokens,
+                    phases_ms=json.loads(phases_ms) if phases_ms is not None else None,
                 )
             )
 
@@ -163,26 +194,42 @@ class DuckDBMetricStore(MetricStore):
             max_output_tokens=max_output_tokens,
         )
 
+        # Latency is only measured over completed invocations, a timeout or an early failure says
+        # nothing about how long generation takes. Without any, the percentiles are reported as 0.
         row = self.db.execute(
             f"""
             select
-                  count() OVER () as rowcount
-                , reservoir_quantile(generate_ms, 0.5) OVER () as generate_ms_p50
-                , reservoir_quantile(generate_ms, 0.95) OVER () as generate_ms_p95
-                , reservoir_quantile(generate_ms, 0.99) OVER () as generate_ms_p99
-                , min(generate_ms) OVER () as generate_ms_min
-                , max(generate_ms) OVER () as generate_ms_max
+                  count() as rowcount
+                , count() filter (where outcome = 'cancelled') as cancelled
+                , count() filter (where outcome = 'timed_out') as timed_out
+                , count() filter (where outcome = 'failed') as failed
+                , sum(draft_tokens) as draft_tokens
+                , sum(accepted_tokens) as accepted_tokens
+                , coalesce(reservoir_quantile(generate_ms, 0.5) filter (where outcome = 'completed'), 0)
+                    as generate_ms_p50
+                , coalesce(reservoir_quantile(generate_ms, 0.95) filter (where outcome = 'completed'), 0)
+                    as generate_ms_p95
+                , coalesce(reservoir_quantile(generate_ms, 0.99) filter (where outcome = 'completed'), 0)
+                    as generate_ms_p99
+                , coalesce(min(generate_ms) filter (where outcome = 'completed'), 0)
+                    as generate_ms_min
+                , coalesce(max(generate_ms) filter (where outcome = 'completed'), 0)
+                    as generate_ms_max
             from invocations_v0
             {suffix}
-            limit 1
             """
         ).fetchone()
 
-        if row is None:
+        if row is None or row[0] == 0:
             raise ValueError("No Invocations matched query")
 
         (
             rowcount,
+            cancelled,
+            timed_out,
+            failed,
+            draft_tokens,
+            accepted_tokens,
             generate_ms_p50,
             generate_ms_p95,
             generate_ms_p99,
@@ -191,6 +238,11 @@ class DuckDBMetricStore(MetricStore):
         ) = row
         return InvocationsSummary(
             total=rowcount,
+            cancelled=cancelled,
+            timed_out=timed_out,
+            failed=failed,
+            draft_tokens=draft_tokens,
+            accepted_tokens=accepted_tokens,
             generate_ms=PercentileMetrics(
                 p50=generate_ms_p50,
                 p95=generate_ms_p95,
@@ -1,10 +1,16 @@
 from typing import Union
 
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
 from starlette.staticfiles import (  # type: ignore[attr-defined]
     PathLike,
     Scope,
     StaticFiles,
 )
+from starlette.types import ASGIApp, Message, Receive, Send
+
+# Responses streaming events as they are generated, see `modelserver.streaming`
+STREAMING_MEDIA_TYPES = frozenset({"text/event-stream", "application/x-ndjson"})
 
 
 class StaticReactRouterFiles(StaticFiles):
@@ -36,3 +42,59 @@ class StaticReactRouterFiles(StaticFiles):
         else:
             scope["path"] = "/"
             return super().get_path(scope)
+
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves responses of the excluded media types uncompressed.
+
+    The gzip stream only emits output once it has gathered enough input, so compressing a stream of
+    events holds them back from the client until enough of them have been generated.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        compresslevel: int = 9,
+        excluded_media_types: frozenset[str] = STREAMING_MEDIA_TYPES,
+    ) -> None:
+        super().__init__(app, minimum_size, compresslevel)
+        self.excluded_media_types = excluded_media_types
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "gzip" in headers.get("Accept-Encoding", ""):
+                responder = _ExcludingGZipResponder(
+                    self.app,
+                    self.minimum_size,
+                    self.compresslevel,
+                    self.excluded_media_types,
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _ExcludingGZipResponder(GZipResponder):
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int,
+        compresslevel: int,
+        excluded_media_types: frozenset[str],
+    ) -> None:
+        super().__init__(app, minimum_size, compresslevel)
+        self.excluded_media_types = excluded_media_types
+        self.excluded = False
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            media_type = content_type.split(";")[0].strip()
+            self.excluded = media_type in self.excluded_media_types
+        if self.excluded:
+            await self.send(message)
+        else:
+            await super().send_with_gzip(message)
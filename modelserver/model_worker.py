@@ -1,15 +1,27 @@
-import asyncio
 import logging
-import multiprocessing as M
-import os
 import queue
 import typing
-from concurrent.futures import ProcessPoolExecutor
 from typing import AsyncGenerator
 
-from llama_cpp import CompletionChunk, Llama
+from llama_cpp import CompletionChunk
 
-from modelserver.types.api import CompletionInferenceRequest
+from modelserver.memory import serving_estimate
+from modelserver.runtime import (
+    CHANNEL_SENTINEL,
+    InferenceRuntime,
+    JobSignals,
+    ModelKey,
+    report_speculation,
+    resident_draft,
+    resident_llama,
+    use_adapter,
+)
+from modelserver.timing import PhaseTimeline
+from modelserver.types.api import (
+    CompletionInferenceRequest,
+    CompletionModelParams,
+    SpeculationStats,
+)
 
 """
 Python asyncio-friendly multiprocessing worker for running llama.cpp models.
@@ -20,76 +32,91 @@ without hogging the ports in the foreground:
     1. When a WebSocket comes in, the processing of messages on the WebSocket must be done
        using async primitives, as the WebSocket library object itself only contains methods
        that are coroutines.
-    2. We construct a ProcessPoolExecutor to spawn new multiprocessing.Process objects that
-       can execute the llama-cpp-python inference code in a separate Python process. This allows
-       us to completely avoid the GIL issues that arise when trying to use either background
-       threads or the main event loop thread for executing CPU-intensive code.
+    2. The InferenceRuntime keeps a resident multiprocessing.Process per model that executes the
+       llama-cpp-python inference code in a separate Python process. This allows us to completely
+       avoid the GIL issues that arise when trying to use either background threads or the main
+       event loop thread for executing CPU-intensive code, and to load each model only once.
     3. We construct a queue.Queue object which serves as a multiprocessing-safe channel to convey
        data from the subprocess (in this case, live tokens) back up to the parent. The parent
        wraps this queue using async primitives to then expose an AsyncGenerator interface to users.
        This allows you to use the tidy `async for token in run_completion_async(...)` syntax.
 """
 
-CHANNEL_SENTINEL = None
-
 logger = logging.getLogger(__name__)
 
 
 def do_completion_llama(
-    model_path: str,
     prompt: str,
     tokens: int,
     temperature: float,
     lora_path: str | None,
+    signals: JobSignals,
     channel: queue.Queue[str | None],
-) -> None:
+) -> tuple[str, int, float, str | None] | None:
     """
     Execute completion, sending the results back over the completion task.
+
+    :param lora_path: The LoRA adapter to generate with, for models that serve adapters
+
+    Generation stops early once `signals.cancelled` is set. When preempted, generation stops and the
+    arguments to continue the completion from where it left off are returned.
     """
-    logger.info(f"Initializing model in subprocess {os.getpid()}")
-    llama = Llama(model_path=model_path, lora_path=lora_path)
-    for next_chunk in llama.create_completion(
-        prompt,
-        max_tokens=tokens,
-        temperature=temperature,
-        stream=True,
+    if lora_path is not None:
+        use_adapter(lora_path)
+    llama = resident_llama()
+    draft = resident_draft()
+    if draft is not None:
+        draft.begin()
+    generated = ""
+    for n, next_chunk in enumerate(
+        llama.create_completion(
+            prompt,
+            max_tokens=tokens,
+            temperature=temperature,
+            stream=True,
+        ),
+        start=1,
     ):
         chunk: CompletionChunk = typing.cast(CompletionChunk, next_chunk)
-        channel.put(chunk["choices"][0]["text"])
+        text = chunk["choices"][0]["text"]
+        channel.put(text)
+        generated += text
+        if signals.cancelled.is_set():
+            logger.info("Generation cancelled")
+            break
+        if signals.preempted.is_set() and n < tokens:
+            report_speculation(signals, draft)
+            channel.put(CHANNEL_SENTINEL)
+            return prompt + generated, tokens - n, temperature, lora_path
+    report_speculation(signals, draft)
     channel.put(CHANNEL_SENTINEL)
+    return None
 
 
 async def run_completion_async(
+    runtime: InferenceRuntime,
     completion_request: CompletionInferenceRequest,
-    model_path: str,
+    model_params: CompletionModelParams,
     lora_path: str | None,
+    speculation: SpeculationStats | None = None,
+    timeline: PhaseTimeline | None = None,
 ) -> AsyncGenerator[str, str]:
-    loop = asyncio.get_running_loop()
-
-    with ProcessPoolExecutor() as pool:
-        with M.Manager() as manager:
-            chan: queue.Queue[str | None] = manager.Queue()
-            res = loop.run_in_executor(
-                pool,
-                do_completion_llama,
-                model_path,
-                completion_request.prompt,
-                completion_request.tokens,
-                completion_request.temperature,
-                lora_path,
-                chan,
-            )
-            while True:
-                try:
-                    item = chan.get_nowait()
-                    if item == CHANNEL_SENTINEL:
-                        break
-                    yield str(item)
-                except queue.Empty:
-                    # NOTE(aduffy): This is important as this is how we signal in Python to
-                    #  yield to other coroutines, else nothing else in the event loop is able
-                    #  to run while we're polling the queue.
-                    await asyncio.sleep(0)
-                    continue
-            await res
-            return
+    async for item in runtime.stream(
+        ModelKey.for_model(
+            model_params.model_path,
+            lora_path,
+            model_params.draft,
+            model_params.runtime,
+        ),
+        serving_estimate(model_params),
+        do_completion_llama,
+        completion_request.prompt,
+        completion_request.tokens,
+        completion_request.temperature,
+        lora_path,
+        priority=completion_request.priority,
+        speculation=speculation,
+        adapter=lora_path,
+        timeline=timeline,
+    ):
+        yield item
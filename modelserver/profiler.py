@@ -0,0 +1,123 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Any
+
+"""
+A sampling profiler for the server and its resident model processes.
+
+A sampler thread periodically walks the stack of every other thread in its process through
+`sys._current_frames()`, and counts how often each distinct stack was seen. Because it samples
+wall-clock time rather than CPU time, the profile also shows where threads wait, which is what
+makes it useful for diagnosing stalls of the event loop.
+
+Every stack starts with a frame naming the process and thread it was sampled from, so samples of
+several processes can be merged into one profile and told apart afterwards. Profiles are exported
+either in the collapsed-stack format read by flamegraph.pl and most flame graph tools, or in the
+speedscope file format, with one profile per thread.
+
+Time spent in native code, such as llama.cpp decoding, shows up as the Python frame that called it.
+"""
+
+# A sampled stack, outermost frame first
+Stack = tuple[str, ...]
+
+MAX_RATE_HZ = 1000
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def _frame_label(code: CodeType) -> str:
+    # Frames are keyed by function rather than by line, so that the samples of a function add up
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(
+        ";", ":"
+    )
+
+
+def sample_stacks(seconds: float, rate_hz: float, process: str) -> Counter[Stack]:
+    """
+    Sample the stacks of every other thread of the current process.
+
+    :param rate_hz: Samples taken per second
+    :param process: Label of the process, the root of every stack
+    """
+    me = threading.get_ident()
+    labels: dict[CodeType, str] = {}
+    samples: Counter[Stack] = Counter()
+    interval = 1 / min(rate_hz, MAX_RATE_HZ)
+    deadline = time.monotonic() + seconds
+    next_sample = time.monotonic()
+    while next_sample < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack: list[str] = []
+            current: FrameType | None = frame
+            while current is not None:
+                code = current.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                current = current.f_back
+            stack.append(f"{process}/{names.get(thread_id, thread_id)}")
+            samples[tuple(reversed(stack))] += 1
+        next_sample += interval
+        time.sleep(max(next_sample - time.monotonic(), 0))
+    return samples
+
+
+def to_collapsed(samples: Counter[Stack]) -> str:
+    """
+    Format the samples as collapsed stacks, one `frame;frame;frame count` line per distinct stack.
+    """
+    return "".join(
+        f"{';'.join(stack)} {count}\n" for stack, count in sorted(samples.items())
+    )
+
+
+def to_speedscope(samples: Counter[Stack], rate_hz: float, name: str) -> str:
+    """
+    Format the samples as a speedscope file, with one sampled profile per thread weighted in seconds.
+    """
+    frames: list[dict[str, Any]] = []
+    frame_ids: dict[str, int] = {}
+    profiles: dict[str, dict[str, Any]] = {}
+    for stack, count in sorted(samples.items()):
+        thread, *calls = stack
+        ids = []
+        for call in calls:
+            if call not in frame_ids:
+                frame_ids[call] = len(frames)
+                function, _, location = call.rpartition(" (")
+                file, _, line = location.rstrip(")").rpartition(":")
+                frames.append(dict(name=function, file=file, line=int(line)))
+            ids.append(frame_ids[call])
+        profile = profiles.setdefault(
+            thread,
+            dict(
+                type="sampled",
+                name=thread,
+                unit="seconds",
+                startValue=0,
+                endValue=0,
+                samples=[],
+                weights=[],
+            ),
+        )
+        profile["samples"].append(ids)
+        profile["weights"].append(count / rate_hz)
+        profile["endValue"] += count / rate_hz
+    return json.dumps(
+        {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "modelserver",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+    )
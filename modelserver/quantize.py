@@ -0,0 +1,198 @@
+import ctypes
+import functools
+import pathlib
+import shutil
+import struct
+import time
+from dataclasses import dataclass
+
+import llama_cpp
+import numpy as np
+import numpy.typing as npt
+from llama_cpp import Llama
+
+from modelserver.ggml import (
+    GGML_TYPE_F16,
+    GGML_TYPE_F32,
+    GGML_TYPE_NAMES,
+    GGMLCompatibilityError,
+    GGMLParseError,
+    GGUFFile,
+)
+from modelserver.types.api import QuantizationType
+
+"""
+Offline model transformations: merging LoRA adapters into their base model and quantizing models.
+
+Serving an adapter applies it to the weights every time the model is loaded. Merging does it once,
+producing a standalone model that loads and runs like any other. Adapters are written by the fine-tune
+workers in llama.cpp's GGML LoRA format, where every adapted weight W has a pair of low-rank matrices
+A and B, and merging computes W + scale * alpha / rank * B @ A.
+
+The merged model is a copy of the base model file with the data of the adapted weights rewritten in
+place, so the header, vocabulary and untouched tensors carry over byte for byte. This requires the
+adapted weights to be stored as F16 or F32 in the base model. Quantization is left to llama.cpp.
+"""
+
+GGLA_MAGIC = b"ggla"[::-1]
+GGLA_ALIGNMENT = 32
+
+LORA_TENSOR_DTYPES: dict[int, npt.DTypeLike] = {
+    0: np.float32,
+    1: np.float16,
+}
+
+LLAMA_FTYPES = {
+    QuantizationType.q4_0: llama_cpp.LLAMA_FTYPE_MOSTLY_Q4_0,
+    QuantizationType.q4_k_m: llama_cpp.LLAMA_FTYPE_MOSTLY_Q4_K_M,
+    QuantizationType.q5_k_m: llama_cpp.LLAMA_FTYPE_MOSTLY_Q5_K_M,
+    QuantizationType.q6_k: llama_cpp.LLAMA_FTYPE_MOSTLY_Q6_K,
+    QuantizationType.q8_0: llama_cpp.LLAMA_FTYPE_MOSTLY_Q8_0,
+}
+
+# Approximate size of the quantized weights, for estimating the size of a quantized model
+QUANTIZED_BITS_PER_WEIGHT = {
+    QuantizationType.q4_0: 4.5,
+    QuantizationType.q4_k_m: 4.85,
+    QuantizationType.q5_k_m: 5.7,
+    QuantizationType.q6_k: 6.6,
+    QuantizationType.q8_0: 8.5,
+}
+
+Matrix = npt.NDArray[np.float32]
+
+
+@dataclass
+class LoraAdapter:
+    """
+    :param tensors: The (A, B) pair of every adapted weight. A is stored transposed, with shape
+                    (n_in, rank), and B has shape (n_out, rank).
+    """
+
+    rank: int
+    alpha: int
+    tensors: dict[str, tuple[Matrix, Matrix]]
+
+
+def read_lora_adapter(path: pathlib.Path) -> LoraAdapter:
+    with path.open("rb") as f:
+        magic = f.read(4)
+        if magic != GGLA_MAGIC:
+            raise GGMLParseError(f"Invalid GGML LoRA magic {magic!r}")
+        version, rank, alpha = struct.unpack("<iii", f.read(12))
+        if version != 1:
+            raise GGMLCompatibilityError(f"Unsupported GGML LoRA version {version}")
+
+        halves: dict[str, dict[str, Matrix]] = {}
+        while header := f.read(12):
+            n_dims, name_len, ftype = struct.unpack("<iii", header)
+            dims = struct.unpack(f"<{n_dims}i", f.read(4 * n_dims))
+            name = f.read(name_len).decode("utf-8")
+            if ftype not in LORA_TENSOR_DTYPES:
+                raise GGMLParseError(f"Unsupported type {ftype} for LoRA tensor {name}")
+            f.seek(-(-f.tell() // GGLA_ALIGNMENT) * GGLA_ALIGNMENT)
+
+            dtype = np.dtype(LORA_TENSOR_DTYPES[ftype])
+            count = functools.reduce(lambda d, p: d * p, dims, 1)
+            data = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype)
+            # Dimensions are listed fastest-varying first
+            matrix = data.reshape(dims[::-1]).astype(np.float32)
+
+            weight, _, half = name.rpartition(".lora")
+            if half not in ("A", "B"):
+                raise GGMLParseError(f"Unexpected LoRA tensor {name}")
+            halves.setdefault(weight, {})[half] = matrix
+
+    tensors = {}
+    for weight, pair in halves.items():
+        if pair.keys() != {"A", "B"}:
+            raise GGMLParseError(f"LoRA adapter has only one half for {weight}")
+        tensors[weight] = (pair["A"], pair["B"])
+    return LoraAdapter(rank=rank, alpha=alpha, tensors=tensors)
+
+
+def merge_lora(
+    base_path: pathlib.Path,
+    lora_path: pathlib.Path,
+    output_path: pathlib.Path,
+    scale: float = 1.0,
+) -> None:
+    """
+    Write a copy of the base model with the LoRA adapter merged into its weights.
+
+    :raises ValueError: If the adapter does not fit the base model, or the base model stores an adapted
+                        weight quantized.
+    """
+    adapter = read_lora_adapter(lora_path)
+    fields = GGUFFile(base_path).read_structure()
+    descriptors = {tensor.name: tensor for tensor in fields.tensors}
+
+    for name, (a, b) in adapter.tensors.items():
+        descriptor = descriptors.get(name)
+        if descriptor is None:
+            raise ValueError(f"Base model has no tensor {name} to apply the adapter to")
+        if descriptor.ggml_type not in (GGML_TYPE_F16, GGML_TYPE_F32):
+            raise ValueError(
+                f"Base model stores {name} as {GGML_TYPE_NAMES[descriptor.ggml_type]}, "
+                "merging needs a base model with F16 or F32 weights"
+            )
+        if (b.shape[0], a.shape[0]) != tuple(descriptor.dims[::-1]):
+            raise ValueError(
+                f"Adapter shape {(b.shape[0], a.shape[0])} does not match {name} {descriptor.dims[::-1]}"
+            )
+
+    shutil.copyfile(base_path, output_path)
+    scaling = scale * adapter.alpha / adapter.rank
+    for name, (a, b) in adapter.tensors.items():
+        descriptor = descriptors[name]
+        weight = np.memmap(
+            output_path,
+            dtype=np.float32 if descriptor.ggml_type == GGML_TYPE_F32 else np.float16,
+            mode="r+",
+            offset=fields.data_offset + descriptor.offset,
+            shape=tuple(descriptor.dims[::-1]),
+        )
+        weight[:] = weight.astype(np.float32) + scaling * (b @ a.T)
+        weight.flush()
+        del weight
+
+
+def quantize_model(
+    input_path: pathlib.Path,
+    output_path: pathlib.Path,
+    quantization: QuantizationType,
+) -> None:
+    params = llama_cpp.llama_model_quantize_default_params()
+    params.ftype = LLAMA_FTYPES[quantization]
+    if (
+        llama_cpp.llama_model_quantize(
+            str(input_path).encode("utf-8"),
+            str(output_path).encode("utf-8"),
+            ctypes.byref(params),
+        )
+        != 0
+    ):
+        raise RuntimeError(f"Failed quantizing {input_path} to {quantization.value}")
+
+
+def estimate_quantized_bytes(
+    model_path: pathlib.Path, quantization: QuantizationType
+) -> int:
+    fields = GGUFFile(model_path).read_structure()
+    weights = sum(
+        functools.reduce(lambda d, p: d * p, tensor.dims, 1)
+        for tensor in fields.tensors
+    )
+    return int(weights * QUANTIZED_BITS_PER_WEIGHT[quantization] / 8)
+
+
+def load_seconds(model_path: str, lora_path: str | None = None) -> float:
+    """
+    Time loading the model, with the adapter applied if given. Meant to be run in a separate process,
+    so that the server does not hold on to the memory the model took up.
+    """
+    starttime = time.monotonic()
+    llama = Llama(model_path=model_path, lora_path=lora_path, verbose=False)
+    elapsed = time.monotonic() - starttime
+    del llama
+    return elapsed
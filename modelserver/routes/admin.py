@@ -1,8 +1,16 @@
 import sys
 import threading
 import traceback
+from typing import Annotated
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Query, Response
+
+from modelserver.blobstore import BlobStore
+from modelserver.db import DataManager
+from modelserver.dependencies import get_blob_store, get_db, get_runtime
+from modelserver.profiler import MAX_RATE_HZ, to_collapsed, to_speedscope
+from modelserver.runtime import InferenceRuntime
+from modelserver.types.api import BlobOut, ProfileFormat, ResidentModelStatus
 
 router = APIRouter(prefix="/admin")
 
@@ -16,3 +24,67 @@ def get_stack_traces() -> dict[str, list[str]]:
         tname = id2name[tid]
         stacks[tname] = stack
     return stacks
+
+
+@router.get("/blobs")
+def get_blobs(db: Annotated[DataManager, Depends(get_db)]) -> list[BlobOut]:
+    """
+    List the model files held in the blob store, with the number of model versions using each.
+    """
+    return db.get_blobs()
+
+
+@router.post("/blobs/gc")
+def gc_blobs(blob_store: Annotated[BlobStore, Depends(get_blob_store)]) -> list[str]:
+    """
+    Reclaim disk from blobs no longer referenced by any model version.
+
+    :return: The digests of the removed blobs
+    """
+    return blob_store.gc()
+
+
+@router.get("/runtime")
+def get_resident_models(
+    runtime: Annotated[InferenceRuntime, Depends(get_runtime)]
+) -> list[ResidentModelStatus]:
+    """
+    List the models currently loaded for inference, with the acceptance rate of speculative decoding
+    for models paired with a draft model.
+    """
+    return runtime.status()
+
+
+@router.get(
+    "/profile",
+    response_class=Response,
+    responses={200: {"content": {"text/plain": {}, "application/json": {}}}},
+)
+def get_profile(
+    runtime: Annotated[InferenceRuntime, Depends(get_runtime)],
+    seconds: Annotated[float, Query(gt=0, le=300)] = 10.0,
+    rate: Annotated[float, Query(gt=0, le=MAX_RATE_HZ)] = 100.0,
+    subprocesses: bool = False,
+    format: ProfileFormat = ProfileFormat.collapsed,
+) -> Response:
+    """
+    Sample the stacks of every thread of the server for `seconds`, and download them as a profile.
+
+    :param rate: Samples taken per second
+    :param subprocesses: Also sample the resident model processes
+    :param format: `collapsed` stacks for flame graph tools, or a `speedscope` file
+    """
+    samples = runtime.profile(seconds, rate, resident_processes=subprocesses)
+    if format == ProfileFormat.speedscope:
+        return Response(
+            to_speedscope(samples, rate, name=f"modelserver {seconds}s"),
+            media_type="application/json",
+            headers={
+                "Content-Disposition": 'attachment; filename="profile.speedscope.json"'
+            },
+        )
+    return Response(
+        to_collapsed(samples),
+        media_type="text/plain",
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed.txt"'},
+    )
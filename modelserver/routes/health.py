@@ -1,10 +1,26 @@
-from fastapi import APIRouter
+from typing import Annotated
 
+from fastapi import APIRouter, Depends, Response, status
+
+from modelserver.dependencies import get_runtime
+from modelserver.runtime import InferenceRuntime
 from modelserver.types.api import HealthStatus
 
 router = APIRouter()
 
 
 @router.get("/healthz")
-def get_healthz() -> HealthStatus:
+def get_healthz(
+    response: Response,
+    runtime: Annotated[InferenceRuntime, Depends(get_runtime)],
+) -> HealthStatus:
+    """
+    Readiness of the server. Returns 503 until the models backing Tasks have been preloaded, so that
+    load balancers hold traffic back until the first requests can be served without a model load.
+    """
+    if not runtime.warm.is_set():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthStatus(
+            status="warming", warming=[key.model_path for key in runtime.warming]
+        )
     return HealthStatus(status="ok")
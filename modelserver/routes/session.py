@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import time
+from typing import Annotated, AsyncGenerator, final
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from pydantic import BaseModel, ValidationError
+
+from modelserver import task_worker
+from modelserver.metrics._core import InvocationOutcome
+from modelserver.runtime import InferenceTimeout
+from modelserver.streaming import SLOW_CLIENT_CLOSE_CODE
+from modelserver.timing import PhaseTimeline
+
+from ..dependencies import AppComponent
+from ..types.api import (
+    ModelVersionInternal,
+    ServerTiming,
+    SessionCancel,
+    SessionError,
+    SessionInvocation,
+    SessionMessage,
+    SessionResult,
+    SessionTokens,
+    SlowClientPolicy,
+    SpeculationStats,
+    TaskInfo,
+)
+from .v1 import record_task_invocation, render_task_invocation
+
+"""
+Invocation sessions: one WebSocket carrying many concurrent Task invocations.
+
+Opening a WebSocket per invocation costs a handshake and the lookups of the Task and its model
+every time. A session is opened once, after which the client sends SessionInvocation messages
+tagged with ids of its choosing and the server interleaves the SessionTokens of all running
+invocations on the socket, closing each with a SessionResult or a SessionError. SessionCancel
+stops a running invocation.
+
+Messages are sent by a single sender task from a bounded buffer shared by the invocations of the
+session, as WebSocket streaming sessions do with their tokens. A client that falls a full buffer
+behind either holds up the invocations until it catches up, or has its session closed.
+
+Messages are JSON, in text or binary frames.
+
+The Tasks a session invokes are looked up once and cached for the lifetime of the session, so
+changes to a Task take effect on the sessions opened after them.
+"""
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/v1")
+
+# Most invocations a session may run at the same time
+MAX_SESSION_INVOCATIONS = 64
+
+# Default number of messages held for the client before the slow client policy applies
+DEFAULT_BUFFER_MESSAGES = 256
+
+
+@final
+class InvocationSession:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        component: AppComponent,
+        buffer_messages: int = DEFAULT_BUFFER_MESSAGES,
+        slow_client: SlowClientPolicy = SlowClientPolicy.wait,
+    ) -> None:
+        """
+        :param buffer_messages: Most messages held for the client before `slow_client` applies
+        :param slow_client: What to do with a client that falls `buffer_messages` behind
+        """
+        self.websocket = websocket
+        self.component = component
+        self.invocations: dict[str, asyncio.Task[None]] = {}
+        # Invocations stopped by the client, as opposed to the session closing
+        self.cancelled: set[str] = set()
+        self.tasks: dict[str, tuple[TaskInfo, ModelVersionInternal]] = {}
+        self.slow_client = slow_client
+        self.outbox: asyncio.Queue[str] = asyncio.Queue(buffer_messages)
+        self.sender = asyncio.create_task(self._send_messages())
+        self.closing = False
+
+    async def _send_messages(self) -> None:
+        while True:
+            await self.websocket.send_text(await self.outbox.get())
+
+    async def send(self, message: BaseModel) -> None:
+        """
+        Queue the message for the client.
+
+        :raises WebSocketDisconnect: If the client went away, or the session was closed because the
+                                     client fell behind under SlowClientPolicy.cancel.
+        """
+        if self.closing or self.sender.done():
+            raise WebSocketDisconnect()
+        text = message.model_dump_json()
+        if not self.outbox.full():
+            self.outbox.put_nowait(text)
+        elif self.slow_client == SlowClientPolicy.cancel:
+            self.closing = True
+            await self.websocket.close(
+                code=SLOW_CLIENT_CLOSE_CODE,
+                reason=f"Client fell {self.outbox.maxsize} messages behind the session",
+            )
+            raise WebSocketDisconnect(SLOW_CLIENT_CLOSE_CODE)
+        else:
+            await self.outbox.put(text)
+
+    async def receive(self, data: str | bytes) -> None:
+        try:
+            message = SessionMessage.model_validate_json(data).root
+        except ValidationError as e:
+            await self.send(
+                SessionError(
+                    id=None,
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to parse session message: {e}",
+                )
+            )
+            return
+
+        if isinstance(message, SessionCancel):
+            invocation = self.invocations.get(message.id)
+            if invocation is not None:
+                self.cancelled.add(message.id)
+                invocation.cancel()
+            return
+
+        if message.id in self.invocations:
+            await self.send(
+                SessionError(
+                    id=message.id,
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Invocation {message.id} is already running",
+                )
+            )
+            return
+        if len(self.invocations) >= MAX_SESSION_INVOCATIONS:
+            await self.send(
+                SessionError(
+                    id=message.id,
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"A session runs at most {MAX_SESSION_INVOCATIONS} invocations at a time",
+                )
+            )
+            return
+        invocation = asyncio.create_task(self.invoke(message))
+        self.invocations[message.id] = invocation
+        invocation.add_done_callback(lambda _: self._finished(message.id, invocation))
+
+    def _finished(self, invocation_id: str, invocation: asyncio.Task[None]) -> None:
+        if self.invocations.get(invocation_id) is invocation:
+            del self.invocations[invocation_id]
+        self.cancelled.discard(invocation_id)
+
+    def lookup(self, task_name: str) -> tuple[TaskInfo, ModelVersionInternal]:
+        found = self.tasks.get(task_name)
+        if found is None:
+            task_info = self.component.db.get_task_by_name(task_name)
+            found = self.tasks[task_name] = (
+                task_info,
+                self.component.db.get_model_version_internal(
+                    model_id=str(task_info.model_id),
+                    version=str(task_info.model_version),
+                ),
+            )
+        return found
+
+    async def invoke(self, message: SessionInvocation) -> None:
+        try:
+            await self.report(message)
+        except WebSocketDisconnect:
+            # Nobody is left to tell
+            pass
+
+    async def report(self, message: SessionInvocation) -> None:
+        """
+        Run the invocation, sending the client how it ended.
+
+        :raises WebSocketDisconnect: If the client can no longer be sent anything.
+        """
+        starttime = time.time()
+        try:
+            await self.run(message, starttime)
+        except WebSocketDisconnect:
+            raise
+        except asyncio.CancelledError:
+            if message.id not in self.cancelled:
+                raise
+            await self.send(
+                SessionResult(
+                    id=message.id,
+                    elapsed_seconds=time.time() - starttime,
+                    cancelled=True,
+                )
+            )
+        except HTTPException as e:
+            await self.send(
+                SessionError(
+                    id=message.id, status_code=e.status_code, detail=str(e.detail)
+                )
+            )
+        except ValueError as e:
+            await self.send(
+                SessionError(
+                    id=message.id,
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e),
+                )
+            )
+        except Exception as e:
+            logger.error(f"Invocation {message.id} failed", exc_info=e)
+            await self.send(
+                SessionError(
+                    id=message.id,
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Invocation failed",
+                )
+            )
+
+    async def run(self, message: SessionInvocation, starttime: float) -> None:
+        """
+        :raises ValueError: If the variables do not match the variables of the Task.
+        """
+        timeline = PhaseTimeline()
+        with timeline.phase("db"):
+            task_info, found_model = self.lookup(message.task_name)
+        rendered_prompt = task_worker.render_prompt(task_info, message.variables)
+        rendered_invocation = render_task_invocation(
+            task_info,
+            found_model,
+            rendered_prompt,
+            message.temperature,
+            message.priority,
+        )
+
+        parts: list[str] = []
+        outcome = InvocationOutcome.cancelled
+        speculation = SpeculationStats()
+        tokens: AsyncGenerator[str, str] = self.component.coalescer.invoke(
+            rendered_invocation,
+            lambda: task_worker.run_task_async(
+                self.component.runtime, rendered_invocation, speculation, timeline
+            ),
+        )
+        try:
+            async for token in tokens:
+                parts.append(token)
+                await self.send(SessionTokens(id=message.id, text=token))
+            outcome = InvocationOutcome.completed
+        except WebSocketDisconnect:
+            # Recorded as cancelled
+            raise
+        except InferenceTimeout:
+            outcome = InvocationOutcome.timed_out
+            raise
+        except Exception:
+            outcome = InvocationOutcome.failed
+            raise
+        finally:
+            await tokens.aclose()
+            with timeline.phase("metrics"):
+                record_task_invocation(
+                    self.component,
+                    task_info,
+                    rendered_prompt,
+                    "".join(parts),
+                    time.time() - starttime,
+                    used_grammar=rendered_invocation.grammar is not None,
+                    used_variables=len(message.variables) > 0,
+                    outcome=outcome,
+                    speculation=speculation,
+                    timeline=timeline,
+                )
+        await self.send(
+            SessionResult(
+                id=message.id,
+                elapsed_seconds=time.time() - starttime,
+                speculation=speculation if speculation.draft_tokens > 0 else None,
+                timing=(
+                    ServerTiming(
+                        phases_ms=timeline.phases_ms, total_ms=timeline.total_ms()
+                    )
+                    if message.server_timing
+                    else None
+                ),
+            )
+        )
+
+    async def close(self) -> None:
+        """
+        Stop every running invocation and the sender.
+        """
+        self.closing = True
+        invocations = list(self.invocations.values())
+        for invocation in invocations:
+            invocation.cancel()
+        await asyncio.gather(*invocations, return_exceptions=True)
+        self.sender.cancel()
+        await asyncio.gather(self.sender, return_exceptions=True)
+
+
+@router.websocket("/session")
+async def invocation_session(
+    *,
+    websocket: WebSocket,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+    buffer_messages: Annotated[int, Query(ge=1, le=4096)] = DEFAULT_BUFFER_MESSAGES,
+    slow_client: SlowClientPolicy = SlowClientPolicy.wait,
+) -> None:
+    """
+    Run many Task invocations over one WebSocket, see `modelserver.routes.session`.
+
+    :param buffer_messages: Most messages held for the client before `slow_client` applies
+    :param slow_client: What to do with a client that falls `buffer_messages` behind (default=wait)
+    """
+    await websocket.accept()
+    session = InvocationSession(websocket, component, buffer_messages, slow_client)
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            await session.receive(
+                frame["text"] if frame.get("text") is not None else frame["bytes"]
+            )
+    except WebSocketDisconnect:
+        logger.info("WebSocket disconnected from invocation session")
+    finally:
+        await session.close()
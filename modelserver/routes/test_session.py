@@ -0,0 +1,308 @@
+import asyncio
+import json
+import typing
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator
+
+import pytest
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy import create_engine
+
+from modelserver import task_worker
+from modelserver.coalesce import TaskInvocationCoalescer
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.dependencies import AppComponent
+from modelserver.metrics._core import InvocationMeasurementsIn, InvocationOutcome
+from modelserver.routes import session
+from modelserver.routes.session import InvocationSession
+from modelserver.streaming import SLOW_CLIENT_CLOSE_CODE
+from modelserver.types.api import (
+    CreateTaskRequest,
+    RegisterModelRequest,
+    SessionError,
+    SessionResult,
+    SlowClientPolicy,
+)
+
+TOKENS = 5
+
+
+class FakeWebSocket:
+    """
+    Records the frames sent to the client, taking `send_seconds` per frame.
+    """
+
+    def __init__(self, send_seconds: float = 0.0) -> None:
+        self.send_seconds = send_seconds
+        self.frames: list[dict[str, Any]] = []
+        self.close_code: int | None = None
+
+    async def send_text(self, data: str) -> None:
+        await asyncio.sleep(self.send_seconds)
+        self.frames.append(json.loads(data))
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.close_code = code
+
+    def of(self, invocation_id: str) -> list[dict[str, Any]]:
+        return [frame for frame in self.frames if frame["id"] == invocation_id]
+
+
+class FakeMetrics:
+    def __init__(self) -> None:
+        self.invocations: list[InvocationMeasurementsIn] = []
+
+    def insert_invocations(self, invocations: list[InvocationMeasurementsIn]) -> None:
+        self.invocations.extend(invocations)
+
+
+@pytest.fixture
+def db() -> typing.Iterator[PersistentDataManager]:
+    engine = create_engine("sqlite+pysqlite:///:memory:")
+    db = PersistentDataManager(engine)
+    model_id, _ = db.register_model(
+        RegisterModelRequest.model_validate(
+            {
+                "model": "anewmodel",
+                "version": "0.1.0",
+                "model_type": "completion",
+                "runtime": "ggml",
+                "internal_params": {
+                    "type": "paramsv1/completion",
+                    "model_path": "/path/to/model.bin",
+                },
+                "import_metadata": {
+                    "imported_at": datetime.utcfromtimestamp(0),
+                    "source": {
+                        "type": "importv1/disk",
+                        "source": {
+                            "type": "locatorv1/disk",
+                            "path": "/path/to/model.bin",
+                        },
+                    },
+                },
+            }
+        )
+    )
+    db.create_task(CreateTaskRequest(name="greet"))
+    db.update_task_prompt_template("greet", "Hello {name}")
+    db.update_task_input_schema("greet", {"name": "string"})
+    db.set_task_backing_model("greet", str(model_id), "0.1.0")
+    yield db
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def fake_generation(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def run_task_async(
+        runtime: Any, invocation: Any, *args: Any
+    ) -> AsyncGenerator[str, str]:
+        for i in range(TOKENS):
+            await asyncio.sleep(0.01)
+            yield f"{invocation.rendered_prompt}:{i} "
+
+    monkeypatch.setattr(task_worker, "run_task_async", run_task_async)
+
+
+def component(db: PersistentDataManager) -> AppComponent:
+    return typing.cast(
+        AppComponent,
+        SimpleNamespace(
+            db=db,
+            coalescer=TaskInvocationCoalescer(),
+            runtime=None,
+            metrics=FakeMetrics(),
+            record_phase_timings=False,
+        ),
+    )
+
+
+def invoke(invocation_id: str, name: str = "world") -> str:
+    return json.dumps(
+        {
+            "type": "invoke",
+            "id": invocation_id,
+            "task_name": "greet",
+            "variables": {"name": name},
+        }
+    )
+
+
+async def finish(invocation_session: InvocationSession) -> None:
+    """
+    Wait for the running invocations and the messages they sent, then close the session.
+    """
+    await asyncio.gather(*invocation_session.invocations.values())
+    while not invocation_session.outbox.empty():
+        await asyncio.sleep(0.01)
+    # The sender may still be sending the last message
+    await asyncio.sleep(0.05)
+    await invocation_session.close()
+
+
+def test_interleaved_invocations(db: PersistentDataManager) -> None:
+    websocket = FakeWebSocket()
+    app = component(db)
+
+    async def run() -> None:
+        invocation_session = InvocationSession(typing.cast(WebSocket, websocket), app)
+        await invocation_session.receive(invoke("a", "ada"))
+        await invocation_session.receive(invoke("b", "bob").encode())
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    for invocation_id, name in [("a", "ada"), ("b", "bob")]:
+        *tokens, result = websocket.of(invocation_id)
+        assert "".join(token["text"] for token in tokens) == "".join(
+            f"Hello {name}:{i} " for i in range(TOKENS)
+        )
+        assert SessionResult.model_validate(result).cancelled is False
+    # Both ran at once rather than one after the other
+    assert {frame["id"] for frame in websocket.frames[:4]} == {"a", "b"}
+    metrics = typing.cast(FakeMetrics, app.metrics)
+    assert [i.outcome for i in metrics.invocations] == [InvocationOutcome.completed] * 2
+
+
+def test_cancel(db: PersistentDataManager) -> None:
+    websocket = FakeWebSocket()
+    app = component(db)
+
+    async def run() -> None:
+        invocation_session = InvocationSession(typing.cast(WebSocket, websocket), app)
+        await invocation_session.receive(invoke("a"))
+        while not websocket.of("a"):
+            await asyncio.sleep(0.001)
+        await invocation_session.receive(json.dumps({"type": "cancel", "id": "a"}))
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    *tokens, result = websocket.of("a")
+    assert 0 < len(tokens) < TOKENS
+    assert SessionResult.model_validate(result).cancelled is True
+    metrics = typing.cast(FakeMetrics, app.metrics)
+    assert [i.outcome for i in metrics.invocations] == [InvocationOutcome.cancelled]
+
+
+def test_duplicate_id(db: PersistentDataManager) -> None:
+    websocket = FakeWebSocket()
+
+    async def run() -> None:
+        invocation_session = InvocationSession(
+            typing.cast(WebSocket, websocket), component(db)
+        )
+        await invocation_session.receive(invoke("a"))
+        await invocation_session.receive(invoke("a", "again"))
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    [error] = [frame for frame in websocket.of("a") if frame["type"] == "error"]
+    assert SessionError.model_validate(error).status_code == 409
+    assert websocket.of("a")[-1]["type"] == "result"
+
+
+def test_invocation_limit(
+    db: PersistentDataManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(session, "MAX_SESSION_INVOCATIONS", 2)
+    websocket = FakeWebSocket()
+
+    async def run() -> None:
+        invocation_session = InvocationSession(
+            typing.cast(WebSocket, websocket), component(db)
+        )
+        for invocation_id in "abc":
+            await invocation_session.receive(invoke(invocation_id, invocation_id))
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    [error] = websocket.of("c")
+    assert SessionError.model_validate(error).status_code == 429
+    assert websocket.of("a")[-1]["type"] == websocket.of("b")[-1]["type"] == "result"
+
+
+def test_invalid_messages(db: PersistentDataManager) -> None:
+    websocket = FakeWebSocket()
+
+    async def run() -> None:
+        invocation_session = InvocationSession(
+            typing.cast(WebSocket, websocket), component(db)
+        )
+        await invocation_session.receive(b"\xff\x00")
+        await invocation_session.receive("{}")
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    assert [(frame["id"], frame["status_code"]) for frame in websocket.frames] == [
+        (None, 400),
+        (None, 400),
+    ]
+
+
+def test_task_cache(db: PersistentDataManager, monkeypatch: pytest.MonkeyPatch) -> None:
+    lookups: list[str] = []
+    get_task_by_name = db.get_task_by_name
+
+    def counted(task_name: str) -> Any:
+        lookups.append(task_name)
+        return get_task_by_name(task_name)
+
+    monkeypatch.setattr(db, "get_task_by_name", counted)
+    websocket = FakeWebSocket()
+
+    async def run() -> None:
+        invocation_session = InvocationSession(
+            typing.cast(WebSocket, websocket), component(db)
+        )
+        for invocation_id in "abc":
+            await invocation_session.receive(invoke(invocation_id, invocation_id))
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    assert lookups == ["greet"]
+    assert [frame["id"] for frame in websocket.frames if frame["type"] == "result"]
+
+
+def test_slow_client_waits(db: PersistentDataManager) -> None:
+    websocket = FakeWebSocket(send_seconds=0.02)
+
+    async def run() -> None:
+        invocation_session = InvocationSession(
+            typing.cast(WebSocket, websocket), component(db), buffer_messages=1
+        )
+        for invocation_id in "abc":
+            await invocation_session.receive(invoke(invocation_id, invocation_id))
+        await finish(invocation_session)
+
+    asyncio.run(run())
+    assert len(websocket.frames) == 3 * (TOKENS + 1)
+    assert websocket.close_code is None
+
+
+def test_slow_client_cancelled(db: PersistentDataManager) -> None:
+    websocket = FakeWebSocket(send_seconds=0.1)
+    app = component(db)
+
+    async def run() -> None:
+        invocation_session = InvocationSession(
+            typing.cast(WebSocket, websocket),
+            app,
+            buffer_messages=1,
+            slow_client=SlowClientPolicy.cancel,
+        )
+        for invocation_id in "abc":
+            await invocation_session.receive(invoke(invocation_id, invocation_id))
+        await asyncio.gather(*invocation_session.invocations.values())
+        # Nothing is sent on a closed session
+        await invocation_session.receive(invoke("d"))
+        await asyncio.gather(*invocation_session.invocations.values())
+        with pytest.raises(WebSocketDisconnect):
+            await invocation_session.receive("{}")
+        await invocation_session.close()
+
+    asyncio.run(run())
+    assert websocket.close_code == SLOW_CLIENT_CLOSE_CODE
+    assert len(websocket.frames) < 3 * (TOKENS + 1)
+    assert not websocket.of("d")
+    metrics = typing.cast(FakeMetrics, app.metrics)
+    assert [i.outcome for i in metrics.invocations] == [InvocationOutcome.cancelled] * 4
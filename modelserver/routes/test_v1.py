@@ -0,0 +1,74 @@
+import asyncio
+import json
+import typing
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator
+
+import pytest
+from fastapi import HTTPException, Response
+
+from modelserver import task_worker
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.dependencies import AppComponent
+from modelserver.metrics._core import InvocationOutcome
+from modelserver.routes import v1
+from modelserver.routes.test_session import FakeMetrics, db  # noqa: F401
+from modelserver.types.api import (
+    TaskBatchInvocationItem,
+    TaskBatchInvocationRequest,
+    TaskInvocationRequest,
+)
+
+
+def test_batch_failure_reports_every_item(
+    db: PersistentDataManager, monkeypatch: pytest.MonkeyPatch  # noqa: F811
+) -> None:
+    async def run_task_batch_async(
+        runtime: Any, invocation: Any, prompts: list[tuple[int, str]], **kwargs: Any
+    ) -> AsyncGenerator[TaskBatchInvocationItem, str]:
+        yield TaskBatchInvocationItem(index=0, elapsed_seconds=0.1, result="hi")
+        raise RuntimeError("Model crashed")
+
+    monkeypatch.setattr(task_worker, "run_task_batch_async", run_task_batch_async)
+    app = typing.cast(
+        AppComponent,
+        SimpleNamespace(
+            db=db,
+            runtime=SimpleNamespace(admit=lambda *args, **kwargs: None),
+            metrics=FakeMetrics(),
+            record_phase_timings=False,
+        ),
+    )
+    request = TaskBatchInvocationRequest(
+        variables=[{"name": "ada"}, {"name": "bob"}, {"name": "eve"}, {}]
+    )
+
+    async def run() -> list[TaskBatchInvocationItem]:
+        response = await v1.invoke_task_batch("greet", request, app)
+        return [
+            TaskBatchInvocationItem.model_validate(json.loads(line))
+            async for line in response.body_iterator
+        ]
+
+    items = asyncio.run(run())
+    assert sorted(item.index for item in items) == [0, 1, 2, 3]
+    assert [item.result for item in items if item.error is None] == ["hi"]
+    assert {item.error for item in items if item.index in (1, 2)} == {"Model crashed"}
+    metrics = typing.cast(FakeMetrics, app.metrics)
+    # The item with invalid variables never ran
+    assert [i.outcome for i in metrics.invocations] == [
+        InvocationOutcome.completed,
+        InvocationOutcome.failed,
+        InvocationOutcome.failed,
+    ]
+
+
+def test_invoke_rejects_unrenderable_prompt(
+    db: PersistentDataManager,  # noqa: F811
+) -> None:
+    db.update_task_prompt_template("greet", "Hello {name} {0}")
+    app = typing.cast(AppComponent, SimpleNamespace(db=db))
+    request = TaskInvocationRequest(variables={"name": "ada"})
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(v1.invoke_task_sync("greet", request, Response(), app))
+    assert e.value.status_code == 400
@@ -3,10 +3,11 @@ import os
 import time
 import typing
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, AsyncGenerator
 
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Body,
     Depends,
     HTTPException,
@@ -17,15 +18,23 @@ from fastapi import (
     WebSocketDisconnect,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4
 from pydantic_core import ValidationError
 
 from modelserver import model_worker, task_worker
+from modelserver.memory import estimate_runtime_memory, serving_estimate
 from modelserver.metrics._core import (
     InvocationMeasurementsIn,
+    InvocationOutcome,
     InvocationsSummary,
     SearchInvocationsResponsePage,
 )
+from modelserver.responses import JSONResponder
+from modelserver.runtime import InferenceRuntime, InferenceTimeout, ModelKey
+from modelserver.streaming import forward_tokens, stream_events, streaming_response
+from modelserver.timing import PhaseTimeline
 from modelserver.types.locator import DiskLocator, HFLocator, Locator
 from modelserver.types.workers import RenderedTaskInvocation
 
@@ -33,25 +42,40 @@ from ..db import DataManager
 from ..dependencies import AppComponent, get_db
 from ..types.api import (
     VALID_MODEL_NAME,
+    BulkInferenceRequest,
     CompletionInference,
     CompletionInferenceRequest,
     CreateTaskRequest,
+    DraftModelParams,
     GetRegisteredModelsResponse,
     GetSavedExperimentsResponse,
     GrammarDefinition,
     ImportRequest,
+    InferencePriority,
+    LlamaRuntimeParams,
     LoraOut,
-    RegisteredModel,
+    MergeLoraRequest,
+    ModelVersionInternal,
     SavedExperimentIn,
     SavedExperimentOut,
+    ServerTiming,
+    SetDraftModelRequest,
     SetTaskBackingModelRequest,
+    SpeculationStats,
+    StreamFormat,
+    StreamSummary,
+    TaskBatchInvocationItem,
+    TaskBatchInvocationRequest,
+    TaskGenerationParams,
     TaskInfo,
     TaskInvocation,
     TaskInvocationRequest,
 )
 from ..types.tasks import (
+    BulkInferenceTask,
     DownloadDiskModelTask,
     DownloadHFModelTask,
+    MergeLoraTask,
     Task,
     TaskId,
     TaskState,
@@ -60,18 +84,132 @@ from ..types.tasks import (
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/v1")
 
+# Serializers of the listings that return store output as is, see `modelserver.responses`
+REGISTERED_MODELS_JSON = JSONResponder(GetRegisteredModelsResponse)
+SAVED_EXPERIMENTS_JSON = JSONResponder(GetSavedExperimentsResponse)
+TASKS_JSON = JSONResponder(list[TaskInfo])
+INVOCATIONS_PAGE_JSON = JSONResponder(SearchInvocationsResponsePage)
+LORAS_JSON = JSONResponder(list[LoraOut])
 
-@router.get("/models")
+
+async def admit_websocket(
+    websocket: WebSocket,
+    runtime: InferenceRuntime,
+    found_model: ModelVersionInternal,
+    lora_path: str | None = None,
+) -> bool:
+    """
+    Run admission control for a streaming session, closing the socket if the model does not fit.
+
+    :return: True if the session may proceed with loading the model.
+    """
+    try:
+        params = found_model.internal_params
+        runtime.admit(
+            ModelKey.for_model(
+                params.model_path, lora_path, params.draft, params.runtime
+            ),
+            serving_estimate(params),
+        )
+    except HTTPException as e:
+        # 1013 is "Try Again Later", the WebSocket equivalent of 503 Service Unavailable
+        await websocket.close(code=1013, reason=str(e.detail))
+        return False
+    return True
+
+
+def render_task_invocation(
+    task_info: TaskInfo,
+    found_model: ModelVersionInternal,
+    rendered_prompt: str,
+    temperature: float,
+    priority: InferencePriority,
+) -> RenderedTaskInvocation:
+    """
+    The invocation of the Task on its backing model, with the prompt rendered from the request.
+    """
+    params = found_model.internal_params
+    return RenderedTaskInvocation(
+        model_path=params.model_path,
+        rendered_prompt=rendered_prompt,
+        grammar=(
+            task_info.output_grammar.grammar_generated
+            if task_info.output_grammar is not None
+            else None
+        ),
+        temperature=temperature,
+        memory_estimate=serving_estimate(params),
+        draft=params.draft,
+        runtime=params.runtime,
+        generation_params=task_info.generation_params,
+        priority=priority,
+    )
+
+
+def record_task_invocation(
+    component: AppComponent,
+    task_info: TaskInfo,
+    rendered_prompt: str,
+    completion: str,
+    elapsed: float,
+    *,
+    used_grammar: bool,
+    used_variables: bool,
+    outcome: InvocationOutcome,
+    speculation: SpeculationStats | None = None,
+    timeline: PhaseTimeline | None = None,
+) -> None:
+    """
+    :param timeline: Phases of the invocation, stored if the server records phase timings
+    """
+    phases_ms = None
+    if timeline is not None and component.record_phase_timings:
+        phases_ms = dict(timeline.phases_ms)
+    if speculation is None:
+        speculation = SpeculationStats()
+    component.metrics.insert_invocations(
+        [
+            InvocationMeasurementsIn(
+                task_id=task_info.task_id,
+                ts=datetime.utcnow(),
+                input_tokens=len(rendered_prompt),
+                output_tokens=len(completion),
+                generate_ms=1000 * elapsed,
+                used_grammar=used_grammar,
+                used_variables=used_variables,
+                outcome=outcome,
+                draft_tokens=speculation.draft_tokens,
+                accepted_tokens=speculation.accepted_tokens,
+                phases_ms=phases_ms,
+            )
+        ]
+    )
+
+
+async def send_server_timing(websocket: WebSocket, timeline: PhaseTimeline) -> None:
+    """
+    Send the timeline as the final frame of a streaming session, after the last token.
+    """
+    await websocket.send_text(
+        ServerTiming(
+            phases_ms=timeline.phases_ms, total_ms=timeline.total_ms()
+        ).model_dump_json()
+    )
+
+
+@router.get("/models", response_model=GetRegisteredModelsResponse)
 async def get_models(
     component: Annotated[AppComponent, Depends(AppComponent)]
-) -> GetRegisteredModelsResponse:
+) -> Response:
     """
     Retrieve all registered models in the namespace.
     :return: The list of registered models
     """
-    in_models = component.db.get_registered_models()
-    out_models = [RegisteredModel(**m.dict()) for m in in_models]
-    return GetRegisteredModelsResponse(models=out_models)
+    return REGISTERED_MODELS_JSON.response(
+        GetRegisteredModelsResponse.model_construct(
+            models=component.db.get_registered_models()
+        )
+    )
 
 
 @router.post("/models/{model}/versions/{version}/complete")
@@ -79,37 +217,188 @@ async def run_inference_sync(
     model: str,
     version: str,
     request: CompletionInferenceRequest,
+    response: Response,
     component: Annotated[AppComponent, Depends(AppComponent)],
 ) -> CompletionInference:
     """
-    Run inference on the specified model
+    Run inference on the specified model. The Server-Timing header of the response breaks down
+    where the time went.
+
     :param model: The name of the model.
     :param version: The model version in semantic version format. If not provided it will be inferred to the latest version.
     :param request: Request body for inference
     :return:
     """
-    found_model = component.db.get_model_version_internal(
-        model_name=model, version=version
-    )
+    timeline = PhaseTimeline()
+    with timeline.phase("db"):
+        found_model = component.db.get_model_version_internal(
+            model_name=model, version=version
+        )
 
-    # find the uuid for the model that we want here
-    lora_path = None
-    if request.lora is not None:
-        lora_path = component.db.get_lora(lora_id=request.lora).file_path
+        # find the uuid for the model that we want here
+        lora_path = None
+        if request.lora is not None:
+            lora_path = component.db.get_lora(lora_id=request.lora).file_path
 
     # Generate the Llama context
     starttime = time.time()
-    completion = ""
+    parts: list[str] = []
     async for token in model_worker.run_completion_async(
-        request, found_model.internal_params.model_path, lora_path
+        component.runtime,
+        request,
+        found_model.internal_params,
+        lora_path,
+        timeline=timeline,
     ):
-        completion += token
+        parts.append(token)
     elapsed = time.time() - starttime
+    response.headers["Server-Timing"] = timeline.server_timing()
     return CompletionInference(
         model_name=model,
         model_version=found_model.version,
         elapsed_seconds=elapsed,
-        completion=completion,
+        completion="".join(parts),
+    )
+
+
+@router.post(
+    "/models/{model}/versions/{version}/complete/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}, "application/x-ndjson": {}}}},
+)
+async def run_inference_stream(
+    model: str,
+    version: str,
+    request: CompletionInferenceRequest,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+    format: StreamFormat = StreamFormat.sse,
+) -> StreamingResponse:
+    """
+    Run inference on the specified model, streaming a StreamToken event for every generated token
+    followed by a StreamSummary, or a StreamError if generation fails part way.
+
+    :param format: Send the events as Server-Sent Events or newline-delimited JSON
+    """
+    timeline = PhaseTimeline()
+    with timeline.phase("db"):
+        found_model = component.db.get_model_version_internal(
+            model_name=model, version=version
+        )
+        lora_path = None
+        if request.lora is not None:
+            lora_path = component.db.get_lora(lora_id=request.lora).file_path
+
+    # Admit up front, once streaming starts the status code can no longer be changed
+    params = found_model.internal_params
+    component.runtime.admit(
+        ModelKey.for_model(params.model_path, lora_path, params.draft, params.runtime),
+        serving_estimate(params),
+    )
+
+    starttime = time.time()
+
+    def finish(completion: str, outcome: InvocationOutcome) -> StreamSummary:
+        return StreamSummary(
+            elapsed_seconds=time.time() - starttime,
+            timing=ServerTiming(
+                phases_ms=timeline.phases_ms, total_ms=timeline.total_ms()
+            ),
+        )
+
+    return streaming_response(
+        stream_events(
+            model_worker.run_completion_async(
+                component.runtime, request, params, lora_path, timeline=timeline
+            ),
+            format,
+            finish,
+        ),
+        format,
+    )
+
+
+@router.put(
+    "/models/{model}/versions/{version}/draft",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+)
+async def set_draft_model(
+    model: str,
+    version: str,
+    request: SetDraftModelRequest,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+) -> None:
+    """
+    Pair a model version with a smaller draft model from the catalog, which speculatively proposes
+    tokens for the model to verify. The draft must share the model's vocabulary.
+
+    Requests that arrive after the pairing load the model alongside its draft.
+    """
+    found_model = component.db.get_model_version_internal(
+        model_name=model, version=version
+    )
+    draft_model = component.db.get_model_version_internal(
+        model_id=request.model_id, version=request.model_version
+    )
+    if draft_model.internal_params.model_path == found_model.internal_params.model_path:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A model cannot be its own draft",
+        )
+    if draft_model.internal_params.draft is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A draft model cannot have a draft model of its own",
+        )
+    component.db.set_model_version_draft(
+        model,
+        version,
+        DraftModelParams(
+            model_id=request.model_id,
+            model_version=draft_model.version,
+            model_path=draft_model.internal_params.model_path,
+            memory_estimate=draft_model.internal_params.memory_estimate,
+            blob_digest=draft_model.internal_params.blob_digest,
+            num_draft_tokens=request.num_draft_tokens,
+        ),
+    )
+
+
+@router.delete(
+    "/models/{model}/versions/{version}/draft",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+)
+async def clear_draft_model(
+    model: str, version: str, component: Annotated[AppComponent, Depends(AppComponent)]
+) -> None:
+    component.db.set_model_version_draft(model, version, None)
+
+
+@router.put(
+    "/models/{model}/versions/{version}/runtime",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+)
+async def set_model_runtime_params(
+    model: str,
+    version: str,
+    runtime: LlamaRuntimeParams,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+) -> None:
+    """
+    Change the settings llama.cpp loads a model version with, such as its context size and KV cache
+    types. The memory estimate is recomputed for the new settings.
+
+    Requests that arrive after the change load the model with the new settings. A copy loaded with
+    the old settings stays resident until it is evicted like any other idle model.
+    """
+    found_model = component.db.get_model_version_internal(
+        model_name=model, version=version
+    )
+    model_path = found_model.internal_params.model_path
+    component.db.set_model_version_runtime(
+        model, version, runtime, estimate_runtime_memory(model_path, runtime)
     )
 
 
@@ -119,9 +408,17 @@ async def run_inference_sync(
     response_class=Response,
 )
 async def delete_model_version(
-    model: str, version: str, component: Annotated[AppComponent, Depends(AppComponent)]
+    model: str,
+    version: str,
+    background_tasks: BackgroundTasks,
+    component: Annotated[AppComponent, Depends(AppComponent)],
 ) -> None:
+    """
+    Delete the model version. Its model file is reclaimed after the response, if nothing else uses it.
+    """
     component.db.delete_model_version(model, version)
+    # Sweeping unlinks files, which would stall the event loop, so it runs on the threadpool
+    background_tasks.add_task(component.blobs.gc)
 
 
 @router.delete(
@@ -130,9 +427,16 @@ async def delete_model_version(
     response_class=Response,
 )
 async def delete_model(
-    model: str, component: Annotated[AppComponent, Depends(AppComponent)]
+    model: str,
+    background_tasks: BackgroundTasks,
+    component: Annotated[AppComponent, Depends(AppComponent)],
 ) -> None:
+    """
+    Delete the model and its versions. Their model files are reclaimed after the response, if nothing
+    else uses them.
+    """
     component.db.delete_model(model)
+    background_tasks.add_task(component.blobs.gc)
 
 
 @router.put(
@@ -216,6 +520,19 @@ async def import_model_verson(
 ) -> TaskId:
     locator = import_request.locator
     logger.info(f"Received import request: {locator.model_dump_json()}")
+    quantized_version = None
+    if import_request.quantized_version is not None:
+        quantized_version = str(import_request.quantized_version)
+        if import_request.quantization is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="quantized_version requires a quantization type",
+            )
+        if quantized_version == import_request.model_version:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The quantized copy needs a version of its own",
+            )
 
     match locator.root:
         case HFLocator() as hf:
@@ -225,6 +542,8 @@ async def import_model_verson(
                         locator=hf,
                         model_name=import_request.model_name,
                         model_version=import_request.model_version,
+                        quantization=import_request.quantization,
+                        quantized_version=quantized_version,
                     )
                 )
             )
@@ -235,6 +554,8 @@ async def import_model_verson(
                         locator=disk,
                         model_name=import_request.model_name,
                         model_version=import_request.model_version,
+                        quantization=import_request.quantization,
+                        quantized_version=quantized_version,
                     )
                 ),
             )
@@ -254,6 +575,16 @@ async def import_job_status(
     return component.taskdb.get_task_state(task_id)
 
 
+@router.get("/jobs/{task_id}")
+async def job_status(
+    task_id: TaskId, component: Annotated[AppComponent, Depends(AppComponent)]
+) -> TaskState:
+    """
+    Retrieve the state of a background job, such as an import or a bulk inference run.
+    """
+    return component.taskdb.get_task_state(task_id)
+
+
 @router.websocket("/models/{model}/versions/{version}/complete")
 async def completion_async(
     *,
@@ -272,14 +603,34 @@ async def completion_async(
         request: CompletionInferenceRequest = CompletionInferenceRequest.model_validate(
             msg
         )
+        timeline = PhaseTimeline()
         lora_path = None
         if request.lora is not None:
-            lora_path = component.db.get_lora(lora_id=request.lora).file_path
-
-        async for item in model_worker.run_completion_async(
-            request, found_model.internal_params.model_path, lora_path
+            with timeline.phase("db"):
+                lora_path = component.db.get_lora(lora_id=request.lora).file_path
+        if not await admit_websocket(
+            websocket, component.runtime, found_model, lora_path
         ):
-            await websocket.send_text(str(item))
+            return
+
+        try:
+            async for _ in forward_tokens(
+                websocket,
+                model_worker.run_completion_async(
+                    component.runtime,
+                    request,
+                    found_model.internal_params,
+                    lora_path,
+                    timeline=timeline,
+                ),
+                request.framing,
+            ):
+                pass
+        except InferenceTimeout as e:
+            await websocket.close(code=1011, reason=str(e.detail))
+            return
+        if request.server_timing:
+            await send_server_timing(websocket, timeline)
         await websocket.close(1000)
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected from streaming session")
@@ -293,13 +644,17 @@ async def save_experiment(
     return component.db.save_experiment(experiment)
 
 
-@router.get("/experiments-by-model/{model_name}")
+@router.get(
+    "/experiments-by-model/{model_name}", response_model=GetSavedExperimentsResponse
+)
 async def get_experiments_for_model(
     model_name: str,
     component: Annotated[AppComponent, Depends(AppComponent)],
-) -> GetSavedExperimentsResponse:
-    return GetSavedExperimentsResponse(
-        experiments=component.db.get_experiments(model_name)
+) -> Response:
+    return SAVED_EXPERIMENTS_JSON.response(
+        GetSavedExperimentsResponse.model_construct(
+            experiments=component.db.get_experiments(model_name)
+        )
     )
 
 
@@ -352,11 +707,11 @@ async def delete_task(
     component.db.delete_task(task_name=task_name)
 
 
-@router.get("/tasks")
+@router.get("/tasks", response_model=list[TaskInfo])
 async def get_tasks(
     component: Annotated[AppComponent, Depends(AppComponent)],
-) -> list[TaskInfo]:
-    return component.db.get_tasks()
+) -> Response:
+    return TASKS_JSON.response(component.db.get_tasks())
 
 
 @router.post(
@@ -453,6 +808,23 @@ async def task_set_input_schema(
     component.db.update_task_input_schema(task_name, input_schema)
 
 
+@router.post(
+    "/tasks/{task_name}/generation",
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+)
+async def task_set_generation_params(
+    task_name: str,
+    generation_params: TaskGenerationParams,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+) -> None:
+    """
+    Set how invocations of the Task generate: a token limit, stop strings, whether to stop as soon
+    as the output satisfies the Task's grammar, and whether to speculate with prompt lookup.
+    """
+    component.db.update_task_generation_params(task_name, generation_params)
+
+
 @router.post(
     "/tasks/{task_name}/model",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -463,6 +835,35 @@ async def task_set_backing_model(
     set_model_request: SetTaskBackingModelRequest,
     component: Annotated[AppComponent, Depends(AppComponent)],
 ) -> None:
+    """
+    Switch the Task over to a new model. The new model is loaded first, evicting idle models to make
+    room for it, and the Task keeps being served by its current model until the load completes. The
+    Task stays on its current model if the new one fails to load.
+    """
+    # Fail fast on unknown tasks or models
+    component.db.get_task_by_name(task_name)
+    found_model = component.db.get_model_version_internal(
+        model_id=set_model_request.model_id,
+        version=set_model_request.model_version,
+    )
+    params = found_model.internal_params
+    key = ModelKey.for_model(
+        params.model_path, draft=params.draft, runtime=params.runtime
+    )
+    try:
+        # Loading blocks until the model is ready to serve
+        await run_in_threadpool(
+            component.runtime.preload, key, serving_estimate(params), evict=True
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed loading new model for task {task_name}", exc_info=e)
+        component.runtime.evict(key)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed loading model: {e}",
+        )
     component.db.set_task_backing_model(
         task_name=task_name,
         model_id=set_model_request.model_id,
@@ -497,74 +898,291 @@ async def get_task_metrics(
 async def invoke_task_sync(
     task_name: str,
     request: TaskInvocationRequest,
+    response: Response,
     component: Annotated[AppComponent, Depends(AppComponent)],
 ) -> TaskInvocation:
     """
-    Run inference on the specified model
+    Run inference on the specified model. The Server-Timing header of the response breaks down
+    where the time went.
+
     :param model: The name of the model.
     :param version: The model version in semantic version format. If not provided it will be inferred to the latest version.
     :param request: Request body for inference
     :return:
     """
-    task_info = component.db.get_task_by_name(task_name)
-    found_model = component.db.get_model_version_internal(
-        model_id=str(task_info.model_id), version=str(task_info.model_version)
-    )
-
-    # Ensure variables provided completely fulfill declared variables needed at runtime
-    provided_vars = set(request.variables.keys())
-    required_vars = set(task_info.task_params.keys())
-
-    unset_vars = required_vars.difference(provided_vars)
-    extra_vars = provided_vars.difference(required_vars)
-
-    if len(unset_vars) + len(extra_vars) > 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid variables passed to function: unknown={extra_vars} not-set={unset_vars}",
+    timeline = PhaseTimeline()
+    with timeline.phase("db"):
+        task_info = component.db.get_task_by_name(task_name)
+        found_model = component.db.get_model_version_internal(
+            model_id=str(task_info.model_id), version=str(task_info.model_version)
         )
 
-    completion = ""
+    try:
+        rendered_prompt = task_worker.render_prompt(task_info, request.variables)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    rendered_prompt = task_info.prompt_template.format(**request.variables)
-    if task_info.output_grammar is None:
-        grammar = None
-    else:
-        grammar = task_info.output_grammar.grammar_generated
+    parts: list[str] = []
 
     # Generate the Llama context
     starttime = time.time()
-    rendered_invocation = RenderedTaskInvocation(
-        model_path=found_model.internal_params.model_path,
-        rendered_prompt=rendered_prompt,
-        grammar=grammar,
-        temperature=request.temperature,
+    rendered_invocation = render_task_invocation(
+        task_info, found_model, rendered_prompt, request.temperature, request.priority
     )
 
-    async for token in task_worker.run_task_async(rendered_invocation):
-        completion += token
-
-    elapsed = time.time() - starttime
-
-    # Update metrics before returning
-    component.metrics.insert_invocations(
-        [
-            InvocationMeasurementsIn(
-                task_id=task_info.task_id,
-                ts=datetime.utcnow(),
-                input_tokens=len(rendered_prompt),
-                output_tokens=len(completion),
-                generate_ms=1000 * elapsed,
-                used_grammar=grammar is not None,
-                used_variables=len(provided_vars) > 0,
+    outcome = InvocationOutcome.cancelled
+    speculation = SpeculationStats()
+    try:
+        async for token in component.coalescer.invoke(
+            rendered_invocation,
+            lambda: task_worker.run_task_async(
+                component.runtime, rendered_invocation, speculation, timeline
+            ),
+        ):
+            parts.append(token)
+        outcome = InvocationOutcome.completed
+    except InferenceTimeout:
+        outcome = InvocationOutcome.timed_out
+        raise
+    except Exception:
+        outcome = InvocationOutcome.failed
+        raise
+    finally:
+        elapsed = time.time() - starttime
+        completion = "".join(parts)
+        # Update metrics before returning
+        with timeline.phase("metrics"):
+            record_task_invocation(
+                component,
+                task_info,
+                rendered_prompt,
+                completion,
+                elapsed,
+                used_grammar=rendered_invocation.grammar is not None,
+                used_variables=len(request.variables) > 0,
+                outcome=outcome,
+                speculation=speculation,
+                timeline=timeline,
             )
-        ]
-    )
+    response.headers["Server-Timing"] = timeline.server_timing()
 
     return TaskInvocation(
         task_name=task_name,
         elapsed_seconds=elapsed,
         result=completion,
+        speculation=speculation if speculation.draft_tokens > 0 else None,
+    )
+
+
+@router.post(
+    "/tasks/{task_name}/invoke/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}, "application/x-ndjson": {}}}},
+)
+async def invoke_task_stream(
+    task_name: str,
+    request: TaskInvocationRequest,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+    format: StreamFormat = StreamFormat.sse,
+) -> StreamingResponse:
+    """
+    Invoke the Task, streaming a StreamToken event for every generated token followed by a
+    StreamSummary, or a StreamError if generation fails part way.
+
+    :param format: Send the events as Server-Sent Events or newline-delimited JSON
+    """
+    timeline = PhaseTimeline()
+    with timeline.phase("db"):
+        task_info = component.db.get_task_by_name(task_name)
+        found_model = component.db.get_model_version_internal(
+            model_id=str(task_info.model_id), version=str(task_info.model_version)
+        )
+    try:
+        rendered_prompt = task_worker.render_prompt(task_info, request.variables)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    rendered_invocation = render_task_invocation(
+        task_info, found_model, rendered_prompt, request.temperature, request.priority
+    )
+
+    # Admit up front, once streaming starts the status code can no longer be changed
+    params = found_model.internal_params
+    component.runtime.admit(
+        ModelKey.for_model(
+            params.model_path, draft=params.draft, runtime=params.runtime
+        ),
+        serving_estimate(params),
+    )
+
+    starttime = time.time()
+    speculation = SpeculationStats()
+
+    def finish(completion: str, outcome: InvocationOutcome) -> StreamSummary:
+        elapsed = time.time() - starttime
+        with timeline.phase("metrics"):
+            record_task_invocation(
+                component,
+                task_info,
+                rendered_prompt,
+                completion,
+                elapsed,
+                used_grammar=rendered_invocation.grammar is not None,
+                used_variables=len(request.variables) > 0,
+                outcome=outcome,
+                speculation=speculation,
+                timeline=timeline,
+            )
+        return StreamSummary(
+            elapsed_seconds=elapsed,
+            speculation=speculation if speculation.draft_tokens > 0 else None,
+            timing=ServerTiming(
+                phases_ms=timeline.phases_ms, total_ms=timeline.total_ms()
+            ),
+        )
+
+    return streaming_response(
+        stream_events(
+            component.coalescer.invoke(
+                rendered_invocation,
+                lambda: task_worker.run_task_async(
+                    component.runtime, rendered_invocation, speculation, timeline
+                ),
+            ),
+            format,
+            finish,
+        ),
+        format,
+    )
+
+
+@router.post(
+    "/tasks/{task_name}/invoke-batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def invoke_task_batch(
+    task_name: str,
+    request: TaskBatchInvocationRequest,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+) -> StreamingResponse:
+    """
+    Invoke the Task once for every set of variables in the request.
+
+    Results are streamed back as NDJSON, one TaskBatchInvocationItem per line in the order the items
+    complete. Items fail independently: an item with invalid variables reports its error without
+    affecting the rest of the batch.
+    """
+    task_info = component.db.get_task_by_name(task_name)
+    found_model = component.db.get_model_version_internal(
+        model_id=str(task_info.model_id), version=str(task_info.model_version)
+    )
+    # Admit up front, once streaming starts the status code can no longer be changed
+    component.runtime.admit(
+        ModelKey.for_model(
+            found_model.internal_params.model_path,
+            draft=found_model.internal_params.draft,
+            runtime=found_model.internal_params.runtime,
+        ),
+        serving_estimate(found_model.internal_params),
+    )
+
+    # The rendered prompt is ignored, each item brings its own
+    invocation = render_task_invocation(
+        task_info, found_model, "", request.temperature, request.priority
+    )
+
+    # Validate every item against the declared variables before running any of them
+    failed: list[TaskBatchInvocationItem] = []
+    prompts: dict[int, str] = {}
+    for index, variables in enumerate(request.variables):
+        try:
+            prompts[index] = task_worker.render_prompt(task_info, variables)
+        except ValueError as e:
+            failed.append(
+                TaskBatchInvocationItem(index=index, elapsed_seconds=0, error=str(e))
+            )
+
+    async def results() -> AsyncGenerator[str, str]:
+        for item in failed:
+            yield item.model_dump_json() + "\n"
+        if len(prompts) == 0:
+            return
+
+        def record(item: TaskBatchInvocationItem, outcome: InvocationOutcome) -> None:
+            record_task_invocation(
+                component,
+                task_info,
+                prompts[item.index],
+                item.result or "",
+                item.elapsed_seconds,
+                used_grammar=invocation.grammar is not None,
+                used_variables=len(task_info.task_params) > 0,
+                outcome=outcome,
+            )
+
+        pending = set(prompts.keys())
+        starttime = time.time()
+        try:
+            async for item in task_worker.run_task_batch_async(
+                component.runtime,
+                invocation,
+                list(prompts.items()),
+                priority=request.priority,
+            ):
+                pending.discard(item.index)
+                record(
+                    item,
+                    (
+                        InvocationOutcome.completed
+                        if item.error is None
+                        else InvocationOutcome.failed
+                    ),
+                )
+                yield item.model_dump_json() + "\n"
+        except Exception as e:
+            # The status code is already sent, so whatever stopped the batch is reported on every
+            # item that has no result yet
+            outcome = InvocationOutcome.failed
+            if isinstance(e, InferenceTimeout):
+                outcome = InvocationOutcome.timed_out
+            elif not isinstance(e, HTTPException):
+                logger.exception("Batch invocation failed")
+            error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+            for index in sorted(pending):
+                item = TaskBatchInvocationItem(
+                    index=index, elapsed_seconds=time.time() - starttime, error=error
+                )
+                record(item, outcome)
+                yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.post("/tasks/{task_name}/bulk")
+async def start_bulk_inference(
+    task_name: str,
+    request: BulkInferenceRequest,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+) -> TaskId:
+    """
+    Start a background job that invokes the Task for every row of a JSONL or Parquet file.
+
+    Progress is reported through `/v1/jobs/{task_id}`. The job checkpoints as it goes, submitting a job
+    with the same output path again resumes where a previous run stopped.
+    """
+    task_info = component.db.get_task_by_name(task_name)
+    if task_info.model_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Task {task_name} has no backing model",
+        )
+    if not os.path.isfile(request.input_path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Input file not found: {request.input_path}",
+        )
+    return component.taskdb.store_task(
+        Task(BulkInferenceTask(task_name=task_name, **request.model_dump()))
     )
 
 
@@ -580,6 +1198,8 @@ async def invoke_task_async(
     found_model = component.db.get_model_version_internal(
         model_id=str(task_info.model_id), version=str(task_info.model_version)
     )
+    if not await admit_websocket(websocket, component.runtime, found_model):
+        return
 
     try:
         msg = await websocket.receive_json()
@@ -594,40 +1214,66 @@ async def invoke_task_async(
                 detail=f"Failed to parse msg as TaskInvocationRequest: {e}",
             )
 
-        # Ensure variables provided completely fulfill declared variables needed at runtime
-        provided_vars = set(request.variables.keys())
-        required_vars = set(task_info.task_params.keys())
+        timeline = PhaseTimeline()
 
-        unset_vars = required_vars.difference(provided_vars)
-        extra_vars = provided_vars.difference(required_vars)
-
-        if len(unset_vars) + len(extra_vars) > 0:
-            await websocket.close(
-                code=1003,
-                reason=f"Invalid variables passed to invocation: unknown={extra_vars} not-set={unset_vars}",
-            )
-
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid variables passed to invocation: unknown={extra_vars} not-set={unset_vars}",
-            )
-
-        rendered_prompt = task_info.prompt_template.format(**request.variables)
-        if task_info.output_grammar is None:
-            grammar = None
-        else:
-            grammar = task_info.output_grammar.grammar_generated
+        try:
+            rendered_prompt = task_worker.render_prompt(task_info, request.variables)
+        except ValueError as e:
+            await websocket.close(code=1003, reason=str(e))
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
         # Generate the Llama context
-        rendered_invocation = RenderedTaskInvocation(
-            model_path=found_model.internal_params.model_path,
-            rendered_prompt=rendered_prompt,
-            grammar=grammar,
-            temperature=request.temperature,
+        rendered_invocation = render_task_invocation(
+            task_info,
+            found_model,
+            rendered_prompt,
+            request.temperature,
+            request.priority,
         )
 
-        async for item in task_worker.run_task_async(rendered_invocation):
-            await websocket.send_text(str(item))
+        starttime = time.time()
+        parts: list[str] = []
+        outcome = InvocationOutcome.cancelled
+        speculation = SpeculationStats()
+        try:
+            async for token in forward_tokens(
+                websocket,
+                component.coalescer.invoke(
+                    rendered_invocation,
+                    lambda: task_worker.run_task_async(
+                        component.runtime, rendered_invocation, speculation, timeline
+                    ),
+                ),
+                request.framing,
+            ):
+                parts.append(token)
+            outcome = InvocationOutcome.completed
+        except WebSocketDisconnect:
+            # Recorded as cancelled
+            raise
+        except InferenceTimeout as e:
+            outcome = InvocationOutcome.timed_out
+            await websocket.close(code=1011, reason=str(e.detail))
+            return
+        except Exception:
+            outcome = InvocationOutcome.failed
+            raise
+        finally:
+            with timeline.phase("metrics"):
+                record_task_invocation(
+                    component,
+                    task_info,
+                    rendered_prompt,
+                    "".join(parts),
+                    time.time() - starttime,
+                    used_grammar=rendered_invocation.grammar is not None,
+                    used_variables=len(request.variables) > 0,
+                    outcome=outcome,
+                    speculation=speculation,
+                    timeline=timeline,
+                )
+        if request.server_timing:
+            await send_server_timing(websocket, timeline)
         await websocket.close(1000)
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected from streaming session")
@@ -636,21 +1282,23 @@ async def invoke_task_async(
 #
 # Metrics
 #
-@router.post("/tasks/{task_name}/metrics")
+@router.post("/tasks/{task_name}/metrics", response_model=SearchInvocationsResponsePage)
 async def query_task_invocations(
     task_name: str,
     component: Annotated[AppComponent, Depends(AppComponent)],
     *,
     page_size: Annotated[int, Query()] = 100,
     page_token: Annotated[str | None, Query()] = None,
-) -> SearchInvocationsResponsePage:
+) -> Response:
     """
     Retrieve all of the task invocations, filtered to the most recent set based on the
     """
     # Decode to a date filter
     task_id = component.db.get_task_by_name(task_name).task_id
-    return component.metrics.search_invocations(
-        task_id=task_id, page_size=page_size, page_token=page_token
+    return INVOCATIONS_PAGE_JSON.response(
+        component.metrics.search_invocations(
+            task_id=task_id, page_size=page_size, page_token=page_token
+        )
     )
 
 
@@ -663,9 +1311,31 @@ async def summarize_task_invocations(
     return component.metrics.summarize_invocations(task_id=task_id)
 
 
-@router.get("/loras")
+@router.get("/loras", response_model=list[LoraOut])
 async def get_loras(
     component: Annotated[AppComponent, Depends(AppComponent)],
-) -> list[LoraOut]:
+) -> Response:
     # get back a bunch of LoRAs
-    return component.db.get_loras()
+    return LORAS_JSON.response(component.db.get_loras())
+
+
+@router.post("/loras/{lora_id}/merge")
+async def merge_lora(
+    lora_id: str,
+    request: MergeLoraRequest,
+    component: Annotated[AppComponent, Depends(AppComponent)],
+) -> TaskId:
+    """
+    Start a background job that merges the LoRA into its base model and registers the quantized result
+    as a new model version.
+
+    Progress is reported through `/v1/jobs/{task_id}`, the finished job records the size and load time
+    of the model before and after merging.
+    """
+    component.db.get_lora(lora_id)
+    component.db.get_model_version_internal(
+        model_name=request.base_model, version=str(request.base_model_version)
+    )
+    return component.taskdb.store_task(
+        Task(MergeLoraTask(lora_id=lora_id, **request.model_dump()))
+    )
@@ -0,0 +1,781 @@
+import asyncio
+import logging
+import multiprocessing as M
+import os
+import queue
+import threading
+import time
+import typing
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing.managers import SyncManager
+from typing import Any, AsyncGenerator, final
+
+from fastapi import HTTPException, status
+from llama_cpp import Llama
+
+from modelserver.backends import InferenceBackend, LlamaBackend
+from modelserver.cores import PartitionUsage, host_cores, partition_cores
+from modelserver.db._core import DataManager
+from modelserver.memory import check_admission, serving_estimate
+from modelserver.profiler import Stack, sample_stacks
+from modelserver.scheduler import ModelScheduler
+from modelserver.speculative import DraftLlama, SpeculativeDraft
+from modelserver.timing import PhaseTimeline
+from modelserver.types.api import (
+    DraftModelParams,
+    InferencePriority,
+    LlamaRuntimeParams,
+    MemoryEstimate,
+    ResidentModelStatus,
+    SpeculationStats,
+)
+
+"""
+Resident model processes for llama.cpp inference.
+
+Loading a model is by far the most expensive part of serving a request, so rather than spawning a
+fresh process and loading the model for each request, the InferenceRuntime keeps one long-lived
+process per model. Each process is a single-worker ProcessPoolExecutor whose initializer loads the
+model into a process-global, after which jobs submitted to the executor run against the already
+loaded model:
+
+    1. `admit()` makes room for a model within the memory budget, evicting idle models in LRU order,
+       and refuses with 503 when the model cannot fit.
+    2. `stream()` submits a job to the model's process and exposes the tokens the job writes to its
+       channel as an AsyncGenerator, same as the per-request workers did before. If the consumer
+       stops early or the request deadline passes, the job is signalled through its `cancelled`
+       Event, which jobs check between tokens, so the process is freed up for other requests.
+       Jobs are scheduled by priority, see `modelserver.scheduler`.
+    3. `preload()` loads a model ahead of its first request, which is used to pre-warm the models
+       backing Tasks at startup and before cutting a Task over to a new model.
+
+Model versions paired with a draft model load the draft into the same process and decode
+speculatively, see `modelserver.speculative`.
+
+Each resident process is pinned to its own partition of the host's cores, see `modelserver.cores`.
+
+Models are loaded by the runtime's inference backend, llama.cpp unless the server runs on the fake
+backend for load testing, see `modelserver.backends`.
+
+Requests with a LoRA adapter share one process per base model, which loads the weights into memory
+rather than mapping them so that adapters can be applied to them in place. Each job names the
+adapter it runs with, and `use_adapter()` swaps it in for the previously applied one.
+"""
+
+CHANNEL_SENTINEL = None
+
+logger = logging.getLogger(__name__)
+
+# Set in the resident process by its initializer.
+_resident_llama: Llama | None = None
+_resident_draft: SpeculativeDraft | None = None
+_resident_key: "ModelKey | None" = None
+_resident_adapter: str | None = None
+_adapter_reverts = 0
+_resident_cores: list[int] | None = None
+_backend: InferenceBackend = LlamaBackend()
+
+READAHEAD_CHUNK_BYTES = 16 * 1024 * 1024
+
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 600.0
+
+# How long after the end of a profile resident processes have to send back their samples
+PROFILE_REPLY_SECONDS = 5.0
+
+# Reverting an adapter subtracts its deltas from the weights again, which does not restore them
+# exactly. The weights are reloaded from disk after this many reverts so that errors do not pile up.
+ADAPTER_REVERTS_BEFORE_RELOAD = 32
+
+
+class InferenceTimeout(HTTPException):
+    """
+    Raised when a request does not finish generating before its deadline.
+    """
+
+    def __init__(self, timeout_seconds: float) -> None:
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Inference did not complete within {timeout_seconds}s",
+        )
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    """
+    Identity of a loaded model. Requests with equal keys are served by the same resident process.
+
+    :param model_path: Path to the GGUF model file
+    :param adapters: Whether the model serves requests with LoRA adapters, see `use_adapter()`
+    :param draft_model_path: Optional path to a draft model used for speculative decoding
+    :param num_draft_tokens: Number of tokens the draft model proposes at a time
+    :param runtime: Settings the model is loaded with
+    """
+
+    model_path: str
+    adapters: bool = False
+    draft_model_path: str | None = None
+    num_draft_tokens: int = 0
+    runtime: LlamaRuntimeParams = LlamaRuntimeParams()
+
+    @classmethod
+    def for_model(
+        cls,
+        model_path: str,
+        lora_path: str | None = None,
+        draft: DraftModelParams | None = None,
+        runtime: LlamaRuntimeParams | None = None,
+    ) -> "ModelKey":
+        """
+        :param lora_path: The adapter the request runs with. Requests with any adapter share a model.
+        """
+        adapters = lora_path is not None
+        runtime = runtime or LlamaRuntimeParams()
+        if draft is None:
+            return cls(model_path, adapters, runtime=runtime)
+        return cls(
+            model_path, adapters, draft.model_path, draft.num_draft_tokens, runtime
+        )
+
+
+@dataclass(frozen=True)
+class JobSignals:
+    """
+    State shared between the server and a job running in a resident process.
+
+    :param cancelled: Set when the result is no longer wanted, the job should stop as soon as possible.
+    :param preempted: Set when a higher priority job is waiting. Jobs that can be resumed should stop and
+                      return the arguments to resume with, other jobs may ignore it.
+    :param stats: Counters reported back by the job, see `report_speculation`.
+    """
+
+    cancelled: threading.Event
+    preempted: threading.Event
+    stats: dict[str, int]
+
+
+@dataclass
+class ResidentModel:
+    key: ModelKey
+    executor: ProcessPoolExecutor
+    estimate_bytes: int
+    last_used: float = field(default_factory=time.monotonic)
+    in_flight: int = 0
+    # Whether the process has loaded the model
+    loaded: bool = False
+    # Cores the process runs on, None if it may run on any core
+    cores: list[int] | None = None
+    usage: PartitionUsage = field(default_factory=lambda: PartitionUsage(host_cores()))
+    # Adapter of the job that last ran on the model
+    adapter: str | None = None
+    scheduler: ModelScheduler = field(default_factory=ModelScheduler)
+    speculation: SpeculationStats = field(default_factory=SpeculationStats)
+    # Requests to profile the process and the resulting samples, see `InferenceRuntime.profile()`
+    profile_requests: "M.Queue[tuple[float, float]]" = field(default_factory=M.Queue)
+    profile_replies: "M.Queue[Counter[Stack]]" = field(default_factory=M.Queue)
+
+
+def resident_llama() -> Llama:
+    """
+    The model loaded into the current resident process, for use by jobs submitted through `stream()`.
+    """
+    assert _resident_llama is not None, "not running inside a resident model process"
+    return _resident_llama
+
+
+def resident_draft() -> SpeculativeDraft | None:
+    """
+    The draft proposing tokens for the resident model, if it decodes speculatively.
+    """
+    return _resident_draft
+
+
+def report_speculation(signals: JobSignals, draft: SpeculativeDraft | None) -> None:
+    """
+    Report the acceptance of the draft's proposals back to the server. Jobs call this once they are
+    done generating.
+    """
+    if draft is None:
+        return
+    draft_tokens, accepted_tokens = draft.take()
+    signals.stats["draft_tokens"] = draft_tokens
+    signals.stats["accepted_tokens"] = accepted_tokens
+
+
+def use_adapter(lora_path: str | None) -> None:
+    """
+    Apply the LoRA adapter to the resident model in place of the adapter the previous job ran with.
+
+    llama.cpp merges adapters into the weights, so the previous adapter is reverted by applying it
+    again with a negative scale. Prefixes cached in the KV cache were computed with the previous
+    weights and are dropped.
+    """
+    global _resident_adapter, _adapter_reverts
+    if lora_path == _resident_adapter:
+        return
+    assert _resident_key is not None and _resident_key.adapters
+    try:
+        if _resident_adapter is not None:
+            if _adapter_reverts >= ADAPTER_REVERTS_BEFORE_RELOAD:
+                _reload_model()
+            else:
+                _backend.apply_adapter(resident_llama(), _resident_adapter, -1.0)
+                _adapter_reverts += 1
+        if lora_path is not None:
+            _backend.apply_adapter(resident_llama(), lora_path, 1.0)
+    except Exception:
+        # The weights are left in an unknown state, start over from the base model
+        _reload_model()
+        raise
+    _resident_adapter = lora_path
+    resident_llama().reset()  # type: ignore[no-untyped-call]
+
+
+def readahead(model_path: str) -> None:
+    """
+    Pull the model file into the page cache so that the mmap-backed weights are resident before the
+    first forward pass, instead of being faulted in one page at a time while serving a request.
+    """
+    with open(model_path, "rb") as f:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        while f.read(READAHEAD_CHUNK_BYTES):
+            pass
+
+
+def _thread_count(key: ModelKey) -> int | None:
+    if _resident_cores is None:
+        return key.runtime.n_threads
+    return min(key.runtime.n_threads or len(_resident_cores), len(_resident_cores))
+
+
+def _use_cores(cores: list[int] | None) -> None:
+    """
+    Pin the resident process to the cores, with one thread per core.
+    """
+    global _resident_cores
+    if cores is None or cores == _resident_cores:
+        return
+    os.sched_setaffinity(0, cores)
+    _resident_cores = cores
+    if _resident_key is None:
+        return
+    n_threads = _thread_count(_resident_key)
+    assert n_threads is not None
+    llamas = [_resident_llama]
+    if isinstance(_resident_draft, DraftLlama):
+        llamas.append(_resident_draft.llama)
+    for llama in llamas:
+        if llama is not None:
+            _backend.set_threads(llama, n_threads)
+
+
+def _run_on_cores(
+    cores: list[int] | None,
+    job: Callable[..., tuple[Any, ...] | None],
+    *args: Any,
+) -> tuple[Any, ...] | None:
+    """
+    Run the job on the cores of the process's current partition, reporting the CPU time it used.
+    """
+    signals = args[-2]
+    assert isinstance(signals, JobSignals)
+    signals.stats["started_micros"] = int(time.time() * 1e6)
+    _use_cores(cores)
+    started = time.process_time()
+    try:
+        return job(*args)
+    finally:
+        signals.stats["cpu_micros"] = int((time.process_time() - started) * 1e6)
+
+
+def _new_llama(key: ModelKey) -> Llama:
+    return _backend.load(
+        key.model_path,
+        key.runtime,
+        _thread_count(key),
+        # Adapters are applied to the weights in place, which needs them in memory rather than
+        # mapped read-only from the model file
+        key.runtime.use_mmap and not key.adapters,
+        _resident_draft,
+    )
+
+
+def _reload_model() -> None:
+    global _resident_llama, _resident_adapter, _adapter_reverts
+    assert _resident_key is not None
+    logger.info(f"Reloading model {_resident_key} in subprocess {os.getpid()}")
+    # Drop the old weights before loading the new ones
+    _resident_llama = None
+    _resident_adapter = None
+    _adapter_reverts = 0
+    _resident_llama = _new_llama(_resident_key)
+
+
+def _load_model(
+    key: ModelKey, with_readahead: bool, cores: list[int] | None = None
+) -> None:
+    global _resident_llama, _resident_draft, _resident_key
+    _use_cores(cores)
+    if with_readahead:
+        readahead(key.model_path)
+    logger.info(f"Initializing model {key} in subprocess {os.getpid()}")
+    if key.draft_model_path is not None:
+        _resident_draft = _backend.load_draft(
+            key.draft_model_path,
+            key.runtime,
+            _thread_count(key),
+            key.num_draft_tokens,
+        )
+    _resident_key = key
+    _resident_llama = _new_llama(key)
+
+
+def _serve_profiles(
+    requests: "M.Queue[tuple[float, float]]",
+    replies: "M.Queue[Counter[Stack]]",
+    process: str,
+) -> None:
+    while True:
+        seconds, rate_hz = requests.get()
+        replies.put(sample_stacks(seconds, rate_hz, process))
+
+
+def _start_resident(
+    key: ModelKey,
+    backend: InferenceBackend,
+    with_readahead: bool,
+    cores: list[int] | None,
+    profile_requests: "M.Queue[tuple[float, float]]",
+    profile_replies: "M.Queue[Counter[Stack]]",
+) -> None:
+    global _backend
+    _backend = backend
+    # Sampling runs on its own thread, so that the process can be profiled in the middle of a job
+    threading.Thread(
+        target=_serve_profiles,
+        args=(
+            profile_requests,
+            profile_replies,
+            f"{os.path.basename(key.model_path)}[{os.getpid()}]",
+        ),
+        name="profiler",
+        daemon=True,
+    ).start()
+    _load_model(key, with_readahead, cores)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+@final
+class InferenceRuntime:
+    """
+    Keeps models resident in worker processes, within a memory budget.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int,
+        with_readahead: bool = False,
+        request_timeout_seconds: float = DEFAULT_REQUEST_TIMEOUT_SECONDS,
+        partition_cores: bool = True,
+        backend: InferenceBackend | None = None,
+    ) -> None:
+        """
+        :param partition_cores: Pin every resident process to its own partition of the host's cores.
+                                Otherwise processes run on any core, with llama.cpp's default threads.
+        :param backend: Loads the models of the resident processes, defaults to llama.cpp. See
+                        `modelserver.backends`.
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self.with_readahead = with_readahead
+        self.request_timeout_seconds = request_timeout_seconds
+        self.partition_cores = partition_cores
+        self.cores = host_cores()
+        self.backend = backend or LlamaBackend()
+        self.residents: dict[ModelKey, ResidentModel] = {}
+        self.lock = threading.Lock()
+        self._manager: SyncManager | None = None
+        # Set once startup pre-warming has finished, see `prewarm_tasks`.
+        self.warm = threading.Event()
+        self.warming: list[ModelKey] = []
+
+    @property
+    def manager(self) -> SyncManager:
+        with self.lock:
+            if self._manager is None:
+                self._manager = M.Manager()
+            return self._manager
+
+    def used_bytes(self) -> int:
+        return sum(resident.estimate_bytes for resident in self.residents.values())
+
+    def admit(
+        self,
+        key: ModelKey,
+        estimate: MemoryEstimate | None,
+        *,
+        evict: bool = True,
+        claim: bool = False,
+    ) -> ResidentModel:
+        """
+        Ensure a process exists for the model, making room for it within the memory budget.
+
+        :param evict: Whether idle models may be evicted to make room.
+        :param claim: Count a job in flight on the model, which the caller ends with `release()`.
+                      Claiming under the lock keeps admissions on other threads from evicting the
+                      model before the job starts.
+        :raises HTTPException: 503 if the model does not fit.
+        """
+        with self.lock:
+            resident = self._admit_locked(key, estimate, evict)
+            if claim:
+                resident.in_flight += 1
+            return resident
+
+    def release(self, resident: ResidentModel) -> None:
+        """
+        End a job claimed by `admit()`.
+        """
+        with self.lock:
+            resident.in_flight -= 1
+            resident.last_used = time.monotonic()
+
+    def _admit_locked(
+        self, key: ModelKey, estimate: MemoryEstimate | None, evict: bool
+    ) -> ResidentModel:
+        resident = self.residents.get(key)
+        if resident is not None:
+            resident.last_used = time.monotonic()
+            return resident
+
+        needed = estimate.total_bytes if estimate is not None else 0
+        if evict:
+            idle = sorted(
+                (r for r in self.residents.values() if r.in_flight == 0),
+                key=lambda r: r.last_used,
+            )
+            while idle and self.used_bytes() + needed > self.memory_budget_bytes:
+                self._evict_locked(idle.pop(0).key)
+        if self.used_bytes() + needed > self.memory_budget_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Insufficient memory budget to load model: needs {needed} bytes, {self.memory_budget_bytes - self.used_bytes()} available",
+            )
+        check_admission(estimate)
+
+        [cores] = self._rebalance_locked(adding=1)
+        profile_requests: "M.Queue[tuple[float, float]]" = M.Queue()
+        profile_replies: "M.Queue[Counter[Stack]]" = M.Queue()
+        resident = ResidentModel(
+            key=key,
+            executor=ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_start_resident,
+                initargs=(
+                    key,
+                    self.backend,
+                    self.with_readahead,
+                    cores,
+                    profile_requests,
+                    profile_replies,
+                ),
+            ),
+            estimate_bytes=needed,
+            cores=cores,
+            usage=PartitionUsage(cores or self.cores),
+            profile_requests=profile_requests,
+            profile_replies=profile_replies,
+        )
+        self.residents[key] = resident
+        return resident
+
+    def _rebalance_locked(self, adding: int = 0) -> list[list[int] | None]:
+        """
+        Divide the cores between the resident models and the number of models being added.
+
+        :return: The partitions of the models being added
+        """
+        if not self.partition_cores:
+            return [None] * adding
+        partitions = partition_cores(self.cores, len(self.residents) + adding)
+        for resident, cores in zip(self.residents.values(), partitions):
+            if cores != resident.cores:
+                resident.cores = cores
+                resident.usage.resize(cores)
+        return list(partitions[len(self.residents) :])
+
+    def evict(self, key: ModelKey) -> None:
+        with self.lock:
+            self._evict_locked(key)
+
+    def _evict_locked(self, key: ModelKey) -> None:
+        resident = self.residents.pop(key, None)
+        if resident is None:
+            return
+        logger.info("Evicting resident model %s", key)
+        resident.executor.shutdown(wait=False, cancel_futures=True)
+        self._rebalance_locked()
+
+    def preload(
+        self, key: ModelKey, estimate: MemoryEstimate | None, *, evict: bool = False
+    ) -> None:
+        """
+        Load the model and block until it is ready to serve.
+
+        :param evict: Whether idle models may be evicted to make room, by default other models are left
+                      alone.
+        :raises HTTPException: 503 if the model does not fit.
+        """
+        resident = self.admit(key, estimate, evict=evict, claim=True)
+        try:
+            # The initializer runs as soon as the process starts, so by the time the first job
+            # completes the model is loaded.
+            resident.executor.submit(_ping).result()
+            resident.loaded = True
+        finally:
+            self.release(resident)
+
+    async def stream(
+        self,
+        key: ModelKey,
+        estimate: MemoryEstimate | None,
+        job: Callable[..., tuple[Any, ...] | None],
+        *args: Any,
+        timeout_seconds: float | None = None,
+        priority: InferencePriority = InferencePriority.interactive,
+        speculation: SpeculationStats | None = None,
+        adapter: str | None = None,
+        timeline: PhaseTimeline | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Run `job(*args, signals, channel)` in the model's resident process, yielding each item the
+        job puts on the channel until it puts CHANNEL_SENTINEL.
+
+        Jobs run one at a time per model, highest priority first. A job that is preempted by a higher
+        priority job returns the args to resume it with, and is resubmitted once the model is free.
+
+        :param timeout_seconds: Deadline for the whole job, defaults to the runtime's request timeout.
+        :param priority: Scheduling priority of the job.
+        :param speculation: Receives the acceptance of speculative decoding reported by the job.
+        :param adapter: The LoRA adapter the job applies with `use_adapter()`, which the scheduler
+                        groups jobs by.
+        :param timeline: Receives the time the job spent in each phase, see `modelserver.timing`.
+        :raises InferenceTimeout: If the job does not finish before the deadline.
+        """
+        if timeout_seconds is None:
+            timeout_seconds = self.request_timeout_seconds
+        deadline = time.monotonic() + timeout_seconds
+        loop = asyncio.get_running_loop()
+        resident = self.admit(key, estimate, claim=True)
+        finished = False
+        signals = JobSignals(
+            cancelled=self.manager.Event(),
+            preempted=self.manager.Event(),
+            stats=typing.cast(dict[str, int], self.manager.dict()),
+        )
+        chan: queue.Queue[str | None] = self.manager.Queue()
+        try:
+            while True:
+                queued_at = time.monotonic()
+                try:
+                    await asyncio.wait_for(
+                        resident.scheduler.acquire(
+                            priority, signals.preempted, adapter
+                        ),
+                        max(deadline - time.monotonic(), 0),
+                    )
+                except asyncio.TimeoutError:
+                    raise InferenceTimeout(timeout_seconds)
+                if timeline is not None:
+                    timeline.add("queue", time.monotonic() - queued_at)
+                resident.adapter = adapter
+                submitted_at = time.time()
+                first_item_at: float | None = None
+                try:
+                    res = loop.run_in_executor(
+                        resident.executor,
+                        _run_on_cores,
+                        resident.cores,
+                        job,
+                        *args,
+                        signals,
+                        chan,
+                    )
+                    while True:
+                        if time.monotonic() > deadline:
+                            raise InferenceTimeout(timeout_seconds)
+                        try:
+                            item = chan.get_nowait()
+                            if item == CHANNEL_SENTINEL:
+                                break
+                            if first_item_at is None:
+                                first_item_at = time.time()
+                            yield str(item)
+                        except queue.Empty:
+                            if res.done():
+                                # The job failed before it could send the sentinel, raise its error.
+                                await res
+                                break
+                            # NOTE(aduffy): This is important as this is how we signal in Python to
+                            #  yield to other coroutines, else nothing else in the event loop is able
+                            #  to run while we're polling the queue.
+                            await asyncio.sleep(0)
+                            continue
+                    resume = await res
+                    if timeline is not None:
+                        self._add_job_phases(
+                            timeline,
+                            resident,
+                            submitted_at,
+                            signals.stats.get("started_micros", 0) / 1e6,
+                            first_item_at,
+                        )
+                    resident.loaded = True
+                    draft_tokens = signals.stats.get("draft_tokens", 0)
+                    accepted_tokens = signals.stats.get("accepted_tokens", 0)
+                    resident.speculation.add(draft_tokens, accepted_tokens)
+                    resident.usage.cpu_seconds += (
+                        signals.stats.get("cpu_micros", 0) / 1e6
+                    )
+                    if speculation is not None:
+                        speculation.add(draft_tokens, accepted_tokens)
+                    signals.stats.clear()
+                finally:
+                    if not res.done():
+                        # The consumer went away, or we timed out: stop the job at its next token
+                        # before handing the model to the next job.
+                        signals.cancelled.set()
+                    resident.scheduler.release()
+                if resume is None:
+                    break
+                logger.info("Preempted job on %s, requeueing", key)
+                signals.preempted.clear()
+                args = resume
+            finished = True
+        except BrokenProcessPool:
+            # The model failed to load or its process died, start from scratch on the next request.
+            self.evict(key)
+            raise
+        finally:
+            if not finished:
+                signals.cancelled.set()
+            self.release(resident)
+
+    @staticmethod
+    def _add_job_phases(
+        timeline: PhaseTimeline,
+        resident: ResidentModel,
+        submitted_at: float,
+        started_at: float,
+        first_item_at: float | None,
+    ) -> None:
+        """
+        Attribute the time since the job was submitted to loading, prompt evaluation and generation.
+        Times are taken from the wall clock, which the resident process shares with the server.
+        """
+        finished_at = time.time()
+        evaluating_from = submitted_at
+        if not resident.loaded and started_at > 0:
+            timeline.add("load", started_at - submitted_at)
+            evaluating_from = started_at
+        if first_item_at is None:
+            timeline.add("prompt", finished_at - evaluating_from)
+            return
+        timeline.add("prompt", first_item_at - evaluating_from)
+        timeline.add("generate", finished_at - first_item_at)
+
+    def status(self) -> list[ResidentModelStatus]:
+        with self.lock:
+            return [
+                ResidentModelStatus(
+                    model_path=resident.key.model_path,
+                    serves_adapters=resident.key.adapters,
+                    lora_path=resident.adapter,
+                    draft_model_path=resident.key.draft_model_path,
+                    in_flight=resident.in_flight,
+                    speculation=resident.speculation.model_copy(),
+                    cores=resident.usage.cores,
+                    cpu_utilization=resident.usage.utilization(),
+                )
+                for resident in self.residents.values()
+            ]
+
+    def profile(
+        self, seconds: float, rate_hz: float, resident_processes: bool = False
+    ) -> Counter[Stack]:
+        """
+        Sample the stacks of the threads of the server process, see `modelserver.profiler`.
+
+        :param resident_processes: Also sample the resident model processes that have loaded their
+                                   model, at the same time as the server.
+        """
+        with self.lock:
+            residents = [
+                resident
+                for resident in self.residents.values()
+                if resident_processes and resident.loaded
+            ]
+        for resident in residents:
+            # Drop the samples of an earlier profile that arrived too late
+            while not resident.profile_replies.empty():
+                resident.profile_replies.get_nowait()
+            resident.profile_requests.put((seconds, rate_hz))
+
+        samples = sample_stacks(seconds, rate_hz, f"server[{os.getpid()}]")
+        for resident in residents:
+            try:
+                samples.update(
+                    resident.profile_replies.get(timeout=PROFILE_REPLY_SECONDS)
+                )
+            except queue.Empty:
+                logger.warning("No profile received from %s", resident.key)
+        return samples
+
+    def prewarm_tasks(self, db: DataManager) -> None:
+        """
+        Preload the models backing every Task, in order, until the memory budget is exhausted.
+        """
+        try:
+            keys: dict[ModelKey, MemoryEstimate | None] = {}
+            for task in db.get_tasks():
+                if task.model_id is None or task.model_version is None:
+                    continue
+                model = db.get_model_version_internal(
+                    model_id=str(task.model_id), version=str(task.model_version)
+                )
+                params = model.internal_params
+                key = ModelKey.for_model(
+                    params.model_path, draft=params.draft, runtime=params.runtime
+                )
+                keys[key] = serving_estimate(params)
+            self.warming = list(keys.keys())
+
+            for key, estimate in keys.items():
+                try:
+                    started = time.monotonic()
+                    self.preload(key, estimate)
+                    logger.info(
+                        "Pre-warmed %s in %.2fs", key, time.monotonic() - started
+                    )
+                except HTTPException as e:
+                    logger.warning("Skipping pre-warm of %s: %s", key, e.detail)
+                except Exception as e:
+                    logger.error("Failed pre-warming %s", key, exc_info=e)
+                    self.evict(key)
+                self.warming.remove(key)
+        finally:
+            self.warming = []
+            self.warm.set()
+
+    def shutdown(self) -> None:
+        with self.lock:
+            for key in list(self.residents.keys()):
+                self._evict_locked(key)
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
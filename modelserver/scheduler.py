@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import final
+
+from modelserver.types.api import InferencePriority
+
+"""
+Priority scheduling of the jobs that run on a resident model.
+
+A resident model executes one job at a time. Rather than letting jobs queue up in submission order
+inside the model's executor, every job first acquires the model from its ModelScheduler, which hands
+it out highest priority first and in arrival order within a priority.
+
+When a job arrives while a lower priority job holds the model, the holder is asked to yield through
+its `preempted` Event. Jobs check the Event between decode steps, and a job that yields returns the
+arguments to resume it with. The runtime then queues the remainder of the job behind the higher
+priority work and resubmits it once it gets the model back.
+"""
+
+# Lower ranks are served first
+PRIORITY_RANK = {
+    InferencePriority.interactive: 0,
+    InferencePriority.batch: 1,
+}
+
+# Number of times in a row a job may overtake earlier jobs of the same priority by using the adapter
+# that is already applied
+MAX_ADAPTER_OVERTAKES = 8
+
+
+@dataclass(order=True)
+class Waiter:
+    rank: int
+    seq: int
+    loop: asyncio.AbstractEventLoop = field(compare=False)
+    granted: asyncio.Future[None] = field(compare=False)
+    preempted: threading.Event = field(compare=False)
+    adapter: str | None = field(compare=False)
+
+
+def _wake(granted: asyncio.Future[None]) -> None:
+    if not granted.done():
+        granted.set_result(None)
+
+
+@final
+class ModelScheduler:
+    """
+    Grants a resident model to one job at a time.
+
+    Jobs may wait on different event loops, as bulk jobs run their own, so state is guarded by a
+    threading lock and each waiter is woken up on its own loop.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.waiters: list[Waiter] = []
+        self.seq = itertools.count()
+        self.holder_rank: int | None = None
+        self.holder_preempted: threading.Event | None = None
+        # Adapter of the job last granted the model, and how many jobs in a row overtook earlier ones
+        self.adapter: str | None = None
+        self.overtakes = 0
+
+    async def acquire(
+        self,
+        priority: InferencePriority,
+        preempted: threading.Event,
+        adapter: str | None = None,
+    ) -> None:
+        """
+        Wait until the job holds the model. Every acquire must be paired with a `release()`.
+
+        :param adapter: Path of the LoRA adapter the job runs with, if any
+        """
+        rank = PRIORITY_RANK[priority]
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.holder_rank is None and len(self.waiters) == 0:
+                self.holder_rank = rank
+                self.holder_preempted = preempted
+                if adapter != self.adapter:
+                    self.adapter = adapter
+                    self.overtakes = 0
+                return
+            waiter = Waiter(
+                rank, next(self.seq), loop, loop.create_future(), preempted, adapter
+            )
+            self.waiters.append(waiter)
+            if (
+                self.holder_rank is not None
+                and self.holder_preempted is not None
+                and self.holder_rank > rank
+            ):
+                self.holder_preempted.set()
+
+        try:
+            await waiter.granted
+        except asyncio.CancelledError:
+            with self.lock:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                    raise
+            # The model was granted to us just as we were cancelled, pass it on.
+            self.release()
+            raise
+
+    def release(self) -> None:
+        with self.lock:
+            self.holder_rank = None
+            self.holder_preempted = None
+            if len(self.waiters) > 0:
+                waiter = self._next_waiter_locked()
+                self.holder_rank = waiter.rank
+                self.holder_preempted = waiter.preempted
+                waiter.loop.call_soon_threadsafe(_wake, waiter.granted)
+
+    def _next_waiter_locked(self) -> Waiter:
+        oldest = min(self.waiters)
+        if self.overtakes < MAX_ADAPTER_OVERTAKES:
+            waiter = min(
+                self.waiters,
+                key=lambda w: (w.rank, w.adapter != self.adapter, w.seq),
+            )
+        else:
+            waiter = oldest
+        self.waiters.remove(waiter)
+        if waiter.adapter != self.adapter:
+            self.adapter = waiter.adapter
+            self.overtakes = 0
+        elif waiter is not oldest:
+            self.overtakes += 1
+        else:
+            self.overtakes = 0
+        return waiter
@@ -0,0 +1,224 @@
+import codecs
+from abc import abstractmethod
+from contextlib import contextmanager
+from typing import Any, Iterator, final
+
+import numpy as np
+import numpy.typing as npt
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+from modelserver.grammar import Grammar, GrammarMatcher
+
+"""
+Speculative decoding for llama.cpp models.
+
+Decoding on CPU is bound by memory bandwidth: every generated token streams all of the weights
+through the cores once. llama-cpp-python can instead evaluate a run of proposed tokens in a single
+batched forward pass, sampling from the logits at each position and keeping the proposals up to
+the first one the model disagrees with. Every token is still sampled from the model itself, so the
+output is unchanged, but each accepted proposal saves a full pass over the weights.
+
+Proposals come from a SpeculativeDraft, either a smaller draft model, a lookup of earlier n-grams
+in the prompt or the text an output grammar forces next, which also keeps count of how many of its proposals were accepted. Acceptance is
+worked out from the tokens the model generated by the time the draft is asked for its next
+proposal, so the last proposal of each sequence is not counted.
+"""
+
+
+class SpeculativeDraft(LlamaDraftModel):
+    """
+    Proposes continuations of a token sequence, keeping track of how many proposals get accepted.
+    """
+
+    def __init__(self) -> None:
+        # Position in the sequence where the outstanding proposal starts, and the proposal itself
+        self.pending: tuple[int, list[int]] | None = None
+        self.draft_tokens = 0
+        self.accepted_tokens = 0
+
+    @abstractmethod
+    def propose(self, input_ids: list[int]) -> list[int]:
+        """
+        :param input_ids: The sequence so far, prompt included
+        :return: The proposed continuation, which may be empty
+        """
+
+    def begin(self) -> None:
+        """
+        Called before generating a new sequence, so that proposals are not checked against it.
+        """
+        self.pending = None
+
+    def take(self) -> tuple[int, int]:
+        """
+        :return: The number of proposed and accepted tokens since the last call
+        """
+        counts = self.draft_tokens, self.accepted_tokens
+        self.draft_tokens = 0
+        self.accepted_tokens = 0
+        return counts
+
+    def __call__(
+        self, input_ids: npt.NDArray[np.intc], /, **kwargs: Any
+    ) -> npt.NDArray[np.intc]:
+        sequence = input_ids.tolist()
+        if self.pending is not None:
+            start, proposal = self.pending
+            accepted = 0
+            for proposed, generated in zip(proposal, sequence[start:]):
+                if proposed != generated:
+                    break
+                accepted += 1
+            self.draft_tokens += len(proposal)
+            self.accepted_tokens += accepted
+
+        proposal = self.propose(sequence)
+        self.pending = (len(sequence), proposal) if len(proposal) > 0 else None
+        return np.array(proposal, dtype=np.intc)
+
+
+@final
+class DraftLlama(SpeculativeDraft):
+    """
+    Proposes tokens by greedily decoding with a smaller model that shares the vocabulary.
+
+    The draft keeps its own KV cache, so only the tokens generated since its last proposal need to
+    be evaluated by the draft for each new proposal.
+    """
+
+    def __init__(self, llama: Llama, num_draft_tokens: int) -> None:
+        super().__init__()
+        self.llama = llama
+        self.num_draft_tokens = num_draft_tokens
+
+    def propose(self, input_ids: list[int]) -> list[int]:
+        if len(input_ids) + self.num_draft_tokens > self.llama.n_ctx():
+            return []
+        proposal: list[int] = []
+        for token in self.llama.generate(input_ids, temp=0.0):
+            proposal.append(token)
+            if (
+                len(proposal) == self.num_draft_tokens
+                or token == self.llama.token_eos()
+            ):
+                break
+        return proposal
+
+
+@final
+class PromptLookupDraft(SpeculativeDraft):
+    """
+    Proposes the tokens that followed an earlier occurrence of the sequence's trailing n-gram.
+
+    Extraction tasks copy spans of the prompt into their output verbatim, so once the start of a span
+    has been generated its continuation can usually be found in the prompt, without a draft model.
+    """
+
+    def __init__(self, max_ngram_size: int, num_pred_tokens: int) -> None:
+        super().__init__()
+        self.max_ngram_size = max_ngram_size
+        self.num_pred_tokens = num_pred_tokens
+
+    def propose(self, input_ids: list[int]) -> list[int]:
+        candidates = LlamaPromptLookupDecoding.find_candidate_pred_tokens(
+            np.array(input_ids, dtype=np.intc),
+            self.max_ngram_size,
+            self.num_pred_tokens,
+        )
+        return [int(token) for token in candidates]
+
+
+def tokenize_continuation(llama: Llama, text: bytes) -> list[int]:
+    """
+    Tokenize text that continues a sequence.
+
+    SentencePiece vocabularies put a space in front of the first word of the text being tokenized,
+    which a continuation must not get. The text is tokenized after a newline instead, and the tokens
+    that follow the newline are kept if they spell out exactly the text.
+    """
+    tokens = llama.tokenize(b"\n" + text, add_bos=False)
+    prefix = b""
+    for i, token in enumerate(tokens):
+        prefix += llama.detokenize([token])
+        if prefix.endswith(b"\n"):
+            continuation = tokens[i + 1 :]
+            return continuation if llama.detokenize(continuation) == text else []
+    return []
+
+
+@final
+class GrammarForcedDraft(SpeculativeDraft):
+    """
+    Proposes the text the output grammar forces next, such as the keys, quotes and colons of a JSON
+    document, and otherwise defers to the fallback draft if there is one.
+
+    The grammar is followed through the text generated so far. Proposals are verified by the model
+    like any other, so a forced stretch that the model would tokenize differently costs at most the
+    wasted positions of one batch.
+    """
+
+    # Longest forced text proposed at once, in characters
+    MAX_FORCED_CHARS = 64
+
+    def __init__(
+        self, llama: Llama, grammar: Grammar, fallback: SpeculativeDraft | None
+    ) -> None:
+        super().__init__()
+        self.llama = llama
+        self.grammar = grammar
+        self.fallback = fallback
+        self.matcher: GrammarMatcher | None = None
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Length of the sequence the matcher has consumed
+        self.consumed: int | None = None
+
+    def begin(self) -> None:
+        super().begin()
+        self.matcher = GrammarMatcher(self.grammar)
+        self.decoder.reset()
+        self.consumed = None
+        if self.fallback is not None:
+            self.fallback.begin()
+
+    def propose(self, input_ids: list[int]) -> list[int]:
+        if self.consumed is None:
+            # The draft is first asked for a proposal right after the first token is sampled
+            self.consumed = len(input_ids) - 1
+        text = self.decoder.decode(self.llama.detokenize(input_ids[self.consumed :]))
+        self.consumed = len(input_ids)
+
+        if self.matcher is not None and not self.matcher.advance(text):
+            # The output left the grammar, e.g. after a stop string, stop forcing for this sequence
+            self.matcher = None
+        if self.matcher is not None:
+            forced = self.matcher.forced(self.MAX_FORCED_CHARS)
+            if len(forced) > 0:
+                proposal = tokenize_continuation(self.llama, forced.encode("utf-8"))
+                if len(proposal) > 0:
+                    return proposal
+
+        if self.fallback is None:
+            return []
+        return self.fallback.propose(input_ids)
+
+
+@contextmanager
+def speculating(llama: Llama, draft: SpeculativeDraft | None) -> Iterator[None]:
+    """
+    Decode with the draft for the duration of the block.
+
+    Verifying proposals needs the logits of every evaluated token rather than only the last one,
+    which llama-cpp-python reads through `context_params.logits_all`. The flag is only switched on
+    while speculating, so plain prompt evaluation does not pay for the extra logits.
+    """
+    if draft is None:
+        yield
+        return
+    saved = llama.draft_model, llama.context_params.logits_all
+    llama.draft_model = draft
+    llama.context_params.logits_all = True
+    try:
+        yield
+    finally:
+        llama.draft_model, llama.context_params.logits_all = saved
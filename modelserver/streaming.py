@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import struct
+import time
+from collections.abc import Callable
+from typing import AsyncGenerator
+
+import anyio
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from modelserver.metrics._core import InvocationOutcome
+from modelserver.runtime import InferenceTimeout
+from modelserver.types.api import (
+    SlowClientPolicy,
+    StreamError,
+    StreamFormat,
+    StreamFraming,
+    StreamSummary,
+    StreamToken,
+)
+
+"""
+Sending generated tokens over WebSocket streaming sessions and HTTP streaming responses.
+
+Generation and sending are decoupled by a bounded buffer per session. The route's loop moves tokens
+from the inference job into the buffer, and a sender task gathers them into frames as configured by
+the request's StreamFraming, so a frame can carry several tokens and a slow send does not hold up
+reading the job's output. A client that falls a full buffer behind either holds the loop up until it
+catches up, or has its session cancelled.
+
+HTTP streaming responses send an event per token, as Server-Sent Events or newline-delimited JSON,
+followed by a summary event with the timings of the request.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Position of the token in the output and the length of its UTF-8 bytes, see StreamFraming.binary
+BINARY_TOKEN_HEADER = struct.Struct("<II")
+
+# Close code for clients that cannot keep up with the stream, 1008 is "Policy Violation"
+SLOW_CLIENT_CLOSE_CODE = 1008
+
+STREAM_MEDIA_TYPES = {
+    StreamFormat.sse: "text/event-stream",
+    StreamFormat.ndjson: "application/x-ndjson",
+}
+
+
+def encode_binary_frame(tokens: list[str], first_position: int) -> bytes:
+    frame = bytearray()
+    for position, token in enumerate(tokens, start=first_position):
+        data = token.encode("utf-8")
+        frame += BINARY_TOKEN_HEADER.pack(position, len(data))
+        frame += data
+    return bytes(frame)
+
+
+def decode_binary_frame(frame: bytes) -> list[tuple[int, str]]:
+    """
+    :return: The position and text of every token in the frame
+    """
+    tokens = []
+    offset = 0
+    while offset < len(frame):
+        position, length = BINARY_TOKEN_HEADER.unpack_from(frame, offset)
+        offset += BINARY_TOKEN_HEADER.size
+        tokens.append((position, frame[offset : offset + length].decode("utf-8")))
+        offset += length
+    return tokens
+
+
+async def send_frames(
+    websocket: WebSocket, buffer: asyncio.Queue[str | None], framing: StreamFraming
+) -> None:
+    """
+    Send the tokens put on the buffer to the client, until None is put on it.
+    """
+    sent = 0
+    finished = False
+    while not finished:
+        token = await buffer.get()
+        if token is None:
+            return
+        frame = [token]
+        flush_at = time.monotonic() + framing.flush_ms / 1000
+        while len(frame) < framing.flush_tokens:
+            if buffer.empty():
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    token = await asyncio.wait_for(buffer.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                token = buffer.get_nowait()
+            if token is None:
+                finished = True
+                break
+            frame.append(token)
+        if framing.binary:
+            await websocket.send_bytes(encode_binary_frame(frame, sent))
+        else:
+            await websocket.send_text("".join(frame))
+        sent += len(frame)
+
+
+async def watch_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+def _failure(sender: asyncio.Task[None]) -> BaseException | None:
+    return sender.exception() if sender.done() else None
+
+
+async def _put(
+    buffer: asyncio.Queue[str | None],
+    item: str | None,
+    watcher: asyncio.Task[None],
+    sender: asyncio.Task[None],
+) -> None:
+    """
+    Wait for room in the buffer, unless the client goes away first.
+    """
+    put = asyncio.ensure_future(buffer.put(item))
+    await asyncio.wait({put, watcher, sender}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        raise WebSocketDisconnect()
+
+
+async def forward_tokens(
+    websocket: WebSocket,
+    tokens: AsyncGenerator[str, str],
+    framing: StreamFraming = StreamFraming(),
+) -> AsyncGenerator[str, str]:
+    """
+    Send each token to the client as it is generated, yielding it back to the caller once buffered.
+    Returns once every token has been sent.
+
+    Generation is stopped as soon as the client disconnects, which cancels the inference job
+    instead of leaving it generating tokens nobody will read.
+
+    :raises WebSocketDisconnect: If the client disconnected before generation finished, or was
+                                 disconnected for falling behind under SlowClientPolicy.cancel.
+    """
+    watcher = asyncio.create_task(watch_disconnect(websocket))
+    buffer: asyncio.Queue[str | None] = asyncio.Queue(framing.buffer_tokens)
+    sender = asyncio.create_task(send_frames(websocket, buffer, framing))
+    try:
+        async for token in tokens:
+            if watcher.done() or sender.done():
+                raise WebSocketDisconnect() from _failure(sender)
+            if not buffer.full():
+                buffer.put_nowait(token)
+            elif framing.slow_client == SlowClientPolicy.cancel:
+                await websocket.close(
+                    code=SLOW_CLIENT_CLOSE_CODE,
+                    reason=f"Client fell {framing.buffer_tokens} tokens behind the stream",
+                )
+                raise WebSocketDisconnect()
+            else:
+                await _put(buffer, token, watcher, sender)
+            yield token
+        await _put(buffer, None, watcher, sender)
+        await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not sender.done() or sender.exception() is not None:
+            raise WebSocketDisconnect() from _failure(sender)
+    finally:
+        watcher.cancel()
+        sender.cancel()
+        await tokens.aclose()
+
+
+def encode_event(
+    event: StreamToken | StreamSummary | StreamError, format: StreamFormat
+) -> str:
+    data = event.model_dump_json()
+    if format == StreamFormat.sse:
+        return f"event: {event.type}\ndata: {data}\n\n"
+    return f"{data}\n"
+
+
+async def stream_events(
+    tokens: AsyncGenerator[str, str],
+    format: StreamFormat,
+    finish: Callable[[str, InvocationOutcome], StreamSummary],
+) -> AsyncGenerator[str, None]:
+    """
+    Send an event for each token as it is generated, then the summary of the request, or an error
+    event if generation fails part way.
+
+    :param finish: Called with the output and how generation ended once it ends, for any reason,
+                   including the client going away. Returns the summary sent as the last event.
+    """
+    parts: list[str] = []
+    outcome = InvocationOutcome.cancelled
+    error: StreamError | None = None
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield encode_event(StreamToken(text=token), format)
+        outcome = InvocationOutcome.completed
+    except InferenceTimeout as e:
+        outcome = InvocationOutcome.timed_out
+        error = StreamError(status_code=e.status_code, detail=str(e.detail))
+    except HTTPException as e:
+        outcome = InvocationOutcome.failed
+        error = StreamError(status_code=e.status_code, detail=str(e.detail))
+    except Exception as e:
+        logger.error("Streaming generation failed", exc_info=e)
+        outcome = InvocationOutcome.failed
+        error = StreamError(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Generation failed",
+        )
+    finally:
+        # Stop the job even when the response was cancelled because the client went away
+        with anyio.CancelScope(shield=True):
+            await tokens.aclose()
+        summary = finish("".join(parts), outcome)
+    yield encode_event(error or summary, format)
+
+
+def streaming_response(
+    events: AsyncGenerator[str, None], format: StreamFormat
+) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={
+            "Cache-Control": "no-cache",
+            # Ask reverse proxies not to buffer the events
+            "X-Accel-Buffering": "no",
+        },
+    )
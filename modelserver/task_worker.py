@@ -1,31 +1,216 @@
-import asyncio
 import logging
-import multiprocessing as M
-import os
 import queue
+import threading
+import time
 import typing
-from concurrent.futures import ProcessPoolExecutor
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Iterator
 
 from llama_cpp import CompletionChunk, Llama
 from llama_cpp.llama_grammar import LlamaGrammar
 
+from modelserver.grammar import CharSet, GrammarError, GrammarMatcher, Stack, parse_gbnf
+from modelserver.runtime import (
+    CHANNEL_SENTINEL,
+    InferenceRuntime,
+    JobSignals,
+    ModelKey,
+    report_speculation,
+    resident_draft,
+    resident_llama,
+)
+from modelserver.speculative import (
+    GrammarForcedDraft,
+    PromptLookupDraft,
+    SpeculativeDraft,
+    speculating,
+)
+from modelserver.timing import PhaseTimeline
+from modelserver.types.api import (
+    InferencePriority,
+    SpeculationStats,
+    TaskBatchInvocationItem,
+    TaskGenerationParams,
+    TaskInfo,
+)
 from modelserver.types.workers import RenderedTaskInvocation
 
-CHANNEL_SENTINEL = None
-
 logger = logging.getLogger(__name__)
 
 
+def render_prompt(task_info: TaskInfo, variables: dict[str, str]) -> str:
+    """
+    Render the Task's prompt template with the variables of one invocation.
+
+    :raises ValueError: If the variables do not match the variables declared by the Task.
+    """
+    provided_vars = set(variables.keys())
+    required_vars = set(task_info.task_params.keys())
+    unset_vars = required_vars.difference(provided_vars)
+    extra_vars = provided_vars.difference(required_vars)
+    if len(unset_vars) + len(extra_vars) > 0:
+        raise ValueError(
+            f"Invalid variables passed to function: unknown={extra_vars} not-set={unset_vars}"
+        )
+    try:
+        return task_info.prompt_template.format(**variables)
+    except (IndexError, KeyError, ValueError) as e:
+        raise ValueError(f"Failed rendering prompt template: {e}")
+
+
+class JsonValueTracker:
+    """
+    Incrementally scans generated text to find where the top-level JSON object or array ends.
+
+    Task grammars describe JSON documents, so a closed top-level value means the grammar has accepted
+    the output and anything generated after it is whitespace the grammar happens to allow. Only use it
+    for grammars whose root is an object or array, see `stops_on_grammar_accept`.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # Set once the text closes more than it opened, after which it is not tracked any further
+        self.invalid = False
+
+    def feed(self, text: str) -> int | None:
+        """
+        :return: The length of the prefix of `text` that completes the value, or None if still incomplete.
+        """
+        if self.invalid:
+            return None
+        for i, c in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+            elif c == '"':
+                self.in_string = True
+            elif c in "{[":
+                self.depth += 1
+            elif c in "}]":
+                if self.depth <= 0:
+                    self.invalid = True
+                    return None
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return None
+
+
+def stops_on_grammar_accept(grammar: str | None, params: TaskGenerationParams) -> bool:
+    """
+    Whether generation can stop as soon as the output is a complete JSON value: the Task asks for it
+    and every output of its grammar is a JSON object or array. The end of a string, number or literal
+    cannot be told apart from a prefix of a longer one, so grammars with any other root, or that the
+    matcher cannot parse, generate until the model stops.
+    """
+    if grammar is None or not params.stop_on_grammar_accept:
+        return False
+    try:
+        matcher = GrammarMatcher(parse_gbnf(grammar))
+    except GrammarError as e:
+        logger.warning(f"Not stopping on grammar accept: {e}")
+        return False
+    opening = {ord("{"), ord("[")}
+    return all(
+        len(stack) > 0 and _first_char(matcher, stack) in opening
+        for stack in matcher.stacks
+    )
+
+
+def _first_char(matcher: GrammarMatcher, stack: Stack) -> int | None:
+    rule, alternative, index = stack[-1]
+    symbol = matcher.grammar.rules[rule][alternative][index]
+    return symbol.single() if isinstance(symbol, CharSet) else None
+
+
+def task_draft(
+    llama: Llama, grammar: str | None, params: TaskGenerationParams
+) -> SpeculativeDraft | None:
+    """
+    The draft proposing tokens for an invocation: prompt lookup if the Task asks for it, otherwise the
+    resident model's draft model if it has one.
+
+    With an output grammar, the text the grammar forces is proposed ahead of either, unless the Task
+    turns off `grammar_jump_forward`. Grammars the matcher cannot parse are decoded without it.
+    """
+    draft: SpeculativeDraft | None
+    if params.prompt_lookup:
+        draft = PromptLookupDraft(
+            params.prompt_lookup_ngram_size, params.prompt_lookup_num_tokens
+        )
+    else:
+        draft = resident_draft()
+    if grammar is None or not params.grammar_jump_forward:
+        return draft
+    try:
+        return GrammarForcedDraft(llama, parse_gbnf(grammar), draft)
+    except GrammarError as e:
+        logger.warning(f"Decoding without grammar jump-forward: {e}")
+        return draft
+
+
+def generate_task(
+    llama: Llama,
+    prompt: str,
+    temperature: float,
+    llama_grammar: LlamaGrammar | None,
+    params: TaskGenerationParams,
+    draft: SpeculativeDraft | None,
+    cancelled: threading.Event,
+    stop_on_accept: bool = False,
+) -> Iterator[str]:
+    """
+    Generate the completion for a single Task invocation, yielding text as it is generated.
+
+    Generation stops early once `cancelled` is set.
+
+    :param stop_on_accept: Stop once the output is a complete JSON value, see `stops_on_grammar_accept`
+    """
+    tracker = JsonValueTracker() if stop_on_accept else None
+    if draft is not None:
+        draft.begin()
+
+    with speculating(llama, draft):
+        for next_chunk in llama.create_completion(
+            prompt,
+            max_tokens=params.max_tokens,
+            temperature=temperature,
+            stop=params.stop or None,
+            stream=True,
+            grammar=llama_grammar,
+        ):
+            # TODO(aduffy): Enable non-greedy decoding strategies
+            chunk: CompletionChunk = typing.cast(CompletionChunk, next_chunk)
+            text = chunk["choices"][0]["text"]
+            accepted = tracker.feed(text) if tracker is not None else None
+            if accepted is not None:
+                yield text[:accepted]
+                return
+            yield text
+            if cancelled.is_set():
+                logger.info("Generation cancelled")
+                return
+
+
 def invoke_task(
-    model_path: str,
     prompt: str,
     temperature: float,
     grammar: str | None,
+    params: TaskGenerationParams,
+    signals: JobSignals,
     channel: queue.Queue[str | None],
-) -> None:
+) -> tuple[str, float, None, TaskGenerationParams] | None:
     """
     Execute completion, sending the results back over the completion task.
+
+    Unconstrained generations can be preempted, in which case the arguments to continue generating
+    from where it left off are returned. llama.cpp offers no way to restore the state of a grammar,
+    so generations constrained by a grammar always run to completion.
     """
 
     logger.info("starting Task invocation")
@@ -35,50 +220,156 @@ def invoke_task(
     else:
         llama_grammar = None
 
-    logger.info(f"Initializing model in subprocess {os.getpid()}")
-    llama = Llama(model_path=model_path)
-    for next_chunk in llama.create_completion(
-        prompt,
-        max_tokens=2048,
-        temperature=temperature,
-        stream=True,
-        grammar=llama_grammar,
+    llama = resident_llama()
+    draft = task_draft(llama, grammar, params)
+    generated = ""
+    for n, text in enumerate(
+        generate_task(
+            llama,
+            prompt,
+            temperature,
+            llama_grammar,
+            params,
+            draft,
+            signals.cancelled,
+            stops_on_grammar_accept(grammar, params),
+        ),
+        start=1,
     ):
-        # TODO(aduffy): Enable non-greedy decoding strategies
-        chunk: CompletionChunk = typing.cast(CompletionChunk, next_chunk)
-        channel.put(chunk["choices"][0]["text"])
+        channel.put(text)
+        generated += text
+        if grammar is None and signals.preempted.is_set() and n < params.max_tokens:
+            report_speculation(signals, draft)
+            channel.put(CHANNEL_SENTINEL)
+            return (
+                prompt + generated,
+                temperature,
+                None,
+                params.model_copy(update={"max_tokens": params.max_tokens - n}),
+            )
+    report_speculation(signals, draft)
     channel.put(CHANNEL_SENTINEL)
+    return None
+
+
+def invoke_task_batch(
+    prompts: list[tuple[int, str]],
+    temperature: float,
+    grammar: str | None,
+    params: TaskGenerationParams,
+    signals: JobSignals,
+    channel: queue.Queue[str | None],
+) -> tuple[list[tuple[int, str]], float, str | None, TaskGenerationParams] | None:
+    """
+    Execute completion for a batch of prompts back to back on the resident model, sending one
+    TaskBatchInvocationItem as JSON over the channel as each completes.
+
+    Prompts rendered from the same template share a prefix, which llama.cpp keeps in its KV cache
+    between completions, so only the part of each prompt after the template prefix gets evaluated.
+
+    When preempted, the batch stops after the current item and the arguments to run the remaining
+    prompts are returned.
+    """
+    # NOTE: This may fail with ValueError if the grammar is invalid
+    if grammar is not None:
+        llama_grammar = LlamaGrammar.from_string(grammar)
+    else:
+        llama_grammar = None
+
+    llama = resident_llama()
+    draft = task_draft(llama, grammar, params)
+    stop_on_accept = stops_on_grammar_accept(grammar, params)
+    for position, (index, prompt) in enumerate(prompts):
+        if signals.cancelled.is_set():
+            break
+        if signals.preempted.is_set():
+            report_speculation(signals, draft)
+            channel.put(CHANNEL_SENTINEL)
+            return prompts[position:], temperature, grammar, params
+        starttime = time.time()
+        try:
+            result = "".join(
+                generate_task(
+                    llama,
+                    prompt,
+                    temperature,
+                    llama_grammar,
+                    params,
+                    draft,
+                    signals.cancelled,
+                    stop_on_accept,
+                )
+            )
+            item = TaskBatchInvocationItem(
+                index=index, elapsed_seconds=time.time() - starttime, result=result
+            )
+        except Exception as e:
+            logger.error(f"Batch item {index} failed", exc_info=e)
+            item = TaskBatchInvocationItem(
+                index=index, elapsed_seconds=time.time() - starttime, error=str(e)
+            )
+        channel.put(item.model_dump_json())
+    report_speculation(signals, draft)
+    channel.put(CHANNEL_SENTINEL)
+    return None
+
+
+def invocation_key(invocation_params: RenderedTaskInvocation) -> ModelKey:
+    return ModelKey.for_model(
+        invocation_params.model_path,
+        draft=invocation_params.draft,
+        runtime=invocation_params.runtime,
+    )
 
 
 async def run_task_async(
+    runtime: InferenceRuntime,
     invocation_params: RenderedTaskInvocation,
+    speculation: SpeculationStats | None = None,
+    timeline: PhaseTimeline | None = None,
 ) -> AsyncGenerator[str, str]:
     logger.info("ENTER run_task_async")
-    loop = asyncio.get_running_loop()
-
-    with ProcessPoolExecutor() as pool:
-        with M.Manager() as manager:
-            chan: queue.Queue[str | None] = manager.Queue()
-            res = loop.run_in_executor(
-                pool,
-                invoke_task,
-                invocation_params.model_path,
-                invocation_params.rendered_prompt,
-                invocation_params.temperature,
-                invocation_params.grammar,
-                chan,
-            )
-            while True:
-                try:
-                    item = chan.get_nowait()
-                    if item == CHANNEL_SENTINEL:
-                        break
-                    yield str(item)
-                except queue.Empty:
-                    # NOTE(aduffy): This is important as this is how we signal in Python to
-                    #  yield to other coroutines, else nothing else in the event loop is able
-                    #  to run while we're polling the queue.
-                    await asyncio.sleep(0)
-                    continue
-            await res
-            return
+    async for item in runtime.stream(
+        invocation_key(invocation_params),
+        invocation_params.memory_estimate,
+        invoke_task,
+        invocation_params.rendered_prompt,
+        invocation_params.temperature,
+        invocation_params.grammar,
+        invocation_params.generation_params,
+        priority=invocation_params.priority,
+        speculation=speculation,
+        timeline=timeline,
+    ):
+        yield item
+
+
+async def run_task_batch_async(
+    runtime: InferenceRuntime,
+    invocation_params: RenderedTaskInvocation,
+    prompts: list[tuple[int, str]],
+    priority: InferencePriority = InferencePriority.batch,
+    speculation: SpeculationStats | None = None,
+) -> AsyncGenerator[TaskBatchInvocationItem, str]:
+    """
+    Run a batch of prompts for the same Task, yielding the result for each prompt as it completes.
+
+    :param invocation_params: The invocation shared by every prompt, its `rendered_prompt` is ignored
+    :param prompts: Pairs of the index of the item in the batch request and its rendered prompt
+    :param priority: Scheduling priority of the batch, see `InferenceRuntime.stream`
+    :param speculation: Receives the acceptance of speculative decoding over the whole batch
+    """
+    async for item in runtime.stream(
+        invocation_key(invocation_params),
+        invocation_params.memory_estimate,
+        invoke_task_batch,
+        prompts,
+        invocation_params.temperature,
+        invocation_params.grammar,
+        invocation_params.generation_params,
+        # The deadline applies to each item rather than to the batch as a whole
+        timeout_seconds=runtime.request_timeout_seconds * max(len(prompts), 1),
+        priority=priority,
+        speculation=speculation,
+    ):
+        yield TaskBatchInvocationItem.model_validate_json(item)
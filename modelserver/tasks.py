@@ -1,40 +1,98 @@
 import logging
+import pathlib
+import re
+import shutil
+import tempfile
 import threading
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
-from typing import final
+from typing import Callable, final
 
-from huggingface_hub import get_hf_file_metadata, hf_hub_download, hf_hub_url
+from fastapi import HTTPException, status
+from huggingface_hub import (
+    get_hf_file_metadata,
+    hf_hub_download,
+    hf_hub_url,
+    try_to_load_from_cache,
+)
 
+from modelserver.blobstore import BlobStore
+from modelserver.bulk import BulkInferenceJob
 from modelserver.db._core import DataManager
 from modelserver.db.tasks import TaskStore
+from modelserver.memory import estimate_model_memory
+from modelserver.quantize import (
+    estimate_quantized_bytes,
+    load_seconds,
+    merge_lora,
+    quantize_model,
+)
+from modelserver.runtime import InferenceRuntime
 from modelserver.types.api import (
+    BlobOut,
     CompletionModelParams,
     DiskImportSource,
     HFImportSource,
     ImportMetadata,
+    MergedLoraImportSource,
     ModelRuntime,
     ModelType,
     RegisterModelRequest,
     SemVer,
 )
+from modelserver.types.locator import HFLocator
 from modelserver.types.tasks import (
+    BulkInferenceTask,
     DownloadDiskModelTask,
     DownloadHFModelTask,
     FailedTaskState,
     FinishedTaskState,
+    InProgressState,
+    MergeLoraTask,
     TaskId,
     TaskState,
 )
 
+# HF Hub reports the sha256 of LFS-tracked files as their ETag
+SHA256_ETAG = re.compile(r"^[0-9a-f]{64}$")
+
+# How often the progress of a quantization or a LoRA merge is reported
+PROGRESS_SECONDS = 2.0
+
+
+def drop_hf_cache_copy(locator: HFLocator) -> None:
+    """
+    Remove the file from the HF Hub cache, where downloads were kept before they went straight to the
+    blob store, so that an imported model is not held twice.
+    """
+    cached = try_to_load_from_cache(
+        locator.repo, locator.file, revision=locator.revision
+    )
+    if not isinstance(cached, str):
+        return
+    # The cache links each file of a snapshot to the blob holding its contents
+    snapshot_path = pathlib.Path(cached)
+    cache_blob = snapshot_path.resolve()
+    snapshot_path.unlink(missing_ok=True)
+    cache_blob.unlink(missing_ok=True)
+
 
 @final
 class Tasks:
     logger = logging.getLogger(__name__)
 
-    def __init__(self, taskdb: TaskStore, db: DataManager) -> None:
+    def __init__(
+        self,
+        taskdb: TaskStore,
+        db: DataManager,
+        blobs: BlobStore,
+        runtime: InferenceRuntime,
+    ) -> None:
         self.taskdb = taskdb
         self.db = db
+        self.blobs = blobs
+        self.runtime = runtime
 
     def handle_download_disk_model(
         self, task_id: TaskId, task: DownloadDiskModelTask
@@ -42,57 +100,89 @@ class Tasks:
         """
         "Download" disk model, i.e. import it into our DB.
         """
-        [model_id, version] = self.db.register_model(
-            RegisterModelRequest(
-                model=task.model_name,
-                version=SemVer(task.model_version),
-                model_type=ModelType.completion,
-                runtime=ModelRuntime.ggml,
-                internal_params=CompletionModelParams(
-                    model_path=task.locator.path,
-                ),
-                import_metadata=ImportMetadata(
-                    imported_at=datetime.utcnow(),
-                    source=DiskImportSource(source=task.locator),
-                ),
+        try:
+            quantized_version = self.quantized_version(task)
+            blob = self.blobs.import_file(pathlib.Path(task.locator.path))
+            import_metadata = ImportMetadata(
+                imported_at=datetime.utcnow(),
+                source=DiskImportSource(source=task.locator),
             )
-        )
-        self.taskdb.update_task(
-            task_id,
-            TaskState.model_construct(
-                FinishedTaskState(
-                    info=task.model_name,
-                    metadata=dict(
-                        model_name=task.model_name,
-                        model_id=model_id,
-                        version=str(version),
+            [model_id, version] = self.db.register_model(
+                RegisterModelRequest(
+                    model=task.model_name,
+                    version=SemVer(task.model_version),
+                    model_type=ModelType.completion,
+                    runtime=ModelRuntime.ggml,
+                    internal_params=CompletionModelParams(
+                        model_path=blob.path,
+                        memory_estimate=estimate_model_memory(blob.path),
+                        blob_digest=blob.digest,
                     ),
+                    import_metadata=import_metadata,
                 )
-            ),
-        )
+            )
+            quantized = self.quantize_import(
+                task_id, task, quantized_version, blob, import_metadata
+            )
+            self.taskdb.update_task(
+                task_id,
+                TaskState.model_construct(
+                    FinishedTaskState(
+                        info=task.model_name,
+                        metadata=dict(
+                            model_name=task.model_name,
+                            model_id=model_id,
+                            version=str(version),
+                        )
+                        | quantized,
+                    )
+                ),
+            )
+        except Exception as e:
+            self.logger.error("Failed importing model from disk", exc_info=e)
+            self.taskdb.update_task(task_id, TaskState(FailedTaskState(error=str(e))))
 
     def handle_download_hf_model(
         self, task_id: TaskId, task: DownloadHFModelTask
     ) -> None:
         try:
+            quantized_version = self.quantized_version(task)
             locator = task.locator
             hfurl = hf_hub_url(
                 locator.repo,
                 locator.file,
                 revision=locator.revision,
             )
+            meta = get_hf_file_metadata(hfurl)
             if locator.revision is None:
-                meta = get_hf_file_metadata(hfurl)
                 locator = locator.model_copy(update=dict(revision=meta.commit_hash))
                 self.logger.info(
                     "Assigning commit hash for model pull: %s", meta.commit_hash
                 )
-            localized = hf_hub_download(
-                task.locator.repo,
-                task.locator.file,
-                revision=locator.revision,
-                resume_download=True,
-            )
+
+            # Skip the download entirely if we already hold a file with the same contents.
+            blob = None
+            if meta.etag is not None and SHA256_ETAG.match(meta.etag):
+                blob = self.blobs.lookup(meta.etag)
+            if blob is None:
+                # Download next to the blob store, so the file can be moved into it. The directory is
+                # kept per task, so a download interrupted by a restart resumes where it stopped.
+                workdir = self.blobs.root / "downloads" / str(task_id)
+                try:
+                    localized = hf_hub_download(
+                        task.locator.repo,
+                        task.locator.file,
+                        revision=locator.revision,
+                        local_dir=workdir,
+                        local_dir_use_symlinks=False,
+                        resume_download=True,
+                    )
+                    blob = self.blobs.import_file(pathlib.Path(localized), move=True)
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+            else:
+                self.logger.info("Reusing blob %s for %s", blob.digest, locator)
+            drop_hf_cache_copy(locator)
             ## TODO(aduffy): Bring back validation for GGUF
             # Validate the model to ensure that we're actually running it.
             # from .ggml import GGMLFile, check_compatible_with_latest_llamacpp
@@ -114,21 +204,27 @@ class Tasks:
 
             # modelname = f"{os.path.basename(locator.repo)}__{locator.file}"
 
+            import_metadata = ImportMetadata(
+                imported_at=datetime.utcnow(),
+                source=HFImportSource(source=locator),
+            )
             [model_id, version] = self.db.register_model(
                 RegisterModelRequest(
                     model=task.model_name,
                     version=SemVer(task.model_version),
                     model_type=ModelType.completion,
                     runtime=ModelRuntime.ggml,
-                    import_metadata=ImportMetadata(
-                        imported_at=datetime.utcnow(),
-                        source=HFImportSource(source=locator),
-                    ),
+                    import_metadata=import_metadata,
                     internal_params=CompletionModelParams(
-                        model_path=localized,
+                        model_path=blob.path,
+                        memory_estimate=estimate_model_memory(blob.path),
+                        blob_digest=blob.digest,
                     ),
                 )
             )
+            quantized = self.quantize_import(
+                task_id, task, quantized_version, blob, import_metadata
+            )
             self.taskdb.update_task(
                 task_id,
                 TaskState(
@@ -138,7 +234,8 @@ class Tasks:
                             model_name=task.model_name,
                             model_id=model_id,
                             version=task.model_version,
-                        ),
+                        )
+                        | quantized,
                     )
                 ),
             )
@@ -146,6 +243,271 @@ class Tasks:
             self.logger.error("Failed syncing model from HF Hub", exc_info=e)
             self.taskdb.update_task(task_id, TaskState(FailedTaskState(error=str(e))))
 
+    def quantized_version(
+        self, task: DownloadHFModelTask | DownloadDiskModelTask
+    ) -> SemVer | None:
+        """
+        The version the quantized copy of an import is registered as, checked before anything gets
+        imported so that a taken version fails the import rather than only its quantized copy.
+
+        :return: None if the import asks for no quantized copy
+        :raises ValueError: If the model already has a version by that name
+        """
+        if task.quantization is None:
+            return None
+        model_version = SemVer(task.model_version)
+        version = (
+            SemVer(task.quantized_version)
+            if task.quantized_version is not None
+            else SemVer(f"{model_version.major}.{model_version.minor + 1}.0")
+        )
+        try:
+            self.db.get_model_version_internal(
+                model_name=task.model_name, version=str(version)
+            )
+        except HTTPException as e:
+            if e.status_code != status.HTTP_404_NOT_FOUND:
+                raise
+            return version
+        raise ValueError(
+            f"Version {version} of {task.model_name} already exists, "
+            "choose another quantized_version"
+        )
+
+    def wait_reporting(
+        self,
+        task_id: TaskId,
+        job: "Future[None]",
+        output_path: pathlib.Path,
+        expected_bytes: int,
+        start: float = 0.0,
+        end: float = 0.99,
+    ) -> None:
+        """
+        Wait for a job that writes `output_path` in a subprocess, reporting the task's progress from the
+        size of the output against its expected final size.
+
+        :param start: Progress of the task when the job starts
+        :param end: Progress of the task when the job is done
+        """
+        while True:
+            try:
+                job.result(timeout=PROGRESS_SECONDS)
+                return
+            except TimeoutError:
+                written = output_path.stat().st_size if output_path.exists() else 0
+                done = min(written / max(expected_bytes, 1), 1.0)
+                self.taskdb.update_task(
+                    task_id,
+                    TaskState(
+                        InProgressState(
+                            progress=min(start + (end - start) * done, 0.99)
+                        )
+                    ),
+                )
+
+    def quantize_import(
+        self,
+        task_id: TaskId,
+        task: DownloadHFModelTask | DownloadDiskModelTask,
+        version: SemVer | None,
+        blob: BlobOut,
+        import_metadata: ImportMetadata,
+    ) -> dict[str, str]:
+        """
+        Register a quantized copy of an imported model as another version, if the import asks for one.
+
+        Quantization runs in a subprocess. llama.cpp writes the quantized tensors one after another,
+        so progress is reported from the size of the output against its estimated final size.
+
+        The imported model is registered by then, so a failure to quantize it does not fail the import
+        and is reported in the task's metadata instead.
+
+        :param version: The version to register the copy as, see `quantized_version`
+        :return: Details of the quantized copy, or of its failure, to record in the task's metadata
+        """
+        if task.quantization is None or version is None:
+            return {}
+        try:
+            return self._quantize_import(task_id, task, version, blob, import_metadata)
+        except Exception as e:
+            self.logger.error("Failed quantizing imported model", exc_info=e)
+            return dict(quantization_error=str(e))
+
+    def _quantize_import(
+        self,
+        task_id: TaskId,
+        task: DownloadHFModelTask | DownloadDiskModelTask,
+        version: SemVer,
+        blob: BlobOut,
+        import_metadata: ImportMetadata,
+    ) -> dict[str, str]:
+        assert task.quantization is not None
+        source_path = pathlib.Path(blob.path)
+        expected_bytes = estimate_quantized_bytes(source_path, task.quantization)
+
+        # Work next to the blob store, so the result can be moved into it
+        with tempfile.TemporaryDirectory(dir=self.blobs.root) as workdir:
+            quantized_path = pathlib.Path(workdir) / "quantized.gguf"
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                self.wait_reporting(
+                    task_id,
+                    pool.submit(
+                        quantize_model, source_path, quantized_path, task.quantization
+                    ),
+                    quantized_path,
+                    expected_bytes,
+                )
+            quantized = self.blobs.import_file(quantized_path, move=True)
+
+        [_, registered] = self.db.register_model(
+            RegisterModelRequest(
+                model=task.model_name,
+                version=version,
+                model_type=ModelType.completion,
+                runtime=ModelRuntime.ggml,
+                import_metadata=import_metadata.model_copy(
+                    update={"quantization": task.quantization}
+                ),
+                internal_params=CompletionModelParams(
+                    model_path=quantized.path,
+                    memory_estimate=estimate_model_memory(quantized.path),
+                    blob_digest=quantized.digest,
+                ),
+            )
+        )
+        return dict(
+            quantized_version=str(registered),
+            size_bytes=str(blob.size_bytes),
+            quantized_size_bytes=str(quantized.size_bytes),
+        )
+
+    def handle_bulk_inference(self, task_id: TaskId, task: BulkInferenceTask) -> None:
+        try:
+            rows = BulkInferenceJob(
+                task,
+                self.db,
+                self.runtime,
+                lambda state: self.taskdb.update_task(task_id, TaskState(state)),
+            ).run()
+            self.taskdb.update_task(
+                task_id,
+                TaskState(
+                    FinishedTaskState(
+                        info=f"Wrote results for {rows} rows to {task.output_path}",
+                        metadata=dict(rows=str(rows), output_path=task.output_path),
+                    )
+                ),
+            )
+        except Exception as e:
+            self.logger.error("Failed running bulk inference", exc_info=e)
+            self.taskdb.update_task(task_id, TaskState(FailedTaskState(error=str(e))))
+
+    def handle_merge_lora(self, task_id: TaskId, task: MergeLoraTask) -> None:
+        """
+        Merge a LoRA adapter into its base model, quantize the result and register it as a new version.
+
+        Model sizes and load times of the base model with the adapter applied at load and of the merged
+        model are recorded in the task's metadata.
+        """
+
+        def report(progress: float) -> None:
+            self.taskdb.update_task(
+                task_id, TaskState(InProgressState(progress=progress))
+            )
+
+        try:
+            lora = self.db.get_lora(task.lora_id)
+            base = self.db.get_model_version_internal(
+                model_name=task.base_model, version=str(task.base_model_version)
+            )
+            base_path = base.internal_params.model_path
+
+            # Work next to the blob store, so the result can be moved into it
+            with tempfile.TemporaryDirectory(dir=self.blobs.root) as workdir:
+                merged_path = pathlib.Path(workdir) / "merged.gguf"
+                quantized_path = pathlib.Path(workdir) / "quantized.gguf"
+                # Merging and quantizing are CPU bound passes over the whole model, so they run in a
+                # subprocess, leaving this thread to report their progress.
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    self.wait_reporting(
+                        task_id,
+                        pool.submit(
+                            merge_lora,
+                            pathlib.Path(base_path),
+                            pathlib.Path(lora.file_path),
+                            merged_path,
+                            task.scale,
+                        ),
+                        merged_path,
+                        pathlib.Path(base_path).stat().st_size,
+                        end=0.4,
+                    )
+                    self.wait_reporting(
+                        task_id,
+                        pool.submit(
+                            quantize_model,
+                            merged_path,
+                            quantized_path,
+                            task.quantization,
+                        ),
+                        quantized_path,
+                        estimate_quantized_bytes(merged_path, task.quantization),
+                        start=0.4,
+                        end=0.8,
+                    )
+                report(0.8)
+                blob = self.blobs.import_file(quantized_path, move=True)
+
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                lora_load_seconds = pool.submit(
+                    load_seconds, base_path, lora.file_path
+                ).result()
+                merged_load_seconds = pool.submit(load_seconds, blob.path).result()
+
+            [model_id, version] = self.db.register_model(
+                RegisterModelRequest(
+                    model=task.model_name,
+                    version=task.model_version,
+                    model_type=ModelType.completion,
+                    runtime=ModelRuntime.ggml,
+                    internal_params=CompletionModelParams(
+                        model_path=blob.path,
+                        memory_estimate=estimate_model_memory(blob.path),
+                        blob_digest=blob.digest,
+                    ),
+                    import_metadata=ImportMetadata(
+                        imported_at=datetime.utcnow(),
+                        source=MergedLoraImportSource(
+                            lora_id=task.lora_id,
+                            base_model=task.base_model,
+                            base_model_version=task.base_model_version,
+                            quantization=task.quantization,
+                        ),
+                    ),
+                )
+            )
+            self.taskdb.update_task(
+                task_id,
+                TaskState(
+                    FinishedTaskState(
+                        info=f"Registered {task.model_name}@{task.model_version}",
+                        metadata=dict(
+                            model_name=task.model_name,
+                            model_id=model_id,
+                            version=str(version),
+                            base_size_bytes=str(pathlib.Path(base_path).stat().st_size),
+                            merged_size_bytes=str(blob.size_bytes),
+                            lora_load_seconds=f"{lora_load_seconds:.3f}",
+                            merged_load_seconds=f"{merged_load_seconds:.3f}",
+                        ),
+                    )
+                ),
+            )
+        except Exception as e:
+            self.logger.error("Failed merging LoRA", exc_info=e)
+            self.taskdb.update_task(task_id, TaskState(FailedTaskState(error=str(e))))
+
 
 class TaskWorker(threading.Thread):
     """
@@ -154,10 +516,19 @@ class TaskWorker(threading.Thread):
 
     logger = logging.getLogger(__name__)
 
-    def __init__(self, taskdb: TaskStore, db: DataManager) -> None:
+    def __init__(
+        self,
+        taskdb: TaskStore,
+        db: DataManager,
+        blobs: BlobStore,
+        runtime: InferenceRuntime,
+    ) -> None:
         super().__init__(name="task-worker", daemon=True)
         self.taskdb = taskdb
-        self.tasks = Tasks(taskdb, db)
+        self.tasks = Tasks(taskdb, db, blobs, runtime)
+        # Bulk inference runs for hours and LoRA merges for minutes, so each of those jobs gets its own
+        # thread instead of blocking imports.
+        self.running: set[TaskId] = set()
 
     def run(self) -> None:
         self.logger.info("Started background thread")
@@ -172,5 +543,35 @@ class TaskWorker(threading.Thread):
                         self.tasks.handle_download_disk_model(task_id, disk_task)
                     case DownloadHFModelTask() as hf_task:
                         self.tasks.handle_download_hf_model(task_id, hf_task)
+                    case MergeLoraTask() as merge_task:
+                        self.spawn(
+                            task_id,
+                            f"merge-lora-{task_id}",
+                            lambda: self.tasks.handle_merge_lora(task_id, merge_task),
+                        )
+                    case BulkInferenceTask() as bulk_task:
+                        self.spawn(
+                            task_id,
+                            f"bulk-inference-{task_id}",
+                            lambda: self.tasks.handle_bulk_inference(
+                                task_id, bulk_task
+                            ),
+                        )
                     case _:
                         self.logger.error(f"Unhandled task spec {task}")
+
+    def spawn(self, task_id: TaskId, name: str, handle: Callable[[], None]) -> None:
+        """
+        Run the job on a thread of its own, unless it is already running.
+        """
+        if task_id in self.running:
+            return
+        self.running.add(task_id)
+
+        def run() -> None:
+            try:
+                handle()
+            finally:
+                self.running.discard(task_id)
+
+        threading.Thread(target=run, name=name, daemon=True).start()
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from modelserver import model_worker
+from modelserver.backends import FAKE_WORDS, FakeBackend
+from modelserver.runtime import InferenceRuntime
+from modelserver.types.api import CompletionInferenceRequest, CompletionModelParams
+
+
+def test_fake_backend_streams_at_rate() -> None:
+    runtime = InferenceRuntime(
+        memory_budget_bytes=100,
+        backend=FakeBackend(tokens_per_second=100, prompt_tokens_per_second=1000),
+    )
+    request = CompletionInferenceRequest(prompt="x" * 100, tokens=20)
+    params = CompletionModelParams(model_path="missing.gguf")
+
+    async def complete() -> tuple[list[str], float, float]:
+        starttime = time.monotonic()
+        first_token_at = 0.0
+        tokens: list[str] = []
+        async for token in model_worker.run_completion_async(
+            runtime, request, params, None
+        ):
+            if not tokens:
+                first_token_at = time.monotonic()
+            tokens.append(token)
+        return tokens, first_token_at - starttime, time.monotonic() - first_token_at
+
+    try:
+        # The first completion includes starting the resident process
+        asyncio.run(complete())
+        tokens, ttft, generating = asyncio.run(complete())
+    finally:
+        runtime.shutdown()
+
+    assert tokens == [f" {FAKE_WORDS[i % len(FAKE_WORDS)]}" for i in range(20)]
+    # 100 prompt tokens at 1000/s, then 19 more tokens at 100/s
+    assert 0.09 <= ttft < 0.5
+    assert 0.18 <= generating < 0.6
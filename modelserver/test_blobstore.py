@@ -0,0 +1,157 @@
+import pathlib
+from datetime import datetime, timedelta
+from typing import Generator
+
+import pytest
+from sqlalchemy import create_engine
+
+from modelserver import blobstore
+from modelserver.blobstore import BlobStore, sha256_file
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.types.api import (
+    CompletionModelParams,
+    DiskImportSource,
+    DraftModelParams,
+    ImportMetadata,
+    ModelRuntime,
+    ModelType,
+    RegisterModelRequest,
+    SemVer,
+)
+from modelserver.types.locator import DiskLocator
+
+
+@pytest.fixture
+def db() -> Generator[PersistentDataManager, None, None]:
+    engine = create_engine("sqlite+pysqlite:///:memory:")
+    yield PersistentDataManager(engine)
+    engine.dispose()
+
+
+def register(db: PersistentDataManager, version: str, path: str, digest: str) -> None:
+    db.register_model(
+        RegisterModelRequest(
+            model="model",
+            version=SemVer(version),
+            model_type=ModelType.completion,
+            runtime=ModelRuntime.ggml,
+            internal_params=CompletionModelParams(model_path=path, blob_digest=digest),
+            import_metadata=ImportMetadata(
+                imported_at=datetime.utcnow(),
+                source=DiskImportSource(source=DiskLocator(path=path)),
+            ),
+        )
+    )
+
+
+def test_dedup_and_gc(
+    tmp_path: pathlib.Path,
+    db: PersistentDataManager,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    store = BlobStore(tmp_path / "blobs", db)
+    contents = b"GGUF" + bytes(range(256)) * 1000
+
+    source_a = tmp_path / "a.gguf"
+    source_a.write_bytes(contents)
+    source_b = tmp_path / "b.gguf"
+    source_b.write_bytes(contents)
+
+    blob_a = store.import_file(source_a)
+    assert blob_a.digest == sha256_file(source_a)
+    assert pathlib.Path(blob_a.path).read_bytes() == contents
+    # The store holds a copy, which writes to the source cannot reach.
+    assert pathlib.Path(blob_a.path).stat().st_ino != source_a.stat().st_ino
+
+    # Same contents under another name land in the same blob.
+    blob_b = store.import_file(source_b)
+    assert blob_b.digest == blob_a.digest
+    assert len(db.get_blobs()) == 1
+
+    # Re-importing an unchanged file is matched without rehashing it.
+    monkeypatch.setattr(blobstore, "sha256_file", None)
+    assert store.import_file(source_a).digest == blob_a.digest
+
+    register(db, "0.1.0", blob_a.path, blob_a.digest)
+    register(db, "0.2.0", blob_a.path, blob_a.digest)
+    assert [blob.refcount for blob in db.get_blobs()] == [2]
+
+    # Blobs are reclaimed only once unreferenced, and only after the grace period.
+    monkeypatch.setattr(blobstore, "GC_GRACE_PERIOD", timedelta(0))
+    db.delete_model_version("model", "0.1.0")
+    assert store.gc() == []
+    db.delete_model_version("model", "0.2.0")
+    assert store.gc() == [blob_a.digest]
+    assert not pathlib.Path(blob_a.path).exists()
+    assert db.get_blobs() == []
+    assert source_a.read_bytes() == contents
+
+
+def test_draft_holds_blob(
+    tmp_path: pathlib.Path,
+    db: PersistentDataManager,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    store = BlobStore(tmp_path / "blobs", db)
+    source_draft = tmp_path / "draft.gguf"
+    source_draft.write_bytes(b"GGUF draft")
+    source_model = tmp_path / "model.gguf"
+    source_model.write_bytes(b"GGUF model")
+    draft = store.import_file(source_draft)
+    model = store.import_file(source_model)
+    register(db, "0.1.0", draft.path, draft.digest)
+    register(db, "0.2.0", model.path, model.digest)
+    [registered] = db.get_registered_models()
+    db.set_model_version_draft(
+        "model",
+        "0.2.0",
+        DraftModelParams(
+            model_id=str(registered.id),
+            model_version=SemVer("0.1.0"),
+            model_path=draft.path,
+            blob_digest=draft.digest,
+        ),
+    )
+
+    # The pairing keeps the draft's file after its own version is gone.
+    monkeypatch.setattr(blobstore, "GC_GRACE_PERIOD", timedelta(0))
+    db.delete_model_version("model", "0.1.0")
+    assert {blob.digest: blob.refcount for blob in db.get_blobs()} == {
+        draft.digest: 1,
+        model.digest: 1,
+    }
+    assert store.gc() == []
+    assert pathlib.Path(draft.path).exists()
+
+    # As do pairings made before drafts recorded their digest.
+    db.set_model_version_draft(
+        "model",
+        "0.2.0",
+        DraftModelParams(
+            model_id=str(registered.id),
+            model_version=SemVer("0.1.0"),
+            model_path=draft.path,
+        ),
+    )
+    assert store.gc() == []
+
+    db.set_model_version_draft("model", "0.2.0", None)
+    assert store.gc() == [draft.digest]
+
+
+def test_move_owned_files(tmp_path: pathlib.Path, db: PersistentDataManager) -> None:
+    store = BlobStore(tmp_path / "blobs", db)
+    contents = b"GGUF" + bytes(range(256)) * 1000
+
+    owned = tmp_path / "blobs" / "downloads" / "model.gguf"
+    owned.parent.mkdir(parents=True)
+    owned.write_bytes(contents)
+    inode = owned.stat().st_ino
+    blob = store.import_file(owned, move=True)
+    assert not owned.exists()
+    assert pathlib.Path(blob.path).stat().st_ino == inode
+
+    # A file the store already holds is dropped rather than kept twice.
+    owned.write_bytes(contents)
+    assert store.import_file(owned, move=True).digest == blob.digest
+    assert not owned.exists()
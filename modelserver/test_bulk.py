@@ -0,0 +1,143 @@
+import json
+import pathlib
+import typing
+from typing import Any, AsyncGenerator, Iterator
+
+import pytest
+from sqlalchemy import create_engine
+
+from modelserver import runtime, task_worker
+from modelserver.bulk import BulkInferenceJob, Checkpoint, write_checkpoint
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.db.test_db import REGISTER_V1
+from modelserver.runtime import InferenceRuntime, InferenceTimeout
+from modelserver.types.api import CreateTaskRequest, TaskBatchInvocationItem
+from modelserver.types.tasks import BulkInferenceTask, InProgressState
+
+
+class EchoLlama:
+    def create_completion(self, prompt: str, **kwargs: Any) -> Iterator[Any]:
+        yield {"choices": [{"text": prompt.upper()}]}
+
+
+def test_bulk_inference_resumes(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Resident processes are forked, so they inherit the fake model
+    monkeypatch.setattr(runtime, "_load_model", lambda key, with_readahead, cores: None)
+    monkeypatch.setattr(task_worker, "resident_llama", lambda: EchoLlama())
+
+    db = PersistentDataManager(create_engine("sqlite+pysqlite:///:memory:"))
+    model_id, version = db.register_model(REGISTER_V1)
+    db.create_task(CreateTaskRequest(name="shout"))
+    db.update_task_prompt_template("shout", "say {word}")
+    db.update_task_input_schema("shout", {"word": "string"})
+    db.set_task_backing_model("shout", str(model_id), str(version))
+
+    input_path = tmp_path / "words.jsonl"
+    lines = [
+        json.dumps({"word": word, "unused": 1}) for word in ["a", "b", "c", "d", "e"]
+    ]
+    lines[3] = json.dumps({"other": "d"})
+    input_path.write_text("\n".join(lines) + "\n")
+    output_path = tmp_path / "out" / "results.jsonl"
+
+    task = BulkInferenceTask(
+        task_name="shout",
+        input_path=str(input_path),
+        output_path=str(output_path),
+        chunk_size=2,
+    )
+    inference = InferenceRuntime(memory_budget_bytes=1)
+    states: list[InProgressState] = []
+    try:
+        assert BulkInferenceJob(task, db, inference, states.append).run() == 5
+        expected = output_path.read_text()
+        items = [
+            TaskBatchInvocationItem.model_validate_json(line)
+            for line in expected.splitlines()
+        ]
+        assert [item.result for item in items] == [
+            "SAY A",
+            "SAY B",
+            "SAY C",
+            None,
+            "SAY E",
+        ]
+        assert items[3].error is not None
+        assert [state.items_done for state in states] == [2, 4, 5]
+        assert states[-1].progress == 1.0
+
+        # Crash after the first chunk, with a partially written second chunk
+        first_chunk = "".join(expected.splitlines(keepends=True)[:2])
+        output_path.write_text(first_chunk + '{"index": 2, "elapsed')
+        write_checkpoint(
+            output_path,
+            Checkpoint(
+                rows_done=2,
+                input_offset=len(lines[0]) + len(lines[1]) + 2,
+                output_size=len(first_chunk),
+            ),
+        )
+        states.clear()
+        assert BulkInferenceJob(task, db, inference, states.append).run() == 5
+        resumed = [
+            TaskBatchInvocationItem.model_validate_json(line)
+            for line in output_path.read_text().splitlines()
+        ]
+        assert [(item.index, item.result) for item in resumed] == [
+            (item.index, item.result) for item in items
+        ]
+        assert [state.items_done for state in states] == [4, 5]
+    finally:
+        inference.shutdown()
+
+
+def test_bulk_inference_chunk_failure(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def run_task_batch_async(
+        inference: Any, invocation: Any, prompts: list[tuple[int, str]], **kwargs: Any
+    ) -> AsyncGenerator[TaskBatchInvocationItem, str]:
+        for index, prompt in prompts:
+            if index == 1:
+                raise InferenceTimeout(1)
+            yield TaskBatchInvocationItem(index=index, elapsed_seconds=0, result=prompt)
+
+    monkeypatch.setattr(task_worker, "run_task_batch_async", run_task_batch_async)
+
+    db = PersistentDataManager(create_engine("sqlite+pysqlite:///:memory:"))
+    model_id, version = db.register_model(REGISTER_V1)
+    db.create_task(CreateTaskRequest(name="shout"))
+    db.update_task_prompt_template("shout", "say {word}")
+    db.update_task_input_schema("shout", {"word": "string"})
+    db.set_task_backing_model("shout", str(model_id), str(version))
+
+    input_path = tmp_path / "words.jsonl"
+    input_path.write_text(
+        "".join(json.dumps({"word": word}) + "\n" for word in "abcdef")
+    )
+    output_path = tmp_path / "results.jsonl"
+    task = BulkInferenceTask(
+        task_name="shout",
+        input_path=str(input_path),
+        output_path=str(output_path),
+        chunk_size=3,
+    )
+    inference = typing.cast(InferenceRuntime, None)
+    assert BulkInferenceJob(task, db, inference, lambda state: None).run() == 6
+    items = [
+        TaskBatchInvocationItem.model_validate_json(line)
+        for line in output_path.read_text().splitlines()
+    ]
+    # The rows of the first chunk after the timeout failed, the rest of the job carried on
+    assert [item.index for item in items] == list(range(6))
+    assert [item.result for item in items] == [
+        "say a",
+        None,
+        None,
+        "say d",
+        "say e",
+        "say f",
+    ]
+    assert items[1].error is not None and items[2].error is not None
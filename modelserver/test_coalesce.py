@@ -0,0 +1,77 @@
+import asyncio
+from typing import AsyncGenerator
+
+from modelserver.coalesce import TaskInvocationCoalescer
+from modelserver.types.api import (
+    DraftModelParams,
+    KVCacheType,
+    LlamaRuntimeParams,
+    SemVer,
+)
+from modelserver.types.workers import RenderedTaskInvocation
+
+
+def invocation(temperature: float = 0.0) -> RenderedTaskInvocation:
+    return RenderedTaskInvocation(
+        model_path="model.gguf",
+        rendered_prompt="Hello",
+        grammar=None,
+        temperature=temperature,
+    )
+
+
+def test_identical_invocations_share_generation() -> None:
+    generations = 0
+
+    async def generate() -> AsyncGenerator[str, str]:
+        nonlocal generations
+        generations += 1
+        for token in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def collect(coalescer: TaskInvocationCoalescer, temperature: float) -> str:
+        return "".join(
+            [
+                token
+                async for token in coalescer.invoke(invocation(temperature), generate)
+            ]
+        )
+
+    async def main() -> None:
+        coalescer = TaskInvocationCoalescer()
+        results = await asyncio.gather(*[collect(coalescer, 0.0) for _ in range(5)])
+        assert results == ["abc"] * 5
+        assert generations == 1
+        assert coalescer.flights == {}
+
+        # Sampled invocations are never coalesced
+        await asyncio.gather(*[collect(coalescer, 0.7) for _ in range(2)])
+        assert generations == 3
+
+    asyncio.run(main())
+
+
+def test_flight_key_covers_model_settings() -> None:
+    base = invocation()
+    assert TaskInvocationCoalescer.flight_key(
+        base
+    ) == TaskInvocationCoalescer.flight_key(invocation())
+    # Versions sharing a model file can still load it differently
+    for other in [
+        base.model_copy(
+            update=dict(runtime=LlamaRuntimeParams(n_ctx=4096, type_k=KVCacheType.q8_0))
+        ),
+        base.model_copy(
+            update=dict(
+                draft=DraftModelParams(
+                    model_id="draft",
+                    model_version=SemVer("0.1.0"),
+                    model_path="draft.gguf",
+                )
+            )
+        ),
+    ]:
+        assert TaskInvocationCoalescer.flight_key(
+            other
+        ) != TaskInvocationCoalescer.flight_key(base)
@@ -0,0 +1,36 @@
+from modelserver.cores import partition_cores
+from modelserver.runtime import InferenceRuntime, ModelKey
+
+
+def test_partition_cores() -> None:
+    cores = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert partition_cores(cores, 0) == []
+    assert partition_cores(cores, 1) == [cores]
+    assert partition_cores(cores, 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    # More partitions than cores share cores
+    assert partition_cores([0, 1], 3) == [[0], [1], [0]]
+
+
+def test_runtime_rebalances_partitions() -> None:
+    runtime = InferenceRuntime(memory_budget_bytes=100)
+    runtime.cores = [0, 1, 2, 3]
+    first, second = ModelKey("first.gguf"), ModelKey("second.gguf")
+    try:
+        assert runtime.admit(first, None).cores == [0, 1, 2, 3]
+        runtime.admit(second, None)
+        assert [r.cores for r in runtime.residents.values()] == [[0, 1], [2, 3]]
+
+        # Cores go back to the remaining models when a model is evicted
+        runtime.evict(first)
+        assert runtime.residents[second].cores == [0, 1, 2, 3]
+        [status] = runtime.status()
+        assert status.cores == [0, 1, 2, 3]
+        assert status.cpu_utilization == 0.0
+    finally:
+        runtime.shutdown()
+
+    unpinned = InferenceRuntime(memory_budget_bytes=100, partition_cores=False)
+    try:
+        assert unpinned.admit(first, None).cores is None
+    finally:
+        unpinned.shutdown()
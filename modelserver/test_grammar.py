@@ -0,0 +1,72 @@
+import pytest
+
+from modelserver.grammar import GrammarError, GrammarMatcher, parse_gbnf
+
+# In the style of the grammars @intrinsicai/gbnfgen generates for Task output
+PERSON_GRAMMAR = r"""
+root ::= Person
+Person ::= "{" ws "\"name\":" ws string "," ws "\"role\":" ws Role ws "}"
+Role ::= "\"engineer\"" | "\"manager\""
+string ::= "\"" ([^"\\] | "\\" (["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F]))* "\""
+ws ::= [ \t\n]*
+"""
+
+
+def test_forced_continuation() -> None:
+    matcher = GrammarMatcher(parse_gbnf(PERSON_GRAMMAR))
+    assert matcher.forced(64) == "{"
+
+    # Whitespace is optional, so the key is only forced once its opening quote is generated
+    assert matcher.advance('{ "')
+    assert matcher.forced(64) == 'name":'
+
+    assert matcher.advance('name": "Ada \\"A\\" Lovelace"')
+    assert matcher.forced(64) == ","
+    assert matcher.advance(', "role": "')
+    # Both enum values are possible until one of them is started
+    assert matcher.forced(64) == ""
+    assert matcher.advance("m")
+    assert matcher.forced(3) == "ana"
+    assert matcher.forced(64) == 'anager"'
+
+
+def test_forced_stops_at_end_of_output() -> None:
+    matcher = GrammarMatcher(parse_gbnf('root ::= "yes" | "yes, " [a-z]+'))
+    # The output may end after "yes", so nothing further is forced
+    assert matcher.forced(64) == "yes"
+    assert matcher.advance("yes")
+    assert matcher.forced(64) == ""
+    assert matcher.advance(",")
+    assert matcher.forced(64) == " "
+
+
+def test_rejects_text_outside_grammar() -> None:
+    matcher = GrammarMatcher(parse_gbnf(PERSON_GRAMMAR))
+    assert not matcher.advance("[")
+
+
+def test_invalid_grammars() -> None:
+    with pytest.raises(GrammarError):
+        parse_gbnf('root ::= "a" missing')
+    with pytest.raises(GrammarError):
+        parse_gbnf('person ::= "a"')
+    with pytest.raises(GrammarError):
+        parse_gbnf('root ::= ("a" | "b"')
+    # Bounded repetitions are newer syntax than the matcher supports
+    with pytest.raises(GrammarError):
+        parse_gbnf('root ::= "a"{2,3}')
+
+
+def test_left_recursion() -> None:
+    with pytest.raises(GrammarError):
+        GrammarMatcher(parse_gbnf('root ::= root "a" | "a"'))
+    # Through a rule that matches nothing, and in a rule only reached part way through the output
+    with pytest.raises(GrammarError):
+        GrammarMatcher(
+            parse_gbnf('root ::= "x" list\nlist ::= ws list "a" | "a"\nws ::= " "*')
+        )
+    # The same empty rule twice in a row is not recursion
+    matcher = GrammarMatcher(parse_gbnf('root ::= ws ws "a"\nws ::= " "?'))
+    assert matcher.forced(8) == ""
+    assert matcher.advance("  ")
+    assert matcher.forced(8) == "a"
@@ -0,0 +1,114 @@
+import pathlib
+import struct
+
+from modelserver.ggml import GGUFFile
+from modelserver.memory import estimate_memory, read_model_shape
+from modelserver.types.api import KVCacheType
+
+N_LAYER = 2
+N_EMBD = 64
+N_HEAD = 4
+N_HEAD_KV = 2
+N_FF = 128
+N_VOCAB = 100
+
+
+def write_gguf(path: pathlib.Path) -> None:
+    """
+    Write the header of a tiny llama-style GGUF v3 file, with all weights stored as F16.
+    """
+
+    def string(s: str) -> bytes:
+        encoded = s.encode("utf-8")
+        return struct.pack("<Q", len(encoded)) + encoded
+
+    def kv_u32(key: str, value: int) -> bytes:
+        return string(key) + struct.pack("<II", 4, value)
+
+    metadata = [
+        string("general.architecture") + struct.pack("<I", 8) + string("llama"),
+        kv_u32("llama.block_count", N_LAYER),
+        kv_u32("llama.embedding_length", N_EMBD),
+        kv_u32("llama.feed_forward_length", N_FF),
+        kv_u32("llama.attention.head_count", N_HEAD),
+        kv_u32("llama.attention.head_count_kv", N_HEAD_KV),
+        kv_u32("llama.context_length", 2048),
+        # Vocab is an array of strings
+        string("tokenizer.ggml.tokens")
+        + struct.pack("<IIQ", 9, 8, N_VOCAB)
+        + b"".join(string(f"tok{i}") for i in range(N_VOCAB)),
+    ]
+    tensors = [("token_embd.weight", [N_EMBD, N_VOCAB])]
+    for layer in range(N_LAYER):
+        tensors.append((f"blk.{layer}.attn_q.weight", [N_EMBD, N_EMBD]))
+        tensors.append((f"blk.{layer}.ffn_up.weight", [N_EMBD, N_FF]))
+
+    with path.open("wb") as f:
+        f.write(b"GGUF")
+        f.write(struct.pack("<IQQ", 3, len(tensors), len(metadata)))
+        for kv in metadata:
+            f.write(kv)
+        for name, dims in tensors:
+            f.write(string(name))
+            f.write(struct.pack("<I", len(dims)))
+            f.write(struct.pack(f"<{len(dims)}Q", *dims))
+            # F16 type, offset is ignored by the reader
+            f.write(struct.pack("<IQ", 1, 0))
+
+
+def test_gguf_shape(tmp_path: pathlib.Path) -> None:
+    model_path = tmp_path / "model.gguf"
+    write_gguf(model_path)
+
+    parsed = GGUFFile(model_path).read_structure()
+    assert parsed.architecture == "llama"
+    assert parsed.metadata["tokenizer.ggml.tokens"] == N_VOCAB
+    assert len(parsed.tensors) == 1 + 2 * N_LAYER
+
+    shape = read_model_shape(model_path)
+    assert shape.n_layer == N_LAYER
+    assert shape.n_head_kv == N_HEAD_KV
+    assert shape.n_vocab == N_VOCAB
+    assert shape.weight_bytes == 2 * (
+        N_EMBD * N_VOCAB + N_LAYER * (N_EMBD * N_EMBD + N_EMBD * N_FF)
+    )
+
+
+def test_estimate_memory(tmp_path: pathlib.Path) -> None:
+    model_path = tmp_path / "model.gguf"
+    write_gguf(model_path)
+    shape = read_model_shape(model_path)
+
+    head_dim = N_EMBD // N_HEAD
+    f16 = estimate_memory(shape, n_ctx=256, n_batch=32)
+    assert f16.kv_cache_bytes == 2 * N_LAYER * 256 * N_HEAD_KV * 2 * head_dim
+    assert f16.total_bytes == (
+        f16.weight_bytes + f16.kv_cache_bytes + f16.scratch_bytes
+    )
+
+    # Quantized caches are ~2x and ~4x smaller than f16
+    q8 = estimate_memory(shape, n_ctx=256, n_batch=32, kv_cache_type=KVCacheType.q8_0)
+    q4 = estimate_memory(shape, n_ctx=256, n_batch=32, kv_cache_type=KVCacheType.q4_0)
+    assert q8.kv_cache_bytes == f16.kv_cache_bytes * 34 // 64
+    assert q4.kv_cache_bytes == f16.kv_cache_bytes * 18 // 64
+
+    # Keys and values can be stored with different types
+    q8_keys = estimate_memory(
+        shape,
+        n_ctx=256,
+        n_batch=32,
+        kv_cache_type=KVCacheType.q8_0,
+        v_cache_type=KVCacheType.f16,
+    )
+    assert q8_keys.kv_cache_bytes == (f16.kv_cache_bytes + q8.kv_cache_bytes) // 2
+    assert q8_keys.v_cache_type == KVCacheType.f16
+    assert q8.v_cache_type is None
+
+    # Flash attention does not materialize the attention scores
+    flash = estimate_memory(shape, n_ctx=256, n_batch=32, flash_attn=True)
+    assert f16.scratch_bytes - flash.scratch_bytes == 4 * N_HEAD * 256 * 32
+
+    # n_ctx=0 falls back to the trained context size, and batch is clamped to the context
+    trained = estimate_memory(shape, n_ctx=0, n_batch=4096)
+    assert trained.n_ctx == 2048
+    assert trained.n_batch == 2048
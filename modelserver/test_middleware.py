@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any
+
+from starlette.types import Message, Receive, Scope, Send
+
+from modelserver.middleware import StreamingGZipMiddleware
+
+BODY = b"x" * 20000
+
+
+def respond(media_type: str) -> Any:
+    """
+    An ASGI app streaming BODY with the media type.
+    """
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", media_type.encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": BODY, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    return app
+
+
+def request(media_type: str) -> list[Message]:
+    sent: list[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    middleware = StreamingGZipMiddleware(respond(media_type), minimum_size=1000)
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def test_streaming_gzip_excludes_events() -> None:
+    [start, *_] = request("text/plain")
+    assert (b"content-encoding", b"gzip") in start["headers"]
+
+    [start, first, last] = request("text/event-stream; charset=utf-8")
+    assert all(name != b"content-encoding" for name, _ in start["headers"])
+    assert first["body"] == BODY
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+from modelserver import runtime
+from modelserver.profiler import sample_stacks, to_collapsed, to_speedscope
+from modelserver.runtime import CHANNEL_SENTINEL, InferenceRuntime, JobSignals, ModelKey
+
+
+def spin_until(stop: threading.Event) -> None:
+    while not stop.is_set():
+        pass
+
+
+def test_sample_stacks() -> None:
+    stop = threading.Event()
+    spinner = threading.Thread(target=spin_until, args=(stop,), name="spinner")
+    spinner.start()
+    try:
+        samples = sample_stacks(0.2, 100, "test")
+    finally:
+        stop.set()
+        spinner.join()
+
+    spinning = [s for s in samples if s[0] == "test/spinner"]
+    assert len(spinning) > 0
+    assert all(
+        any(frame.startswith("spin_until (") for frame in stack) for stack in spinning
+    )
+    # Roughly one sample per 10ms
+    assert 10 <= sum(samples[s] for s in spinning) <= 21
+
+    lines = [
+        line for line in to_collapsed(samples).splitlines() if "spin_until" in line
+    ]
+    assert all(line.startswith("test/spinner;") for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == sum(
+        samples[s] for s in spinning
+    )
+
+    speedscope = json.loads(to_speedscope(samples, 100, name="test"))
+    [profile] = [p for p in speedscope["profiles"] if p["name"] == "test/spinner"]
+    frames = speedscope["shared"]["frames"]
+    assert "spin_until" in {frames[i]["name"] for i in profile["samples"][0]}
+    assert profile["endValue"] == pytest.approx(sum(profile["weights"]))
+
+
+def spin_job(
+    seconds: float, signals: JobSignals, channel: queue.Queue[str | None]
+) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+    channel.put(CHANNEL_SENTINEL)
+
+
+def test_profile_resident_processes(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(runtime, "_load_model", lambda key, with_readahead, cores: None)
+
+    async def main() -> None:
+        inference = InferenceRuntime(memory_budget_bytes=100)
+        key = ModelKey("model.gguf")
+        try:
+            # Load the process, then profile it in the middle of a job
+            async for _ in inference.stream(key, None, spin_job, 0.0):
+                pass
+            job = asyncio.create_task(
+                anext(inference.stream(key, None, spin_job, 1.0), None)
+            )
+            samples = await asyncio.to_thread(inference.profile, 0.3, 100, True)
+            await job
+        finally:
+            inference.shutdown()
+
+        processes = {stack[0].split("/")[0] for stack in samples}
+        assert any(process.startswith("server[") for process in processes)
+        assert any(process.startswith("model.gguf[") for process in processes)
+        assert any(stack[-1].startswith("spin_job (") for stack in samples)
+
+    asyncio.run(main())
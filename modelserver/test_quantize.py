@@ -0,0 +1,127 @@
+import pathlib
+import struct
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from modelserver.ggml import GGML_TYPE_F16, GGML_TYPE_Q8_0
+from modelserver.quantize import estimate_quantized_bytes, merge_lora, read_lora_adapter
+from modelserver.types.api import QuantizationType
+
+N_IN = 8
+N_OUT = 4
+RANK = 2
+ALPHA = 4
+
+
+def write_gguf(
+    path: pathlib.Path,
+    tensors: dict[str, npt.NDArray[Any]],
+    ggml_type: int = GGML_TYPE_F16,
+) -> None:
+    """
+    Write a GGUF v3 file holding the tensors, with no metadata.
+    """
+
+    def string(s: str) -> bytes:
+        encoded = s.encode("utf-8")
+        return struct.pack("<Q", len(encoded)) + encoded
+
+    header = b"GGUF" + struct.pack("<IQQ", 3, len(tensors), 0)
+    data = b""
+    for name, tensor in tensors.items():
+        header += string(name)
+        header += struct.pack("<I", tensor.ndim)
+        header += struct.pack(f"<{tensor.ndim}Q", *tensor.shape[::-1])
+        header += struct.pack("<IQ", ggml_type, len(data))
+        data += tensor.astype(np.float16).tobytes()
+        data += b"\0" * (-len(data) % 32)
+    with path.open("wb") as f:
+        f.write(header + b"\0" * (-len(header) % 32) + data)
+
+
+def write_lora(path: pathlib.Path, tensors: dict[str, npt.NDArray[Any]]) -> None:
+    """
+    Write an adapter in the GGML LoRA format produced by the fine-tune workers.
+    """
+    with path.open("wb") as f:
+        f.write(b"algg" + struct.pack("<iii", 1, RANK, ALPHA))
+        for name, tensor in tensors.items():
+            encoded = name.encode("utf-8")
+            f.write(struct.pack("<iii", tensor.ndim, len(encoded), 0))
+            f.write(struct.pack(f"<{tensor.ndim}i", *tensor.shape[::-1]))
+            f.write(encoded)
+            f.seek((f.tell() + 31) & -32)
+            f.write(tensor.astype(np.float32).tobytes())
+
+
+def test_merge_lora(tmp_path: pathlib.Path) -> None:
+    rng = np.random.default_rng(0)
+    weight = rng.standard_normal((N_OUT, N_IN)).astype(np.float16)
+    untouched = rng.standard_normal((N_OUT, N_IN)).astype(np.float16)
+    write_gguf(
+        tmp_path / "base.gguf",
+        {"blk.0.attn_q.weight": weight, "blk.0.attn_k.weight": untouched},
+    )
+    a = rng.standard_normal((N_IN, RANK)).astype(np.float32)
+    b = rng.standard_normal((N_OUT, RANK)).astype(np.float32)
+    write_lora(
+        tmp_path / "adapter.bin",
+        {"blk.0.attn_q.weight.loraA": a, "blk.0.attn_q.weight.loraB": b},
+    )
+
+    adapter = read_lora_adapter(tmp_path / "adapter.bin")
+    assert (adapter.rank, adapter.alpha) == (RANK, ALPHA)
+    np.testing.assert_array_equal(adapter.tensors["blk.0.attn_q.weight"][0], a)
+
+    merge_lora(
+        tmp_path / "base.gguf", tmp_path / "adapter.bin", tmp_path / "merged.gguf"
+    )
+
+    base_bytes = (tmp_path / "base.gguf").read_bytes()
+    merged_bytes = (tmp_path / "merged.gguf").read_bytes()
+    assert len(merged_bytes) == len(base_bytes)
+    data_offset = len(base_bytes) - 2 * N_OUT * N_IN * 2
+    merged = np.frombuffer(
+        merged_bytes, dtype=np.float16, count=N_OUT * N_IN, offset=data_offset
+    ).reshape(N_OUT, N_IN)
+    expected = weight.astype(np.float32) + ALPHA / RANK * (b @ a.T)
+    np.testing.assert_allclose(merged, expected, rtol=1e-2, atol=1e-2)
+    # Tensors the adapter does not touch are copied as they are
+    assert merged_bytes[data_offset + N_OUT * N_IN * 2 :] == untouched.tobytes()
+
+
+def test_merge_lora_needs_float_base(tmp_path: pathlib.Path) -> None:
+    write_gguf(
+        tmp_path / "base.gguf",
+        {"blk.0.attn_q.weight": np.zeros((N_OUT, N_IN))},
+        ggml_type=GGML_TYPE_Q8_0,
+    )
+    write_lora(
+        tmp_path / "adapter.bin",
+        {
+            "blk.0.attn_q.weight.loraA": np.zeros((N_IN, RANK)),
+            "blk.0.attn_q.weight.loraB": np.zeros((N_OUT, RANK)),
+        },
+    )
+    with pytest.raises(ValueError, match="F16 or F32"):
+        merge_lora(
+            tmp_path / "base.gguf", tmp_path / "adapter.bin", tmp_path / "merged.gguf"
+        )
+    assert not (tmp_path / "merged.gguf").exists()
+
+
+def test_estimate_quantized_bytes(tmp_path: pathlib.Path) -> None:
+    write_gguf(
+        tmp_path / "model.gguf",
+        {
+            "blk.0.attn_q.weight": np.zeros((64, 64)),
+            "blk.0.attn_k.weight": np.zeros((64, 64)),
+        },
+    )
+    # 8192 weights at 8.5 bits each
+    assert (
+        estimate_quantized_bytes(tmp_path / "model.gguf", QuantizationType.q8_0) == 8704
+    )
@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine
+
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.metrics._core import (
+    InvocationMeasurementsOut,
+    InvocationOutcome,
+    SearchInvocationsResponsePage,
+)
+from modelserver.responses import JSONResponder
+from modelserver.types.api import (
+    CreateTaskRequest,
+    GetRegisteredModelsResponse,
+    RegisterModelRequest,
+    TaskInfo,
+)
+
+
+def fastapi_json(type_: Any, content: Any) -> bytes:
+    """
+    The body FastAPI renders for content returned by a route declaring `type_` as its response model.
+    """
+    serialized = asyncio.run(
+        serialize_response(
+            field=create_response_field("response", type_), response_content=content
+        )
+    )
+    return bytes(JSONResponse(serialized).body)
+
+
+def test_matches_fastapi_models_and_tasks() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:")
+    db = PersistentDataManager(engine)
+    model_id, _ = db.register_model(
+        RegisterModelRequest.model_validate(
+            {
+                "model": "anewmodel",
+                "version": "0.1.0",
+                "model_type": "completion",
+                "runtime": "ggml",
+                "internal_params": {
+                    "type": "paramsv1/completion",
+                    "model_path": "/path/to/model.bin",
+                },
+                "import_metadata": {
+                    "imported_at": datetime.utcfromtimestamp(0),
+                    "source": {
+                        "type": "importv1/disk",
+                        "source": {
+                            "type": "locatorv1/disk",
+                            "path": "/path/to/model.bin",
+                        },
+                    },
+                },
+            }
+        )
+    )
+    db.create_task(CreateTaskRequest(name="summarize"))
+    db.update_task_prompt_template("summarize", "Résumé de {document} ✓")
+    db.set_task_backing_model("summarize", str(model_id), "0.1.0")
+    db.create_task(CreateTaskRequest(name="unbacked"))
+
+    models = GetRegisteredModelsResponse.model_construct(
+        models=db.get_registered_models()
+    )
+    assert JSONResponder(GetRegisteredModelsResponse).dump(models) == fastapi_json(
+        GetRegisteredModelsResponse, models
+    )
+    tasks = db.get_tasks()
+    assert JSONResponder(list[TaskInfo]).dump(tasks) == fastapi_json(
+        list[TaskInfo], tasks
+    )
+    engine.dispose()
+
+
+def test_matches_fastapi_invocations_page() -> None:
+    page = SearchInvocationsResponsePage(
+        page=[
+            InvocationMeasurementsOut(
+                invocation_id=uuid.uuid1(),
+                task_id=uuid.uuid4(),
+                ts=datetime.utcfromtimestamp(n),
+                input_tokens=100 + n,
+                output_tokens=10 + n,
+                generate_ms=1000.5 * n,
+                used_grammar=n % 2 == 0,
+                used_variables=True,
+                outcome=(
+                    InvocationOutcome.timed_out
+                    if n == 2
+                    else InvocationOutcome.completed
+                ),
+                phases_ms={"db": 0.25, "queue": 3.0} if n % 2 else None,
+            )
+            for n in range(4)
+        ],
+        page_token="next",
+    )
+    assert JSONResponder(SearchInvocationsResponsePage).dump(page) == fastapi_json(
+        SearchInvocationsResponsePage, page
+    )
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from modelserver import runtime
+from modelserver.runtime import (
+    CHANNEL_SENTINEL,
+    InferenceRuntime,
+    InferenceTimeout,
+    JobSignals,
+    ModelKey,
+)
+from modelserver.scheduler import MAX_ADAPTER_OVERTAKES, ModelScheduler
+from modelserver.types.api import InferencePriority, KVCacheType, MemoryEstimate
+
+
+def estimate(total_bytes: int) -> MemoryEstimate:
+    return MemoryEstimate(
+        n_ctx=512,
+        n_batch=512,
+        kv_cache_type=KVCacheType.f16,
+        weight_bytes=total_bytes,
+        kv_cache_bytes=0,
+        scratch_bytes=0,
+    )
+
+
+def test_admit_evicts_lru() -> None:
+    runtime = InferenceRuntime(memory_budget_bytes=100)
+    first, second, third = (
+        ModelKey("first.gguf"),
+        ModelKey("second.gguf"),
+        ModelKey("third.gguf"),
+    )
+    try:
+        runtime.admit(first, estimate(40))
+        runtime.admit(second, estimate(40))
+        # Touch the first model so that the second becomes least recently used
+        runtime.admit(first, estimate(40))
+        runtime.admit(third, estimate(40))
+        assert set(runtime.residents.keys()) == {first, third}
+
+        # Busy models are never evicted
+        for resident in runtime.residents.values():
+            resident.in_flight += 1
+        with pytest.raises(HTTPException) as e:
+            runtime.admit(second, estimate(40))
+        assert e.value.status_code == 503
+
+        # Models that can never fit are refused
+        with pytest.raises(HTTPException):
+            runtime.admit(ModelKey("huge.gguf"), estimate(1000))
+    finally:
+        runtime.shutdown()
+
+
+def test_admit_claims_model() -> None:
+    runtime = InferenceRuntime(memory_budget_bytes=100)
+    first, second = ModelKey("first.gguf"), ModelKey("second.gguf")
+    try:
+        # The claim is taken under the admission lock, so the model is never idle in between
+        resident = runtime.admit(first, estimate(80), claim=True)
+        assert resident.in_flight == 1
+        with pytest.raises(HTTPException):
+            runtime.admit(second, estimate(40))
+
+        runtime.release(resident)
+        runtime.admit(second, estimate(40))
+        assert list(runtime.residents.keys()) == [second]
+    finally:
+        runtime.shutdown()
+
+
+def test_preload_does_not_evict() -> None:
+    runtime = InferenceRuntime(memory_budget_bytes=100)
+    try:
+        runtime.admit(ModelKey("resident.gguf"), estimate(80))
+        with pytest.raises(HTTPException):
+            runtime.preload(ModelKey("new.gguf"), estimate(40))
+        assert list(runtime.residents.keys()) == [ModelKey("resident.gguf")]
+    finally:
+        runtime.shutdown()
+
+
+def test_preload_evicts_idle_models(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Resident processes are forked, so they inherit the fake model
+    monkeypatch.setattr(runtime, "_load_model", lambda key, with_readahead, cores: None)
+    inference = InferenceRuntime(memory_budget_bytes=100)
+    busy, idle, new = ModelKey("busy.gguf"), ModelKey("idle.gguf"), ModelKey("new.gguf")
+    try:
+        resident = inference.admit(busy, estimate(50), claim=True)
+        inference.admit(idle, estimate(40))
+        inference.preload(new, estimate(40), evict=True)
+        assert list(inference.residents.keys()) == [busy, new]
+
+        # Models with jobs in flight are never evicted
+        with pytest.raises(HTTPException):
+            inference.preload(ModelKey("large.gguf"), estimate(60), evict=True)
+        assert busy in inference.residents
+        inference.release(resident)
+    finally:
+        inference.shutdown()
+
+
+def count_until_cancelled(
+    signals: JobSignals, channel: queue.Queue[str | None]
+) -> None:
+    for i in range(1000):
+        if signals.cancelled.is_set():
+            break
+        channel.put(str(i))
+        time.sleep(0.01)
+    channel.put(CHANNEL_SENTINEL)
+
+
+def test_stream_cancels_job(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Skip loading a model, the job does not need one
+    monkeypatch.setattr(runtime, "_load_model", lambda key, with_readahead, cores: None)
+
+    async def main() -> None:
+        inference = InferenceRuntime(memory_budget_bytes=100)
+        key = ModelKey("model.gguf")
+        try:
+            # Consumer going away cancels the job
+            tokens = inference.stream(key, None, count_until_cancelled)
+            assert await anext(tokens) == "0"
+            await tokens.aclose()
+
+            # Deadlines cancel the job
+            with pytest.raises(InferenceTimeout):
+                async for _ in inference.stream(
+                    key, None, count_until_cancelled, timeout_seconds=0.1
+                ):
+                    pass
+
+            # The process is free again once the jobs have noticed
+            assert inference.residents[key].in_flight == 0
+            pid = await asyncio.wait_for(
+                asyncio.wrap_future(
+                    inference.residents[key].executor.submit(os.getpid)
+                ),
+                timeout=5,
+            )
+            assert pid != os.getpid()
+        finally:
+            inference.shutdown()
+
+    asyncio.run(main())
+
+
+def count_to(
+    name: str,
+    start: int,
+    stop: int,
+    signals: JobSignals,
+    channel: queue.Queue[str | None],
+) -> tuple[str, int, int] | None:
+    for i in range(start, stop):
+        channel.put(f"{name}{i}")
+        time.sleep(0.01)
+        if signals.preempted.is_set() and i + 1 < stop:
+            channel.put(CHANNEL_SENTINEL)
+            return name, i + 1, stop
+    channel.put(CHANNEL_SENTINEL)
+    return None
+
+
+def test_interactive_preempts_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(runtime, "_load_model", lambda key, with_readahead, cores: None)
+
+    async def main() -> None:
+        inference = InferenceRuntime(memory_budget_bytes=100)
+        key = ModelKey("model.gguf")
+        order: list[str] = []
+
+        async def consume(name: str, stop: int, priority: InferencePriority) -> None:
+            async for token in inference.stream(
+                key, None, count_to, name, 0, stop, priority=priority
+            ):
+                order.append(token)
+
+        try:
+            batch = asyncio.create_task(consume("batch", 50, InferencePriority.batch))
+            while len(order) < 2:
+                await asyncio.sleep(0.01)
+            await consume("interactive", 3, InferencePriority.interactive)
+            await batch
+        finally:
+            inference.shutdown()
+
+        # The batch job yields to the interactive job, then resumes where it left off
+        interactive_at = order.index("interactive0")
+        assert order[interactive_at : interactive_at + 3] == [
+            "interactive0",
+            "interactive1",
+            "interactive2",
+        ]
+        assert [token for token in order if token.startswith("batch")] == [
+            f"batch{i}" for i in range(50)
+        ]
+        assert order[-1] == "batch49"
+
+    asyncio.run(main())
+
+
+def test_scheduler_orders_by_priority() -> None:
+    async def main() -> None:
+        scheduler = ModelScheduler()
+        holder_preempted = threading.Event()
+        await scheduler.acquire(InferencePriority.batch, holder_preempted)
+
+        granted: list[str] = []
+
+        async def wait(name: str, priority: InferencePriority) -> None:
+            preempted = threading.Event()
+            await scheduler.acquire(priority, preempted)
+            granted.append(name)
+            scheduler.release()
+
+        waiters = [
+            asyncio.create_task(wait("batch", InferencePriority.batch)),
+            asyncio.create_task(wait("interactive", InferencePriority.interactive)),
+        ]
+        await asyncio.sleep(0)
+        # A waiting interactive job asks the batch holder to yield
+        assert holder_preempted.is_set()
+
+        scheduler.release()
+        await asyncio.gather(*waiters)
+        assert granted == ["interactive", "batch"]
+
+    asyncio.run(main())
+
+
+def test_scheduler_groups_by_adapter() -> None:
+    async def main() -> None:
+        scheduler = ModelScheduler()
+        await scheduler.acquire(InferencePriority.interactive, threading.Event(), "a")
+
+        granted: list[str] = []
+
+        async def wait(name: str, adapter: str) -> None:
+            await scheduler.acquire(
+                InferencePriority.interactive, threading.Event(), adapter
+            )
+            granted.append(name)
+            scheduler.release()
+
+        waiters = [asyncio.create_task(wait("b1", "b"))]
+        waiters += [
+            asyncio.create_task(wait(f"a{i}", "a"))
+            for i in range(MAX_ADAPTER_OVERTAKES + 1)
+        ]
+        waiters.append(asyncio.create_task(wait("b2", "b")))
+        await asyncio.sleep(0)
+
+        scheduler.release()
+        await asyncio.gather(*waiters)
+        # Jobs for the applied adapter go first, until they have overtaken the first b job too often
+        assert granted == [f"a{i}" for i in range(MAX_ADAPTER_OVERTAKES)] + [
+            "b1",
+            "b2",
+            f"a{MAX_ADAPTER_OVERTAKES}",
+        ]
+
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+import typing
+from types import SimpleNamespace
+
+import numpy as np
+from llama_cpp import Llama
+
+from modelserver.grammar import parse_gbnf
+from modelserver.speculative import (
+    GrammarForcedDraft,
+    PromptLookupDraft,
+    SpeculativeDraft,
+    speculating,
+)
+
+
+class ScriptedDraft(SpeculativeDraft):
+    """
+    Proposes a fixed continuation for each call.
+    """
+
+    def __init__(self, proposals: list[list[int]]) -> None:
+        super().__init__()
+        self.proposals = proposals
+
+    def propose(self, input_ids: list[int]) -> list[int]:
+        return self.proposals.pop(0)
+
+
+def test_acceptance_accounting() -> None:
+    draft = ScriptedDraft([[5, 6, 7], [9, 9], [], [1], []])
+    prompt = [1, 2, 3, 4]
+
+    assert draft(np.array(prompt, dtype=np.intc)).tolist() == [5, 6, 7]
+    # The model accepted 5 and 6, then sampled 8 instead of 7
+    assert draft(np.array(prompt + [5, 6, 8], dtype=np.intc)).tolist() == [9, 9]
+    # Both proposals accepted, plus the token sampled after them
+    assert draft(np.array(prompt + [5, 6, 8, 9, 9, 2], dtype=np.intc)).tolist() == []
+    assert draft.take() == (5, 4)
+
+    # Proposals outstanding when a new sequence starts are not counted
+    draft(np.array(prompt + [5, 6, 8, 9, 9, 2, 3], dtype=np.intc))
+    draft.begin()
+    draft(np.array([1], dtype=np.intc))
+    assert draft.take() == (0, 0)
+
+
+def test_prompt_lookup() -> None:
+    draft = PromptLookupDraft(max_ngram_size=2, num_pred_tokens=3)
+    #         prompt: "name is Alice Smith ." output so far: "Alice"
+    prompt = [10, 11, 12, 13, 14, 15]
+    assert draft(np.array(prompt + [12], dtype=np.intc)).tolist() == [13, 14, 15]
+    # Nothing to copy once the output diverges from the prompt
+    assert draft(np.array(prompt + [12, 13, 99], dtype=np.intc)).tolist() == []
+    assert draft.take() == (3, 1)
+
+
+def test_speculating_restores_llama() -> None:
+    llama = typing.cast(
+        Llama,
+        SimpleNamespace(
+            draft_model=None, context_params=SimpleNamespace(logits_all=False)
+        ),
+    )
+    draft = PromptLookupDraft(max_ngram_size=2, num_pred_tokens=3)
+    with speculating(llama, draft):
+        assert llama.draft_model is draft
+        assert llama.context_params.logits_all
+    assert llama.draft_model is None
+    assert not llama.context_params.logits_all
+
+
+def test_grammar_forced_draft() -> None:
+    # A vocabulary of one token per character, so that token ids are code points
+    llama = typing.cast(
+        Llama,
+        SimpleNamespace(
+            tokenize=lambda text, add_bos: [ord(c) for c in text.decode("utf-8")],
+            detokenize=lambda tokens: "".join(map(chr, tokens)).encode("utf-8"),
+        ),
+    )
+    grammar = parse_gbnf(r'root ::= "{\"id\": " [0-9]+ "}"')
+    fallback = ScriptedDraft([[ord("7")]])
+    draft = GrammarForcedDraft(llama, grammar, fallback)
+    draft.begin()
+
+    prompt = [ord(c) for c in "JSON:"]
+    # The first token is sampled before the draft is asked for a proposal
+    proposal = draft(np.array(prompt + [ord("{")], dtype=np.intc)).tolist()
+    assert "".join(map(chr, proposal)) == '"id": '
+    # The digits are up to the model, so the fallback proposes instead
+    generated = [ord(c) for c in '{"id": 4']
+    assert draft(np.array(prompt + generated, dtype=np.intc)).tolist() == [ord("7")]
+    assert draft.take() == (6, 6)
@@ -0,0 +1,174 @@
+import asyncio
+import typing
+from typing import Any, AsyncGenerator
+
+import pytest
+from fastapi import WebSocket, WebSocketDisconnect
+
+from modelserver.metrics._core import InvocationOutcome
+from modelserver.runtime import InferenceTimeout
+from modelserver.streaming import (
+    SLOW_CLIENT_CLOSE_CODE,
+    decode_binary_frame,
+    forward_tokens,
+    stream_events,
+)
+from modelserver.types.api import (
+    ServerTiming,
+    SlowClientPolicy,
+    StreamFormat,
+    StreamFraming,
+    StreamSummary,
+)
+
+
+class FakeWebSocket:
+    """
+    Records the frames sent to a client that never sends anything, taking `send_seconds` per frame.
+    """
+
+    def __init__(self, send_seconds: float = 0.0) -> None:
+        self.send_seconds = send_seconds
+        self.frames: list[str | bytes] = []
+        self.close_code: int | None = None
+
+    async def receive(self) -> dict[str, Any]:
+        await asyncio.Event().wait()
+        raise AssertionError("unreachable")
+
+    async def send_text(self, data: str) -> None:
+        await asyncio.sleep(self.send_seconds)
+        self.frames.append(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        await asyncio.sleep(self.send_seconds)
+        self.frames.append(data)
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.close_code = code
+
+
+async def generate(count: int, seconds: float = 0.0) -> AsyncGenerator[str, str]:
+    for i in range(count):
+        await asyncio.sleep(seconds)
+        yield f"t{i} "
+
+
+def forward(
+    websocket: FakeWebSocket, tokens: AsyncGenerator[str, str], framing: StreamFraming
+) -> list[str]:
+    async def run() -> list[str]:
+        return [
+            token
+            async for token in forward_tokens(
+                typing.cast(WebSocket, websocket), tokens, framing
+            )
+        ]
+
+    return asyncio.run(run())
+
+
+def test_frame_per_token() -> None:
+    websocket = FakeWebSocket()
+    forwarded = forward(websocket, generate(5, 0.001), StreamFraming())
+    assert websocket.frames == forwarded == [f"t{i} " for i in range(5)]
+
+
+def test_coalesce_by_tokens() -> None:
+    websocket = FakeWebSocket()
+    forward(websocket, generate(10), StreamFraming(flush_tokens=4, flush_ms=1000))
+    assert websocket.frames == ["t0 t1 t2 t3 ", "t4 t5 t6 t7 ", "t8 t9 "]
+
+
+def test_coalesce_by_time() -> None:
+    websocket = FakeWebSocket()
+    forward(websocket, generate(10, 0.02), StreamFraming(flush_tokens=100, flush_ms=50))
+    # Tokens arrive every 20ms, so a frame waits 50ms for two more after its first token
+    assert 3 <= len(websocket.frames) <= 5
+    assert "".join(typing.cast(list[str], websocket.frames)) == "".join(
+        f"t{i} " for i in range(10)
+    )
+
+
+def test_binary_frames() -> None:
+    websocket = FakeWebSocket()
+    forward(websocket, generate(5), StreamFraming(flush_tokens=3, binary=True))
+    tokens = [
+        token
+        for frame in websocket.frames
+        for token in decode_binary_frame(typing.cast(bytes, frame))
+    ]
+    assert tokens == [(i, f"t{i} ") for i in range(5)]
+
+
+def test_slow_client_waits() -> None:
+    websocket = FakeWebSocket(send_seconds=0.01)
+    forwarded = forward(websocket, generate(20), StreamFraming(buffer_tokens=2))
+    assert websocket.frames == forwarded
+    assert websocket.close_code is None
+
+
+def test_slow_client_cancelled() -> None:
+    websocket = FakeWebSocket(send_seconds=0.01)
+    with pytest.raises(WebSocketDisconnect):
+        forward(
+            websocket,
+            generate(20),
+            StreamFraming(buffer_tokens=2, slow_client=SlowClientPolicy.cancel),
+        )
+    assert websocket.close_code == SLOW_CLIENT_CLOSE_CODE
+    assert len(websocket.frames) < 20
+
+
+def collect_events(
+    tokens: AsyncGenerator[str, str], format: StreamFormat
+) -> tuple[str, list[tuple[str, InvocationOutcome]]]:
+    finished: list[tuple[str, InvocationOutcome]] = []
+
+    def finish(completion: str, outcome: InvocationOutcome) -> StreamSummary:
+        finished.append((completion, outcome))
+        return StreamSummary(
+            elapsed_seconds=1.0, timing=ServerTiming(phases_ms={}, total_ms=1.0)
+        )
+
+    async def run() -> str:
+        return "".join([event async for event in stream_events(tokens, format, finish)])
+
+    return asyncio.run(run()), finished
+
+
+def test_stream_events_sse() -> None:
+    body, finished = collect_events(generate(2), StreamFormat.sse)
+    assert body == (
+        'event: token\ndata: {"type":"token","text":"t0 "}\n\n'
+        'event: token\ndata: {"type":"token","text":"t1 "}\n\n'
+        'event: summary\ndata: {"type":"summary","elapsed_seconds":1.0,"speculation":null,'
+        '"timing":{"phases_ms":{},"total_ms":1.0}}\n\n'
+    )
+    assert finished == [("t0 t1 ", InvocationOutcome.completed)]
+
+
+def test_stream_events_timeout() -> None:
+    async def timing_out() -> AsyncGenerator[str, str]:
+        yield "t0 "
+        raise InferenceTimeout(5)
+
+    body, finished = collect_events(timing_out(), StreamFormat.ndjson)
+    assert body.splitlines() == [
+        '{"type":"token","text":"t0 "}',
+        '{"type":"error","status_code":504,"detail":"Inference did not complete within 5s"}',
+    ]
+    assert finished == [("t0 ", InvocationOutcome.timed_out)]
+
+
+def test_stream_events_failure() -> None:
+    async def failing() -> AsyncGenerator[str, str]:
+        yield "t0 "
+        raise RuntimeError("model process died")
+
+    body, finished = collect_events(failing(), StreamFormat.ndjson)
+    assert body.splitlines() == [
+        '{"type":"token","text":"t0 "}',
+        '{"type":"error","status_code":500,"detail":"Generation failed"}',
+    ]
+    assert finished == [("t0 ", InvocationOutcome.failed)]
@@ -0,0 +1,101 @@
+import queue
+import threading
+from typing import Any, Iterator
+
+import pytest
+
+from modelserver import task_worker
+from modelserver.runtime import CHANNEL_SENTINEL, JobSignals
+from modelserver.task_worker import (
+    JsonValueTracker,
+    invoke_task,
+    invoke_task_batch,
+    stops_on_grammar_accept,
+)
+from modelserver.types.api import TaskBatchInvocationItem, TaskGenerationParams
+
+
+def test_json_value_tracker() -> None:
+    tracker = JsonValueTracker()
+    assert tracker.feed('{"label": "po') is None
+    # Brackets and escaped quotes inside strings do not count
+    assert tracker.feed('s}{[\\"", "scores": [1, ') is None
+    assert tracker.feed("2]}\n\n") == 3
+
+    assert JsonValueTracker().feed('[{"a": 1}] trailing') == 10
+
+    # Closing more than was opened is not JSON, stop tracking rather than firing on a later bracket
+    tracker = JsonValueTracker()
+    assert tracker.feed('}{"a": 1}') is None
+    assert tracker.feed("}") is None
+
+
+def test_stops_on_grammar_accept() -> None:
+    params = TaskGenerationParams(stop_on_grammar_accept=True)
+    object_root = 'root ::= "{" ws "}" | "[" ws "]"\nws ::= [ \\t\\n]*'
+    assert stops_on_grammar_accept(object_root, params)
+    assert not stops_on_grammar_accept(object_root, TaskGenerationParams())
+    assert not stops_on_grammar_accept(None, params)
+    # The end of a scalar cannot be detected from the text
+    assert not stops_on_grammar_accept('root ::= "yes" | "no"', params)
+    assert not stops_on_grammar_accept('root ::= "{}" | [0-9]+', params)
+
+
+class UppercaseLlama:
+    """
+    Stands in for a Llama, completing each prompt with the prompt in upper case.
+    """
+
+    def create_completion(self, prompt: str, **kwargs: Any) -> Iterator[Any]:
+        if prompt == "fail":
+            raise ValueError("failed")
+        for c in prompt.upper():
+            yield {"choices": [{"text": c}]}
+
+
+def test_invoke_task_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(task_worker, "resident_llama", lambda: UppercaseLlama())
+
+    channel: queue.Queue[str | None] = queue.Queue()
+    invoke_task_batch(
+        [(0, "abc"), (2, "fail"), (3, "de")],
+        0.0,
+        None,
+        TaskGenerationParams(max_tokens=16),
+        JobSignals(cancelled=threading.Event(), preempted=threading.Event(), stats={}),
+        channel,
+    )
+
+    items = []
+    while (line := channel.get_nowait()) != CHANNEL_SENTINEL:
+        assert line is not None
+        items.append(TaskBatchInvocationItem.model_validate_json(line))
+    assert [(item.index, item.result, item.error) for item in items] == [
+        (0, "ABC", None),
+        (2, None, "failed"),
+        (3, "DE", None),
+    ]
+
+
+def test_preempted_task_resumes(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(task_worker, "resident_llama", lambda: UppercaseLlama())
+    signals = JobSignals(
+        cancelled=threading.Event(), preempted=threading.Event(), stats={}
+    )
+    signals.preempted.set()
+
+    # Unconstrained generation yields after the first token, resuming with what it generated so far
+    channel: queue.Queue[str | None] = queue.Queue()
+    params = TaskGenerationParams(max_tokens=16)
+    resume = invoke_task("abc", 0.0, None, params, signals, channel)
+    assert resume == ("abcA", 0.0, None, TaskGenerationParams(max_tokens=15))
+    assert channel.get_nowait() == "A"
+    assert channel.get_nowait() == CHANNEL_SENTINEL
+
+    # Batches yield between items
+    channel = queue.Queue()
+    resume_batch = invoke_task_batch(
+        [(0, "abc"), (1, "de")], 0.0, None, params, signals, channel
+    )
+    assert resume_batch == ([(0, "abc"), (1, "de")], 0.0, None, params)
+    assert channel.get_nowait() == CHANNEL_SENTINEL
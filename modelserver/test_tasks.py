@@ -0,0 +1,134 @@
+import pathlib
+import typing
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+
+from modelserver import tasks
+from modelserver.blobstore import BlobStore
+from modelserver.db.sqlite import PersistentDataManager
+from modelserver.db.tasks import PersistentTaskStore
+from modelserver.db.test_db import REGISTER_V2
+from modelserver.runtime import InferenceRuntime
+from modelserver.tasks import Tasks
+from modelserver.types.api import QuantizationType
+from modelserver.types.locator import DiskLocator, HFLocator
+from modelserver.types.tasks import (
+    DownloadDiskModelTask,
+    DownloadHFModelTask,
+    FailedTaskState,
+    FinishedTaskState,
+    Task,
+)
+
+
+def import_disk_model(
+    tmp_path: pathlib.Path, db: PersistentDataManager, version: str
+) -> FinishedTaskState | FailedTaskState:
+    """
+    Import a model file as `version` of "anewmodel", along with a copy quantized to Q8_0.
+    """
+    source = tmp_path / "model.gguf"
+    source.write_bytes(b"GGUF model")
+    taskdb = PersistentTaskStore()
+    task = DownloadDiskModelTask(
+        locator=DiskLocator(path=str(source)),
+        model_name="anewmodel",
+        model_version=version,
+        quantization=QuantizationType.q8_0,
+    )
+    task_id = taskdb.store_task(Task(task))
+    Tasks(
+        taskdb,
+        db,
+        BlobStore(tmp_path / "blobs", db),
+        typing.cast(InferenceRuntime, None),
+    ).handle_download_disk_model(task_id, task)
+    state = taskdb.get_task_state(task_id).root
+    assert isinstance(state, (FinishedTaskState, FailedTaskState))
+    return state
+
+
+def test_quantization_failure_keeps_import(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(*args: Any) -> int:
+        raise ValueError("Unsupported tensor type")
+
+    monkeypatch.setattr(tasks, "estimate_quantized_bytes", fail)
+    db = PersistentDataManager(create_engine("sqlite+pysqlite:///:memory:"))
+    state = import_disk_model(tmp_path, db, "0.1.0")
+    assert isinstance(state, FinishedTaskState)
+    assert state.metadata["quantization_error"] == "Unsupported tensor type"
+    [registered] = db.get_registered_models()
+    assert [str(v.version) for v in registered.versions] == ["0.1.0"]
+
+
+def test_taken_quantized_version_fails_before_import(tmp_path: pathlib.Path) -> None:
+    db = PersistentDataManager(create_engine("sqlite+pysqlite:///:memory:"))
+    db.register_model(REGISTER_V2)
+
+    # The quantized copy of 0.1.0 defaults to 0.2.0
+    state = import_disk_model(tmp_path, db, "0.1.0")
+    assert isinstance(state, FailedTaskState)
+    assert "0.2.0" in state.error
+    [registered] = db.get_registered_models()
+    assert [str(v.version) for v in registered.versions] == ["0.2.0"]
+
+
+def test_hf_download_is_moved_into_store(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A copy of the file left in the cache by an earlier download
+    cache_blob = tmp_path / "cache" / "blobs" / "abc"
+    cache_blob.parent.mkdir(parents=True)
+    cache_blob.write_bytes(b"GGUF model")
+    snapshot_path = tmp_path / "cache" / "snapshot" / "model.gguf"
+    snapshot_path.parent.mkdir(parents=True)
+    snapshot_path.symlink_to(cache_blob)
+
+    downloaded: list[pathlib.Path] = []
+
+    def hf_hub_download(repo: str, file: str, **kwargs: Any) -> str:
+        assert kwargs["local_dir_use_symlinks"] is False
+        path = pathlib.Path(kwargs["local_dir"]) / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"GGUF model")
+        downloaded.append(path)
+        return str(path)
+
+    monkeypatch.setattr(tasks, "hf_hub_url", lambda *args, **kwargs: "")
+    monkeypatch.setattr(
+        tasks,
+        "get_hf_file_metadata",
+        lambda url: SimpleNamespace(etag=None, commit_hash="main"),
+    )
+    monkeypatch.setattr(tasks, "hf_hub_download", hf_hub_download)
+    monkeypatch.setattr(
+        tasks, "try_to_load_from_cache", lambda *args, **kwargs: str(snapshot_path)
+    )
+
+    db = PersistentDataManager(create_engine("sqlite+pysqlite:///:memory:"))
+    taskdb = PersistentTaskStore()
+    task = DownloadHFModelTask(
+        locator=HFLocator(repo="org/model", file="model.gguf"),
+        model_name="anewmodel",
+        model_version="0.1.0",
+    )
+    task_id = taskdb.store_task(Task(task))
+    Tasks(
+        taskdb,
+        db,
+        BlobStore(tmp_path / "blobs", db),
+        typing.cast(InferenceRuntime, None),
+    ).handle_download_hf_model(task_id, task)
+
+    assert isinstance(taskdb.get_task_state(task_id).root, FinishedTaskState)
+    [blob] = db.get_blobs()
+    assert pathlib.Path(blob.path).read_bytes() == b"GGUF model"
+    [download] = downloaded
+    assert download.is_relative_to(tmp_path / "blobs")
+    assert not download.parent.exists()
+    assert not snapshot_path.exists() and not cache_blob.exists()
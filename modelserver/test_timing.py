@@ -0,0 +1,64 @@
+import asyncio
+import queue
+import time
+
+import pytest
+
+from modelserver import runtime
+from modelserver.runtime import CHANNEL_SENTINEL, InferenceRuntime, JobSignals, ModelKey
+from modelserver.timing import PhaseTimeline
+
+
+def test_server_timing() -> None:
+    timeline = PhaseTimeline()
+    timeline.add("db", 0.002)
+    timeline.add("queue", 0.0005)
+    timeline.add("db", 0.001)
+    assert list(timeline.phases_ms.keys()) == ["db", "queue"]
+    assert timeline.phases_ms["db"] == pytest.approx(3.0)
+    header = timeline.server_timing()
+    assert header.startswith("db;dur=3.0, queue;dur=0.5, total;dur=")
+
+
+def slow_load(key: ModelKey, with_readahead: bool, cores: list[int] | None) -> None:
+    time.sleep(0.2)
+
+
+def three_tokens(signals: JobSignals, channel: queue.Queue[str | None]) -> None:
+    time.sleep(0.05)
+    for i in range(3):
+        channel.put(str(i))
+        time.sleep(0.05)
+    channel.put(CHANNEL_SENTINEL)
+
+
+def test_stream_records_phases(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(runtime, "_load_model", slow_load)
+
+    async def main() -> None:
+        inference = InferenceRuntime(memory_budget_bytes=100)
+        key = ModelKey("model.gguf")
+        try:
+            first = PhaseTimeline()
+            async for _ in inference.stream(key, None, three_tokens, timeline=first):
+                pass
+            assert list(first.phases_ms.keys()) == [
+                "queue",
+                "load",
+                "prompt",
+                "generate",
+            ]
+            assert first.phases_ms["load"] >= 200
+            assert first.phases_ms["prompt"] >= 50
+            assert first.phases_ms["generate"] >= 100
+
+            # The model is only loaded once
+            second = PhaseTimeline()
+            async for _ in inference.stream(key, None, three_tokens, timeline=second):
+                pass
+            assert "load" not in second.phases_ms
+            assert second.phases_ms["prompt"] < 200
+        finally:
+            inference.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, final
+
+"""
+Per-request latency attribution.
+
+A PhaseTimeline collects the wall-clock time a request spends in each phase of being served, such
+as looking up the model, waiting for the model's process, loading the model, evaluating the prompt
+and generating. Routes return the timeline to clients as a Server-Timing header, so that the time of
+a slow request can be attributed without an external tracer.
+
+The phases of an inference job are recorded by `InferenceRuntime.stream()`:
+
+    - queue: waiting for the model's scheduler to grant the model, see `modelserver.scheduler`
+    - load: spawning the model's process and loading the model, for the first job of the process
+    - prompt: from submitting the job until its first token, mostly evaluating the prompt
+    - generate: from the first token until the job finishes
+"""
+
+
+@final
+class PhaseTimeline:
+    """
+    Time spent in each phase of serving a request, in the order the phases were first entered.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.phases_ms: dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        """
+        Add to the time spent in the phase, phases that are entered repeatedly add up.
+        """
+        self.phases_ms[phase] = self.phases_ms.get(phase, 0.0) + 1000 * max(seconds, 0)
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        starttime = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(phase, time.monotonic() - starttime)
+
+    def total_ms(self) -> float:
+        return 1000 * (time.monotonic() - self.started)
+
+    def server_timing(self) -> str:
+        """
+        Format the timeline as the value of a Server-Timing header.
+        """
+        entries = [f"{phase};dur={ms:.1f}" for phase, ms in self.phases_ms.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(entries)
@@ -3,7 +3,16 @@ from datetime import datetime
 from enum import Enum
 from typing import Annotated, Any, List, Literal, TypeAlias
 
-from pydantic import UUID4, BaseModel, ConfigDict, Field, RootModel, field_validator
+from pydantic import (
+    UUID4,
+    BaseModel,
+    ConfigDict,
+    Field,
+    RootModel,
+    computed_field,
+    field_validator,
+    model_validator,
+)
 
 from .locator import DiskLocator, HFLocator, Locator
 
@@ -101,16 +110,137 @@ class ModelRuntime(str, Enum):
                 raise ValueError(f'No such ModelRuntime "{type_}"')
 
 
+class KVCacheType(str, Enum):
+    """
+    Element type used to store the KV cache. Quantized types trade a small amount of accuracy for memory.
+    """
+
+    f32 = "f32"
+    f16 = "f16"
+    q8_0 = "q8_0"
+    q4_0 = "q4_0"
+
+
+class QuantizationType(str, Enum):
+    """
+    Weight type a model is quantized to, named after the llama.cpp file types.
+    """
+
+    q4_0 = "q4_0"
+    q4_k_m = "q4_k_m"
+    q5_k_m = "q5_k_m"
+    q6_k = "q6_k"
+    q8_0 = "q8_0"
+
+
+class MemoryEstimate(BaseModel):
+    """
+    Estimate of the memory needed to serve a model version, computed from its tensor table.
+
+    :param n_ctx: Context size the estimate was computed for
+    :param n_batch: Batch size the estimate was computed for
+    :param kv_cache_type: Element type of the KV cache the estimate was computed for
+    :param v_cache_type: Element type of the values in the KV cache, if it differs from `kv_cache_type`
+    :param weight_bytes: Size of the model weights
+    :param kv_cache_bytes: Size of the KV cache holding `n_ctx` tokens
+    :param scratch_bytes: Upper bound on the compute buffers needed to evaluate a batch of `n_batch` tokens
+    """
+
+    n_ctx: int
+    n_batch: int
+    kv_cache_type: KVCacheType
+    v_cache_type: KVCacheType | None = None
+    weight_bytes: int
+    kv_cache_bytes: int
+    scratch_bytes: int
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def total_bytes(self) -> int:
+        return self.weight_bytes + self.kv_cache_bytes + self.scratch_bytes
+
+
+class DraftModelParams(BaseModel):
+    """
+    A small model from the catalog paired with a model version for speculative decoding. The draft
+    proposes several tokens at a time, which the paired model verifies in a single forward pass.
+
+    :param model_id: ID of the draft model
+    :param model_version: Version of the draft model
+    :param model_path: The disk path to the draft's model file, it must share the paired model's vocabulary
+    :param memory_estimate: Estimated memory footprint of serving the draft alongside the paired model
+    :param blob_digest: The sha256 digest of the draft's model file if it is held in the blob store,
+                        which keeps the file in the store while the pairing lasts
+    :param num_draft_tokens: Number of tokens proposed by the draft per verification pass
+    """
+
+    model_id: str
+    model_version: SemVer
+    model_path: str
+    memory_estimate: MemoryEstimate | None = None
+    blob_digest: str | None = None
+    num_draft_tokens: int = Field(default=4, gt=0)
+
+    model_config = ConfigDict(
+        protected_namespaces=(),
+    )
+
+
+class LlamaRuntimeParams(BaseModel):
+    """
+    Settings llama.cpp loads a model version with. Every worker that loads the version applies them.
+
+    :param n_ctx: Size of the context window, 0 uses the context size the model was trained with
+    :param n_batch: Maximum number of prompt tokens evaluated in a single forward pass
+    :param n_threads: Number of threads used for generation, defaults to the number of cores
+    :param type_k: Element type of the keys in the KV cache
+    :param type_v: Element type of the values in the KV cache, llama.cpp only supports quantized values
+                   with flash attention
+    :param use_mmap: Map the weights from the model file rather than reading them into memory
+    :param use_mlock: Lock the weights in memory so that they cannot be swapped out
+    :param flash_attn: Compute attention with the fused flash attention kernel
+    """
+
+    n_ctx: int = Field(default=512, ge=0)
+    n_batch: int = Field(default=512, gt=0)
+    n_threads: int | None = Field(default=None, gt=0)
+    type_k: KVCacheType = KVCacheType.f16
+    type_v: KVCacheType = KVCacheType.f16
+    use_mmap: bool = True
+    use_mlock: bool = False
+    flash_attn: bool = False
+
+    # Part of the key resident models are looked up by, see `modelserver.runtime.ModelKey`
+    model_config = ConfigDict(frozen=True)
+
+    @model_validator(mode="after")
+    def check_value_cache(self) -> "LlamaRuntimeParams":
+        if (
+            self.type_v not in (KVCacheType.f16, KVCacheType.f32)
+            and not self.flash_attn
+        ):
+            raise ValueError(f"type_v {self.type_v.value} requires flash_attn")
+        return self
+
+
 class CompletionModelParams(BaseModel):
     """
     Extra optional metadata used by completion models.
 
     :param model_path: The disk path to the ggml model file used by llama-cpp for inference.
+    :param memory_estimate: Estimated memory footprint of serving the model, computed at import time.
+    :param blob_digest: The sha256 digest of the model file if it is held in the blob store.
+    :param draft: Draft model used for speculative decoding, if one has been paired with the model.
+    :param runtime: Settings the model is loaded with.
     """
 
     type: Literal["paramsv1/completion"] = "paramsv1/completion"
 
     model_path: str
+    memory_estimate: MemoryEstimate | None = None
+    blob_digest: str | None = None
+    draft: DraftModelParams | None = None
+    runtime: LlamaRuntimeParams = LlamaRuntimeParams()
 
     model_config = ConfigDict(
         protected_namespaces=(),
@@ -118,9 +248,17 @@ class CompletionModelParams(BaseModel):
 
 
 class ImportRequest(BaseModel):
+    """
+    :param quantization: Also register a copy of the model quantized to this type
+    :param quantized_version: Version the quantized copy is registered as, defaults to the next minor
+                              version after `model_version`
+    """
+
     locator: Locator
     model_name: str
     model_version: str
+    quantization: QuantizationType | None = None
+    quantized_version: SemVer | None = None
 
     model_config = ConfigDict(
         protected_namespaces=(),
@@ -137,14 +275,42 @@ class DiskImportSource(BaseModel):
     source: DiskLocator
 
 
+class MergedLoraImportSource(BaseModel):
+    """
+    A model version produced by merging a LoRA adapter into a base model version.
+    """
+
+    type: Literal["importv1/merged-lora"] = "importv1/merged-lora"
+    lora_id: str
+    base_model: str
+    base_model_version: SemVer
+    quantization: QuantizationType
+
+    model_config = ConfigDict(
+        protected_namespaces=(),
+    )
+
+
 class ImportMetadata(BaseModel):
+    """
+    :param quantization: Type the model was quantized to after importing it, if it was
+    """
+
     imported_at: datetime
-    source: Annotated[HFImportSource | DiskImportSource, Field(discriminator="type")]
+    source: Annotated[
+        HFImportSource | DiskImportSource | MergedLoraImportSource,
+        Field(discriminator="type"),
+    ]
+    quantization: QuantizationType | None = None
 
 
 class ModelVersion(BaseModel):
     version: SemVer
     import_metadata: ImportMetadata
+    memory_estimate: MemoryEstimate | None = None
+    draft_model_id: str | None = None
+    draft_model_version: SemVer | None = None
+    runtime_params: LlamaRuntimeParams = LlamaRuntimeParams()
 
     @field_validator("version")
     def validate_version(cls, v: str | SemVer) -> SemVer:
@@ -198,6 +364,50 @@ class RegisteredModel(BaseModel):
     )
 
 
+class InferencePriority(str, Enum):
+    """
+    Scheduling class of an inference request. Interactive requests are always served before batch
+    requests, and preempt batch generations that are already running.
+    """
+
+    interactive = "interactive"
+    batch = "batch"
+
+
+class SlowClientPolicy(str, Enum):
+    """
+    What a WebSocket streaming session does when its client reads tokens slower than they are
+    generated, once the tokens buffered for the client fill up.
+    """
+
+    wait = "wait"  # stop forwarding generated tokens until the client catches up
+    cancel = "cancel"  # stop generating and close the session
+
+
+class StreamFraming(BaseModel):
+    """
+    How a WebSocket streaming session sends tokens to its client.
+
+    Tokens are gathered into a frame until it holds `flush_tokens` tokens or `flush_ms` passed since its
+    first token. Tokens that are already waiting are always gathered without delay, so the defaults
+    send a frame per token while the client keeps up.
+
+    :param flush_tokens: Most tokens sent in one frame (default=1)
+    :param flush_ms: Longest a token waits for the rest of its frame (default=0)
+    :param binary: Send binary frames, which keep the tokens apart. A binary frame is a sequence of
+                   records, each the little-endian uint32 position of the token in the output, the
+                   uint32 length of the token and its UTF-8 bytes. Text frames concatenate the tokens.
+    :param buffer_tokens: Most tokens held for the client before `slow_client` applies (default=256)
+    :param slow_client: What to do with a client that falls `buffer_tokens` behind (default=wait)
+    """
+
+    flush_tokens: int = Field(default=1, ge=1, le=1024)
+    flush_ms: float = Field(default=0.0, ge=0.0, le=1000.0)
+    binary: bool = False
+    buffer_tokens: int = Field(default=256, ge=1, le=4096)
+    slow_client: SlowClientPolicy = SlowClientPolicy.wait
+
+
 class CompletionInferenceRequest(BaseModel):
     """
     A user-issued request for a completion model.
@@ -205,12 +415,18 @@ class CompletionInferenceRequest(BaseModel):
     :param prompt: The text prompt that is the start of the completion
     :param tokens: Max number of tokens to generate (defaults to 128)
     :param temperature: The temperature of the completion, higher values add more entropy to the result (default=0).
+    :param priority: Scheduling class of the request (default=interactive)
+    :param server_timing: Over a WebSocket, send a ServerTiming frame after the last token (default=false)
+    :param framing: Over a WebSocket, how tokens are sent to the client
     """
 
     prompt: str
     tokens: int = 128
     temperature: float = 0.0
     lora: str | None = None
+    priority: InferencePriority = InferencePriority.interactive
+    server_timing: bool = False
+    framing: StreamFraming = StreamFraming()
 
 
 # Union type to use for inferring the request type. Currently only one type.
@@ -248,7 +464,13 @@ class GetRegisteredModelsResponse(BaseModel):
 
 
 class HealthStatus(BaseModel):
+    """
+    :param status: "ok" once the server is ready to serve, "warming" while models are being preloaded
+    :param warming: Paths of the models that are still being preloaded
+    """
+
     status: str
+    warming: list[str] = []
 
 
 class ListHFFiles(BaseModel):
@@ -320,11 +542,113 @@ class SetTaskBackingModelRequest(BaseModel):
     )
 
 
+class SetDraftModelRequest(BaseModel):
+    """
+    :param model_id: ID of the draft model
+    :param model_version: Version of the draft model
+    :param num_draft_tokens: Number of tokens proposed by the draft per verification pass
+    """
+
+    model_id: str
+    model_version: str
+    num_draft_tokens: int = Field(default=4, gt=0)
+
+    model_config = ConfigDict(
+        protected_namespaces=(),
+    )
+
+
+class SpeculationStats(BaseModel):
+    """
+    Acceptance of speculatively decoded tokens.
+
+    :param draft_tokens: Number of tokens proposed for verification
+    :param accepted_tokens: Number of proposed tokens the model agreed with
+    """
+
+    draft_tokens: int = 0
+    accepted_tokens: int = 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def acceptance_rate(self) -> float | None:
+        if self.draft_tokens == 0:
+            return None
+        return self.accepted_tokens / self.draft_tokens
+
+    def add(self, draft_tokens: int, accepted_tokens: int) -> None:
+        self.draft_tokens += draft_tokens
+        self.accepted_tokens += accepted_tokens
+
+
+class ProfileFormat(str, Enum):
+    """
+    File format of a profile downloaded from the server.
+    """
+
+    collapsed = "collapsed"
+    speedscope = "speedscope"
+
+
+class ResidentModelStatus(BaseModel):
+    """
+    A model currently loaded by the inference runtime.
+
+    :param model_path: Path of the loaded model file
+    :param serves_adapters: Whether the model serves requests with LoRA adapters
+    :param lora_path: Path of the LoRA adapter the most recent request ran with, if any
+    :param draft_model_path: Path of the draft model used for speculative decoding, if any
+    :param in_flight: Number of requests being served or waiting to be served by the model
+    :param speculation: Acceptance of speculative decoding since the model was loaded
+    :param cores: The CPU cores the model's process runs on
+    :param cpu_utilization: Fraction of the capacity of its cores the process has used since it was started
+    """
+
+    model_path: str
+    serves_adapters: bool
+    lora_path: str | None
+    draft_model_path: str | None
+    in_flight: int
+    speculation: SpeculationStats
+    cores: list[int]
+    cpu_utilization: float
+
+    model_config = ConfigDict(
+        protected_namespaces=(),
+    )
+
+
 class GrammarDefinition(BaseModel):
     grammar_user_code: str
     grammar_generated: str
 
 
+class TaskGenerationParams(BaseModel):
+    """
+    Settings that control generation for invocations of a Task.
+
+    :param max_tokens: Maximum number of tokens generated for a single invocation
+    :param stop: Generation ends as soon as any of these strings is generated, the stop string is not returned
+    :param stop_on_grammar_accept: End generation as soon as the output is a complete JSON value, instead of
+                                   letting the model emit trailing tokens the grammar still allows. Only
+                                   applies to grammars whose root is a JSON object or array
+    :param prompt_lookup: Decode speculatively by proposing continuations found in the prompt, which speeds
+                          up Tasks that copy spans of their input into the output
+    :param prompt_lookup_ngram_size: Longest n-gram at the end of the output looked up in the prompt
+    :param prompt_lookup_num_tokens: Maximum number of tokens proposed per lookup
+    :param grammar_jump_forward: Propose the text the output grammar forces next, such as JSON keys and
+                                 punctuation, so that it is evaluated in one batch instead of token by token
+    """
+
+    max_tokens: int = Field(default=2048, gt=0)
+    stop: list[str] = []
+    stop_on_grammar_accept: bool = False
+    prompt_lookup: bool = False
+    prompt_lookup_ngram_size: int = Field(default=3, gt=0)
+    prompt_lookup_num_tokens: int = Field(default=10, gt=0)
+    grammar_jump_forward: bool = True
+
+
 class TaskInfo(BaseModel):
     name: str
     task_id: UUID4
@@ -335,6 +659,9 @@ class TaskInfo(BaseModel):
     prompt_template: str
     created_at: datetime
     updated_at: datetime
+    generation_params: TaskGenerationParams = Field(
+        default_factory=TaskGenerationParams
+    )
 
     model_config = ConfigDict(
         protected_namespaces=(),
@@ -347,16 +674,198 @@ class TaskInvocationRequest(BaseModel):
 
     :param variables: A string to string dictionary of variables as provided by the user at request time, must
                       correspond to the configured variables for the Task.
+    :param priority: Scheduling class of the request (default=interactive)
+    :param server_timing: Over a WebSocket, send a ServerTiming frame after the last token (default=false)
+    :param framing: Over a WebSocket, how tokens are sent to the client
+    """
+
+    variables: dict[str, str]
+    temperature: float = 0.0
+    priority: InferencePriority = InferencePriority.interactive
+    server_timing: bool = False
+    framing: StreamFraming = StreamFraming()
+
+
+class ServerTiming(BaseModel):
+    """
+    Breakdown of the time spent serving a request, the counterpart of the Server-Timing header for
+    streaming sessions.
+
+    :param phases_ms: Milliseconds spent in each phase, see `modelserver.timing`
+    :param total_ms: Milliseconds since the request was received
+    """
+
+    phases_ms: dict[str, float]
+    total_ms: float
+
+
+class SessionInvocation(BaseModel):
     """
+    Start invoking a Task on an invocation session.
 
+    :param id: Chosen by the client to tag every frame about the invocation, unique among the
+               invocations running on the session
+    :param task_name: The Task to invoke
+    :param server_timing: Send the breakdown of the time spent with the result (default=false)
+    """
+
+    type: Literal["invoke"] = "invoke"
+    id: str
+    task_name: str
     variables: dict[str, str]
     temperature: float = 0.0
+    priority: InferencePriority = InferencePriority.interactive
+    server_timing: bool = False
+
+
+class SessionCancel(BaseModel):
+    """
+    Stop a running invocation of an invocation session.
+    """
+
+    type: Literal["cancel"] = "cancel"
+    id: str
+
+
+class SessionMessage(
+    RootModel[Annotated[SessionInvocation | SessionCancel, Field(discriminator="type")]]
+):
+    """
+    A message sent by the client of an invocation session.
+    """
+
+
+class SessionTokens(BaseModel):
+    """
+    Text generated by an invocation of an invocation session.
+    """
+
+    type: Literal["tokens"] = "tokens"
+    id: str
+    text: str
+
+
+class SessionResult(BaseModel):
+    """
+    Sent when an invocation of an invocation session finishes, after its last tokens.
+
+    :param cancelled: Whether the invocation was stopped by a SessionCancel
+    :param timing: Breakdown of the time spent, if the invocation asked for it
+    """
+
+    type: Literal["result"] = "result"
+    id: str
+    elapsed_seconds: float
+    cancelled: bool = False
+    speculation: SpeculationStats | None = None
+    timing: ServerTiming | None = None
+
+
+class SessionError(BaseModel):
+    """
+    Sent when a message of an invocation session is invalid or an invocation fails.
+
+    :param id: The invocation that failed, None if the message could not be parsed
+    :param status_code: The HTTP status code the error corresponds to
+    """
+
+    type: Literal["error"] = "error"
+    id: str | None
+    status_code: int
+    detail: str
+
+
+class StreamFormat(str, Enum):
+    """
+    Format of the events of an HTTP streaming response.
+    """
+
+    sse = "sse"  # Server-Sent Events, text/event-stream
+    ndjson = "ndjson"  # a JSON object per line, application/x-ndjson
+
+
+class StreamToken(BaseModel):
+    """
+    Text generated by a streaming inference request.
+    """
+
+    type: Literal["token"] = "token"
+    text: str
+
+
+class StreamSummary(BaseModel):
+    """
+    The last event of a streaming inference request that finished generating.
+
+    :param timing: Breakdown of the time spent serving the request
+    """
+
+    type: Literal["summary"] = "summary"
+    elapsed_seconds: float
+    speculation: SpeculationStats | None = None
+    timing: ServerTiming
+
+
+class StreamError(BaseModel):
+    """
+    The last event of a streaming inference request that failed after the response started.
+    """
+
+    type: Literal["error"] = "error"
+    status_code: int
+    detail: str
 
 
 class TaskInvocation(BaseModel):
+    """
+    :param speculation: Acceptance of speculatively decoded tokens, if the invocation decoded speculatively
+    """
+
     task_name: str
     elapsed_seconds: float
     result: str
+    speculation: SpeculationStats | None = None
+
+
+class TaskBatchInvocationRequest(BaseModel):
+    """
+    A request to invoke a Task once for each of several sets of variables
+
+    :param variables: One set of variables per invocation, each validated the same as for a single invocation
+    :param priority: Scheduling class of the request (default=batch)
+    """
+
+    variables: list[dict[str, str]]
+    temperature: float = 0.0
+    priority: InferencePriority = InferencePriority.batch
+
+
+class BulkInferenceRequest(BaseModel):
+    """
+    A request to invoke a Task for every row of a dataset on disk, see BulkInferenceTask.
+    """
+
+    input_path: str
+    output_path: str
+    temperature: float = 0.0
+    chunk_size: int = Field(default=8, gt=0)
+    max_in_flight: int = Field(default=2, gt=0)
+    priority: InferencePriority = InferencePriority.batch
+
+
+class TaskBatchInvocationItem(BaseModel):
+    """
+    The outcome of one item of a batch invocation, streamed back as a line of NDJSON.
+
+    :param index: Position of the item's variables in the batch request
+    :param result: The completion, if the item succeeded
+    :param error: Why the item failed, if it did
+    """
+
+    index: int
+    elapsed_seconds: float
+    result: str | None = None
+    error: str | None = None
 
 
 class LoraIn(BaseModel):
@@ -376,3 +885,57 @@ class LoraOut(BaseModel):
     job_uuid: UUID4
     # Original hf-hub source the fine-tune is based on
     source_model: str
+
+
+class MergeLoraRequest(BaseModel):
+    """
+    A request to merge a LoRA adapter into the weights of a base model and register the quantized
+    result as a new model version, see MergeLoraTask.
+
+    :param base_model: Name of the model the adapter was trained on, its version must store the weights
+                       the adapter touches as F16 or F32
+    :param model_name: Model to register the result under, created if it does not exist
+    :param quantization: Weight type of the result
+    :param scale: Strength the adapter is merged with
+    """
+
+    base_model: str
+    base_model_version: SemVer
+    model_name: str
+    model_version: SemVer
+    quantization: QuantizationType = QuantizationType.q4_k_m
+    scale: float = 1.0
+
+    model_config = ConfigDict(
+        protected_namespaces=(),
+    )
+
+
+class BlobIn(BaseModel):
+    """
+    A file held in the content-addressed blob store.
+
+    :param digest: Hex-encoded sha256 of the file contents
+    :param path: Location of the file inside the blob store
+    """
+
+    digest: str
+    path: str
+    size_bytes: int
+    created_at: datetime
+
+
+class BlobOut(BaseModel):
+    """
+    A file held in the content-addressed blob store.
+
+    :param digest: Hex-encoded sha256 of the file contents
+    :param path: Location of the file inside the blob store
+    :param refcount: Number of model versions whose weights are stored in this blob
+    """
+
+    digest: str
+    path: str
+    size_bytes: int
+    created_at: datetime
+    refcount: int
@@ -3,6 +3,7 @@ from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field, RootModel
 
+from modelserver.types.api import InferencePriority, QuantizationType, SemVer
 from modelserver.types.locator import DiskLocator, HFLocator
 
 """
@@ -18,6 +19,8 @@ class DownloadHFModelTask(BaseModel):
     cache_dir: str | None = None
     model_name: str
     model_version: str
+    quantization: QuantizationType | None = None
+    quantized_version: str | None = None
 
     model_config = ConfigDict(
         protected_namespaces=(),
@@ -29,6 +32,52 @@ class DownloadDiskModelTask(BaseModel):
     locator: DiskLocator
     model_name: str
     model_version: str
+    quantization: QuantizationType | None = None
+    quantized_version: str | None = None
+
+    model_config = ConfigDict(
+        protected_namespaces=(),
+    )
+
+
+class BulkInferenceTask(BaseModel):
+    """
+    Invoke a Task for every row of a JSONL or Parquet dataset, writing one TaskBatchInvocationItem per
+    row to a JSONL output file.
+
+    :param task_name: The Task to invoke, each row provides the Task's variables
+    :param input_path: Path to a .jsonl file of JSON objects, or a .parquet file
+    :param output_path: Path of the JSONL file results are written to. A checkpoint is kept next to it,
+                        and resubmitting a job with the same output path resumes where it left off.
+    :param chunk_size: Number of rows submitted to the model as a single batch
+    :param max_in_flight: Number of chunks submitted to the model at the same time
+    :param priority: Scheduling class the rows are invoked with
+    """
+
+    type: Literal["taskv1/bulk-inference"] = "taskv1/bulk-inference"
+    task_name: str
+    input_path: str
+    output_path: str
+    temperature: float = 0.0
+    chunk_size: int = Field(default=8, gt=0)
+    max_in_flight: int = Field(default=2, gt=0)
+    priority: InferencePriority = InferencePriority.batch
+
+
+class MergeLoraTask(BaseModel):
+    """
+    Merge a LoRA adapter into its base model, quantize the result and register it as a new model
+    version, see MergeLoraRequest.
+    """
+
+    type: Literal["taskv1/merge-lora"] = "taskv1/merge-lora"
+    lora_id: str
+    base_model: str
+    base_model_version: SemVer
+    model_name: str
+    model_version: SemVer
+    quantization: QuantizationType
+    scale: float = 1.0
 
     model_config = ConfigDict(
         protected_namespaces=(),
@@ -38,23 +87,43 @@ class DownloadDiskModelTask(BaseModel):
 class Task(
     RootModel[
         Annotated[
-            DownloadHFModelTask | DownloadDiskModelTask, Field(discriminator="type")
+            DownloadHFModelTask
+            | DownloadDiskModelTask
+            | BulkInferenceTask
+            | MergeLoraTask,
+            Field(discriminator="type"),
         ]
     ]
 ):
     root: Annotated[
-        DownloadHFModelTask | DownloadDiskModelTask, Field(discriminator="type")
+        DownloadHFModelTask | DownloadDiskModelTask | BulkInferenceTask | MergeLoraTask,
+        Field(discriminator="type"),
     ]
 
     def __init__(
-        self, *args: DownloadHFModelTask | DownloadDiskModelTask, **kwargs: Any
+        self,
+        *args: DownloadHFModelTask
+        | DownloadDiskModelTask
+        | BulkInferenceTask
+        | MergeLoraTask,
+        **kwargs: Any,
     ):
         super().__init__(*args, **kwargs)
 
 
 class InProgressState(BaseModel):
+    """
+    :param progress: Fraction of the work done, between 0 and 1
+    :param items_done: Number of items processed, for tasks that process a dataset
+    :param items_per_second: Throughput since the task started running, for tasks that process a dataset
+    :param eta_seconds: Estimated time until the task finishes
+    """
+
     type: Literal["in-progress"] = "in-progress"
     progress: float
+    items_done: int | None = None
+    items_per_second: float | None = None
+    eta_seconds: float | None = None
 
 
 class FinishedTaskState(BaseModel):
@@ -1,7 +1,13 @@
 import pytest
 from pydantic import ValidationError
 
-from modelserver.types.api import SemVer
+from modelserver.types.api import (
+    ImportRequest,
+    SemVer,
+    SessionCancel,
+    SessionInvocation,
+    SessionMessage,
+)
 from modelserver.types.locator import DiskLocator, HFLocator
 from modelserver.types.tasks import DownloadDiskModelTask, DownloadHFModelTask, Task
 
@@ -28,6 +34,19 @@ def test_semver() -> None:
         SemVer("012..")
 
 
+def test_import_request_quantized_version() -> None:
+    request = {
+        "locator": {"type": "locatorv1/disk", "path": "/my/new/file.bin"},
+        "model_name": "model",
+        "model_version": "0.1.0",
+        "quantization": "q8_0",
+    }
+    parsed = ImportRequest.model_validate(request | {"quantized_version": "0.1.1"})
+    assert parsed.quantized_version == SemVer("0.1.1")
+    with pytest.raises(ValidationError):
+        ImportRequest.model_validate(request | {"quantized_version": "latest"})
+
+
 def test_tasks() -> None:
     parsed_task1 = Task.model_validate(
         {
@@ -85,3 +104,17 @@ def test_tasks() -> None:
                 },
             }
         )
+
+
+def test_session_messages() -> None:
+    invoke = SessionMessage.model_validate_json(
+        '{"type": "invoke", "id": "a", "task_name": "extract", "variables": {"doc": "x"}}'
+    ).root
+    assert isinstance(invoke, SessionInvocation)
+    assert invoke.variables == {"doc": "x"}
+
+    cancel = SessionMessage.model_validate_json('{"type": "cancel", "id": "a"}').root
+    assert cancel == SessionCancel(id="a")
+
+    with pytest.raises(ValidationError):
+        SessionMessage.model_validate_json('{"type": "complete", "id": "a"}')
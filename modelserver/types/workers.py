@@ -1,5 +1,13 @@
 from pydantic import BaseModel, ConfigDict
 
+from modelserver.types.api import (
+    DraftModelParams,
+    InferencePriority,
+    LlamaRuntimeParams,
+    MemoryEstimate,
+    TaskGenerationParams,
+)
+
 
 class RenderedTaskInvocation(BaseModel):
     """
@@ -8,12 +16,22 @@ class RenderedTaskInvocation(BaseModel):
     :model_path: The path to the cached model file that needs to be loaded to execute the the inference
     :param rendered_prompt: The fully rendered prompt, with all variables inserted
     :grammar: The textual representation of grammar in GBNF format (See llama.cpp repo for examples)
+    :memory_estimate: Estimated memory needed to load the model, used for admission control
+    :draft: Draft model used to decode speculatively, if the model has one
+    :runtime: Settings the model is loaded with
+    :generation_params: Settings that control when generation ends
+    :priority: Scheduling class of the invocation
     """
 
     model_path: str
     rendered_prompt: str
     grammar: str | None
     temperature: float
+    memory_estimate: MemoryEstimate | None = None
+    draft: DraftModelParams | None = None
+    runtime: LlamaRuntimeParams = LlamaRuntimeParams()
+    generation_params: TaskGenerationParams = TaskGenerationParams()
+    priority: InferencePriority = InferencePriority.interactive
 
     model_config = ConfigDict(
         protected_namespaces=(),
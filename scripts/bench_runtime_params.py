@@ -0,0 +1,127 @@
+"""
+Compare the memory footprint and throughput of a model loaded with different runtime settings.
+
+    python -m scripts.bench_runtime_params model.gguf --n-ctx 4096 --tokens 128
+
+Each setting is loaded in a fresh process, which evaluates a long prompt and then generates greedily
+from it. The report lists the estimated KV cache size, the peak resident memory of the process, and
+prompt and generation throughput, so that the savings of a quantized KV cache or a smaller context
+can be weighed against their cost in speed.
+"""
+import argparse
+import resource
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+from llama_cpp import CompletionChunk, Llama
+
+from modelserver.memory import KV_CACHE_GGML_TYPES, estimate_runtime_memory
+from modelserver.types.api import KVCacheType, LlamaRuntimeParams
+
+NOTE = (
+    "The team reviewed the quarterly roadmap and agreed to move the launch by a week. "
+)
+DEFAULT_PROMPT = f"Summarize the meeting notes in three bullet points.\n\n{NOTE * 40}"
+
+SETTINGS: dict[str, dict[str, typing.Any]] = {
+    "f16": {},
+    "flash-attn": dict(flash_attn=True),
+    "q8_0 keys": dict(type_k=KVCacheType.q8_0),
+    "q8_0 kv": dict(type_k=KVCacheType.q8_0, type_v=KVCacheType.q8_0, flash_attn=True),
+    "q4_0 kv": dict(type_k=KVCacheType.q4_0, type_v=KVCacheType.q4_0, flash_attn=True),
+    "no mmap": dict(use_mmap=False),
+    "mlock": dict(use_mlock=True),
+}
+
+
+def run(
+    model_path: str, runtime: LlamaRuntimeParams, prompt: str, tokens: int
+) -> tuple[float, int, float, float]:
+    """
+    :return: Load time, peak resident memory, prompt tokens/sec and generated tokens/sec
+    """
+    starttime = time.monotonic()
+    llama = Llama(
+        model_path=model_path,
+        n_ctx=runtime.n_ctx,
+        n_batch=runtime.n_batch,
+        n_threads=runtime.n_threads,
+        type_k=KV_CACHE_GGML_TYPES[runtime.type_k],
+        type_v=KV_CACHE_GGML_TYPES[runtime.type_v],
+        flash_attn=runtime.flash_attn,
+        use_mmap=runtime.use_mmap,
+        use_mlock=runtime.use_mlock,
+        verbose=False,
+    )
+    load_seconds = time.monotonic() - starttime
+
+    prompt_tokens = len(llama.tokenize(prompt.encode("utf-8")))
+    starttime = time.monotonic()
+    first_token_at = None
+    generated = 0
+    for next_chunk in llama.create_completion(
+        prompt, max_tokens=tokens, temperature=0.0, stream=True
+    ):
+        chunk = typing.cast(CompletionChunk, next_chunk)
+        if first_token_at is None:
+            first_token_at = time.monotonic()
+        if chunk["choices"][0]["text"]:
+            generated += 1
+    endtime = time.monotonic()
+    assert first_token_at is not None
+
+    # ru_maxrss is reported in KiB on Linux
+    peak_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return (
+        load_seconds,
+        peak_bytes,
+        prompt_tokens / (first_token_at - starttime),
+        (generated - 1) / max(endtime - first_token_at, 1e-9),
+    )
+
+
+def entrypoint() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("model", help="Path to the GGUF model")
+    parser.add_argument("--tokens", type=int, default=128)
+    parser.add_argument("--n-ctx", type=int, default=2048)
+    parser.add_argument("--n-batch", type=int, default=512)
+    parser.add_argument("--n-threads", type=int, default=None)
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument(
+        "--setting",
+        action="append",
+        choices=list(SETTINGS.keys()),
+        help="Setting to benchmark, may be repeated. Defaults to all of them",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'setting':12} {'kv cache':>10} {'estimate':>10} {'peak rss':>10} "
+        f"{'load':>7} {'prompt':>12} {'generate':>12}"
+    )
+    for name in args.setting or SETTINGS.keys():
+        runtime = LlamaRuntimeParams(
+            n_ctx=args.n_ctx,
+            n_batch=args.n_batch,
+            n_threads=args.n_threads,
+            **SETTINGS[name],
+        )
+        estimate = estimate_runtime_memory(args.model, runtime)
+        # A fresh process per setting, so that peak memory is not carried over between settings
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            load_seconds, peak_bytes, prompt_rate, generate_rate = pool.submit(
+                run, args.model, runtime, args.prompt, args.tokens
+            ).result()
+        kv_mib = estimate.kv_cache_bytes / 2**20 if estimate is not None else 0.0
+        estimate_mib = estimate.total_bytes / 2**20 if estimate is not None else 0.0
+        print(
+            f"{name:12} {kv_mib:7.1f}MiB {estimate_mib:7.1f}MiB "
+            f"{peak_bytes / 2**20:7.1f}MiB {load_seconds:6.2f}s "
+            f"{prompt_rate:8.1f}tok/s {generate_rate:8.1f}tok/s"
+        )
+
+
+if __name__ == "__main__":
+    entrypoint()
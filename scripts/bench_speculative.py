@@ -0,0 +1,80 @@
+"""
+Compare decode throughput of a model with and without speculative decoding.
+
+    python -m scripts.bench_speculative target.gguf --draft draft.gguf --tokens 256
+
+Each run generates greedily from the same prompts, first with the target alone and then with the
+draft proposing tokens, and reports tokens/sec and the acceptance rate of the draft's proposals.
+"""
+import argparse
+import time
+import typing
+
+from llama_cpp import CompletionChunk, Llama
+
+from modelserver.speculative import DraftLlama, SpeculativeDraft
+
+DEFAULT_PROMPTS = [
+    "The capital of France is",
+    "Write a Python function that returns the nth Fibonacci number.\n\ndef fib(n):",
+    'Extract the name and age as JSON from: "Alice turned 31 last week."\n{"name":',
+]
+
+
+def run(
+    llama: Llama, draft: SpeculativeDraft | None, prompts: list[str], tokens: int
+) -> tuple[int, float]:
+    generated = 0
+    starttime = time.monotonic()
+    for prompt in prompts:
+        if draft is not None:
+            draft.begin()
+        for next_chunk in llama.create_completion(
+            prompt, max_tokens=tokens, temperature=0.0, stream=True
+        ):
+            chunk = typing.cast(CompletionChunk, next_chunk)
+            if chunk["choices"][0]["text"]:
+                generated += 1
+    return generated, time.monotonic() - starttime
+
+
+def entrypoint() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("target", help="Path to the target GGUF model")
+    parser.add_argument("--draft", required=True, help="Path to the draft GGUF model")
+    parser.add_argument("--tokens", type=int, default=128)
+    parser.add_argument("--num-draft-tokens", type=int, default=4)
+    parser.add_argument("--n-ctx", type=int, default=2048)
+    parser.add_argument(
+        "--prompt", action="append", help="Prompt to generate from, may be repeated"
+    )
+    args = parser.parse_args()
+    prompts = args.prompt or DEFAULT_PROMPTS
+
+    baseline = Llama(model_path=args.target, n_ctx=args.n_ctx, verbose=False)
+    # Warm the page cache so that neither run pays for faulting in the weights
+    run(baseline, None, prompts[:1], 8)
+    generated, elapsed = run(baseline, None, prompts, args.tokens)
+    print(f"baseline:    {generated / elapsed:8.2f} tok/s ({generated} tokens)")
+    del baseline
+
+    draft = DraftLlama(
+        Llama(model_path=args.draft, n_ctx=args.n_ctx, verbose=False),
+        args.num_draft_tokens,
+    )
+    speculative = Llama(
+        model_path=args.target, n_ctx=args.n_ctx, draft_model=draft, verbose=False
+    )
+    run(speculative, draft, prompts[:1], 8)
+    draft.take()
+    generated, elapsed = run(speculative, draft, prompts, args.tokens)
+    draft_tokens, accepted_tokens = draft.take()
+    print(
+        f"speculative: {generated / elapsed:8.2f} tok/s ({generated} tokens), "
+        f"accepted {accepted_tokens}/{draft_tokens} proposed tokens "
+        f"({accepted_tokens / max(draft_tokens, 1):.0%})"
+    )
+
+
+if __name__ == "__main__":
+    entrypoint()
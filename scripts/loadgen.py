@@ -0,0 +1,155 @@
+"""
+Drive the server's inference endpoints at a fixed concurrency and report latency percentiles.
+
+    MODELSERVER_BACKEND=fake MODELSERVER_FAKE_TOKENS_PER_SECOND=100 modelserver
+    python -m scripts.loadgen --model my-model --version 0.1.0 --concurrency 32 --requests 1000
+
+Each of `--concurrency` clients sends its next request as soon as its previous one finished, until
+`--requests` requests have been sent in total. Requests either stream over the WebSocket endpoint,
+which measures the time to first token and the latency between tokens, or use the plain HTTP
+endpoint, where the first token arrives with the whole response. Give `--task` to invoke a Task
+instead of completing a prompt on a model version.
+
+Running the server on the fake inference backend, see `modelserver.backends`, generates tokens at a
+known rate without loading a model, so whatever the report adds on top of that rate is the server's
+own overhead.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+
+import httpx
+import websockets
+
+
+@dataclass
+class Sample:
+    """
+    Timings of one request, in seconds.
+    """
+
+    ttft: float
+    latency: float
+    tokens: int
+    inter_token: list[float] = field(default_factory=list)
+
+
+def endpoint(args: argparse.Namespace) -> tuple[str, dict[str, object]]:
+    """
+    :return: The path of the endpoint and the body of the request
+    """
+    if args.task is not None:
+        return f"/v1/tasks/{args.task}/invoke", dict(
+            variables=json.loads(args.variables)
+        )
+    return f"/v1/models/{args.model}/versions/{args.version}/complete", dict(
+        prompt=args.prompt, tokens=args.tokens
+    )
+
+
+async def request_http(client: httpx.AsyncClient, path: str, body: object) -> Sample:
+    starttime = time.monotonic()
+    response = await client.post(path, json=body)
+    response.raise_for_status()
+    elapsed = time.monotonic() - starttime
+    result = response.json()
+    text = result.get("completion", result.get("result", ""))
+    # Without streaming every token arrives with the response, tokens are counted as words
+    return Sample(ttft=elapsed, latency=elapsed, tokens=len(text.split()))
+
+
+async def request_websocket(url: str, body: object) -> Sample:
+    starttime = time.monotonic()
+    arrivals = []
+    async with websockets.connect(url) as websocket:
+        await websocket.send(json.dumps(body))
+        try:
+            async for _ in websocket:
+                arrivals.append(time.monotonic())
+        except websockets.ConnectionClosedOK:
+            pass
+    if not arrivals:
+        raise RuntimeError(f"No tokens received from {url}")
+    return Sample(
+        ttft=arrivals[0] - starttime,
+        latency=arrivals[-1] - starttime,
+        tokens=len(arrivals),
+        inter_token=[b - a for a, b in zip(arrivals, arrivals[1:])],
+    )
+
+
+async def client(
+    args: argparse.Namespace, remaining: list[int], samples: list[Sample]
+) -> None:
+    path, body = endpoint(args)
+    ws_url = args.url.replace("http", "ws", 1) + path
+    if args.task is not None:
+        ws_url += "/complete"
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as http:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            try:
+                if args.protocol == "ws":
+                    samples.append(await request_websocket(ws_url, body))
+                else:
+                    samples.append(await request_http(http, path, body))
+            except Exception as e:
+                print(f"Request failed: {e!r}")
+
+
+def percentiles(values: list[float]) -> str:
+    if len(values) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(values, n=100)
+    return "  ".join(f"p{p}={1000 * cuts[p - 1]:8.1f}ms" for p in (50, 95, 99))
+
+
+async def run(args: argparse.Namespace) -> None:
+    samples: list[Sample] = []
+    remaining = [args.requests]
+    starttime = time.monotonic()
+    await asyncio.gather(
+        *(client(args, remaining, samples) for _ in range(args.concurrency))
+    )
+    elapsed = time.monotonic() - starttime
+
+    tokens = sum(sample.tokens for sample in samples)
+    print(
+        f"{len(samples)}/{args.requests} requests succeeded in {elapsed:.2f}s, "
+        f"concurrency {args.concurrency} over {args.protocol}"
+    )
+    print(f"ttft          {percentiles([sample.ttft for sample in samples])}")
+    print(
+        f"inter-token   {percentiles([t for sample in samples for t in sample.inter_token])}"
+    )
+    print(f"latency       {percentiles([sample.latency for sample in samples])}")
+    print(
+        f"throughput    {len(samples) / elapsed:8.1f} req/s  {tokens / elapsed:8.1f} tok/s"
+    )
+
+
+def entrypoint() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--model", help="Name of the model to complete with")
+    parser.add_argument("--version", help="Version of the model")
+    parser.add_argument("--task", help="Name of the Task to invoke, instead of a model")
+    parser.add_argument(
+        "--variables", default="{}", help="JSON object of the Task's variables"
+    )
+    parser.add_argument("--prompt", default="The capital of France is")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--protocol", choices=["ws", "http"], default="ws")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    if args.task is None and (args.model is None or args.version is None):
+        parser.error("either --task or both --model and --version are required")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    entrypoint()